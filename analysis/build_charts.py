@@ -0,0 +1,420 @@
+"""Build the charts of analyse.ipynb without running the notebook.
+
+    python build_charts.py                 # rebuild what changed
+    python build_charts.py --force         # rebuild everything
+    python build_charts.py catalyst_effect # rebuild selected tasks
+    python build_charts.py --list          # show the tasks and their state
+
+Each chart cell of the notebook is declared below as a ChartTask: the PNGs
+it writes and the data it reads. A task runs its cells (after the
+notebook's import cell) in a worker process with the Agg backend, and the
+tasks run in parallel across a process pool. Variables that several chart
+cells read from one notebook cell, like the aggregate cube, are inputs
+too: their cell runs once per worker process, before the first task that
+reads them.
+
+A task is skipped when its outputs exist and its key is unchanged. The key
+is a hash of the import cell, the task's cells and the cells building its
+shared variables, the plotting library versions, the source of the shared
+analytics package and the content of its inputs. The keys of the last
+successful builds are kept in MANIFEST, per output directory. The
+notebook's data frame is read from the spreadsheet with openpyxl once per
+spreadsheet version and cached as a pickle in CACHE_DIR, so most runs
+never touch openpyxl.
+
+Cells write 'charts/...' and read 'data/...' relative to the notebook.
+Those paths are rewritten so each task writes into a staging directory,
+and its charts replace the ones in the output directory only once the
+whole task has succeeded.
+"""
+import argparse
+import ast
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from importlib import metadata
+
+ANALYSIS_DIR = os.path.dirname(os.path.abspath(__file__))
+NOTEBOOK = os.path.join(ANALYSIS_DIR, 'analyse.ipynb')
+DATA_PATH = os.path.join(ANALYSIS_DIR, 'data', 'data.xlsx')
+OUTPUT_DIR = os.path.join(ANALYSIS_DIR, 'data', 'charts')
+CACHE_DIR = os.path.join(ANALYSIS_DIR, '.chart-cache')
+# The import cell loads the analytics package from the repository root
+REPO_DIR = os.path.dirname(ANALYSIS_DIR)
+ANALYTICS_DIR = os.path.join(REPO_DIR, 'analytics')
+MANIFEST = os.path.join(CACHE_DIR, 'manifest.json')
+
+# Input standing for the notebook's data frame `df` (DATA_PATH with the
+# column names stripped, as the notebook's first cells do)
+FRAME = 'df'
+
+# Inputs standing for variables one notebook cell builds from `df` for the
+# chart cells of several tasks
+CUBE = 'cube'
+SHARED = (CUBE,)
+
+# Distributions whose versions are part of every task key: an upgrade can change the images
+LIBRARIES = ('matplotlib', 'seaborn', 'pandas', 'numpy', 'scikit-learn')
+
+logger = logging.getLogger(__name__)
+
+
+class ChartTask:
+    """Notebook cells that write a group of charts"""
+
+    def __init__(self, name, outputs, inputs=()):
+        self.name = name
+        # PNG file names; the cells writing them are the task's cells
+        self.outputs = outputs
+        # FRAME and/or data files relative to the notebook
+        self.inputs = inputs
+
+
+TASKS = [
+    ChartTask('efficiency_safety', ('efficiency_vs_safety.png', 'efficiency_safety_relationship.png'), (FRAME,)),
+    ChartTask('synthetic_fuel', ('process_duration_comparison.png', 'synthetic_fuel_opportunity_cost.png'), (FRAME,)),
+    ChartTask('catalyst_chronicles', ('catalyst_performance.png', 'catalyst_business_impact.png'), (FRAME, CUBE)),
+    ChartTask('supplier_impact', ('supplier_performance_matrix.png', 'supplier_improvement_opportunity.png'), (FRAME, CUBE)),
+    ChartTask('resource_allocation', ('worker_efficiency_analysis.png', 'worker_allocation_paradox.png'), (FRAME, CUBE)),
+    ChartTask('environmental_efficiency', (
+        'environmental_efficiency_radar.png',
+        'environmental_cost_correlation.png',
+        'environmental_savings_projection.png',
+    ), (FRAME,)),
+    ChartTask('storytelling_dashboard', ('data_storytelling_dashboard.png',), (FRAME,)),
+    ChartTask('efficiency_champions', ('process_efficiency_comparison.png',)),
+    ChartTask('catalyst_effect', ('catalyst_performance_matrix.png',)),
+    ChartTask('process_parameters', ('parameter_efficiency_correlation.png',)),
+    ChartTask('process_step_excellence', ('process_step_optimization.png',)),
+    ChartTask('improvement_opportunities', ('process_improvement_opportunities.png',)),
+    ChartTask('process_evolution', ('process_optimization_matrix.png',)),
+    ChartTask('accident_prediction', (
+        'feature_importance.png',
+        'process_analysis.png',
+        'catalyst_analysis.png',
+        'parameter_analysis.png',
+        'energy_safety_relationship.png',
+        'safety_dashboard.png',
+    ), ('data/data.csv',)),
+    ChartTask('process_funnels', (
+        'process_flow_funnel.png',
+        'safety_funnel.png',
+        'efficiency_funnel.png',
+        'energy_funnel.png',
+        'combined_process_funnel.png',
+    ), ('data/data.csv',)),
+]
+
+
+def saved_charts(source):
+    """File names of the 'charts/*.png' files a cell saves (commented-out calls excluded)"""
+    names = []
+    for node in ast.walk(ast.parse(source)):
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'savefig'
+                and node.args and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)
+                and node.args[0].value.startswith('charts/')):
+            names.append(node.args[0].value[len('charts/'):])
+    return names
+
+
+def assigned_names(source):
+    """Names a cell assigns at its top level"""
+    names = set()
+    for node in ast.parse(source).body:
+        if isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            names.update(target.id for target in targets if isinstance(target, ast.Name))
+    return names
+
+
+def read_notebook(path):
+    """The import cell, the code cells, the cells saving each chart file name and the cells building SHARED"""
+    with open(path, encoding='utf-8') as f:
+        cells = [''.join(cell['source']) for cell in json.load(f)['cells'] if cell['cell_type'] == 'code']
+    # The first code cell holds the notebook's imports
+    setup = cells[0]
+    writers = {}
+    builders = {}
+    for index, source in enumerate(cells):
+        charts = saved_charts(source)
+        for name in charts:
+            writers.setdefault(name, []).append(index)
+        if not charts:
+            for name in assigned_names(source) & set(SHARED):
+                builders[name] = source
+    return setup, cells, writers, builders
+
+
+def task_cells(task, cells, writers):
+    """Sources of the cells writing a task's charts, in notebook order"""
+    missing = [name for name in task.outputs if name not in writers]
+    if missing:
+        raise ValueError(f"{task.name}: no notebook cell saves {', '.join(missing)}")
+    # Cells of one task share variables (the opportunity cost chart reuses
+    # the duration tables of the cell before it), so they run in order in
+    # one namespace
+    indexes = sorted({index for name in task.outputs for index in writers[name]})
+    return [cells[index] for index in indexes]
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def library_versions():
+    # Read from the package metadata, without importing the libraries
+    versions = []
+    for name in LIBRARIES:
+        try:
+            versions.append(f"{name}={metadata.version(name)}")
+        except metadata.PackageNotFoundError:
+            versions.append(f"{name}=missing")
+    return ';'.join(versions)
+
+
+def analytics_hash():
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(ANALYTICS_DIR)):
+        if name.endswith('.py'):
+            digest.update(name.encode('utf-8'))
+            digest.update(file_hash(os.path.join(ANALYTICS_DIR, name)).encode('ascii'))
+    return digest.hexdigest()
+
+
+def shared_sources(task, builders):
+    """Sources of the cells building a task's shared variables, by variable"""
+    missing = [name for name in task.inputs if name in SHARED and name not in builders]
+    if missing:
+        raise ValueError(f"{task.name}: no notebook cell builds {', '.join(missing)}")
+    return {name: builders[name] for name in task.inputs if name in SHARED}
+
+
+def task_key(task, setup, sources, shared, versions, data_hash):
+    digest = hashlib.sha256()
+    for part in [versions, setup, *shared.values(), *sources]:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    for data in task.inputs:
+        if data in SHARED:
+            continue
+        digest.update(data.encode('utf-8'))
+        digest.update((data_hash if data == FRAME else file_hash(os.path.join(ANALYSIS_DIR, data))).encode('ascii'))
+    return digest.hexdigest()
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    temporary = MANIFEST + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temporary, MANIFEST)
+
+
+def cached_frame(data_path, data_hash):
+    """Path of a pickle of the notebook's data frame, written on first use per data version"""
+    path = os.path.join(CACHE_DIR, f'frame-{data_hash[:16]}.pkl')
+    if not os.path.exists(path):
+        import pandas as pd
+
+        started = time.perf_counter()
+        if data_path.endswith('.csv'):
+            frame = pd.read_csv(data_path)
+        else:
+            frame = pd.read_excel(data_path)
+        frame.columns = frame.columns.str.strip()
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        frame.to_pickle(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        logger.info(f"Read {os.path.basename(data_path)} in {time.perf_counter() - started:.1f}s, cached as {os.path.basename(path)}")
+        # Keep only the current version
+        for name in os.listdir(CACHE_DIR):
+            if name.startswith('frame-') and name.endswith('.pkl') and os.path.join(CACHE_DIR, name) != path:
+                os.remove(os.path.join(CACHE_DIR, name))
+    return path
+
+
+class _PathRewriter(ast.NodeTransformer):
+    """Point the notebook's relative 'charts/' and 'data/' paths at the staging and data directories"""
+
+    def __init__(self, staging):
+        self.staging = staging
+
+    def visit_Constant(self, node):
+        value = node.value
+        if isinstance(value, str):
+            if value == 'charts' or value.startswith('charts/'):
+                node = ast.copy_location(ast.Constant(self.staging + value[len('charts'):]), node)
+            elif value.startswith('data/'):
+                node = ast.copy_location(ast.Constant(os.path.join(ANALYSIS_DIR, value)), node)
+        return node
+
+
+# Worker process state, set by _init_worker
+_namespace = None
+_frame_path = None
+_frame = None
+# SHARED variables built in this worker
+_shared = {}
+
+
+def _init_worker(setup, frame_path):
+    global _namespace, _frame_path
+    import matplotlib
+    matplotlib.use('Agg')
+    sys.path.append(REPO_DIR)
+    # As in Jupyter, cells run as __main__
+    _namespace = {'__name__': '__main__'}
+    exec(compile(setup, '<notebook imports>', 'exec'), _namespace)
+    _frame_path = frame_path
+
+
+def _load_frame():
+    global _frame
+    if _frame is None:
+        import pandas as pd
+        _frame = pd.read_pickle(_frame_path)
+    return _frame
+
+
+def _shared_variable(name, source):
+    """A SHARED variable, built by its notebook cell on first use in this worker"""
+    if name not in _shared:
+        namespace = dict(_namespace, df=_load_frame().copy())
+        exec(compile(source, f'<notebook {name}>', 'exec'), namespace)
+        _shared[name] = namespace[name]
+    return _shared[name]
+
+
+def _run_task(name, sources, needs_frame, shared, staging):
+    """Run a task's cells in this worker; returns the seconds taken"""
+    import matplotlib.pyplot as plt
+
+    started = time.perf_counter()
+    namespace = dict(_namespace)
+    if needs_frame:
+        # Cells add columns to df; each task starts from the original
+        namespace['df'] = _load_frame().copy()
+    for variable, source in shared.items():
+        namespace[variable] = _shared_variable(variable, source)
+    try:
+        # The cells' printed tables would interleave across workers
+        with contextlib.redirect_stdout(io.StringIO()):
+            for number, source in enumerate(sources):
+                tree = _PathRewriter(staging).visit(ast.parse(source))
+                exec(compile(ast.fix_missing_locations(tree), f'<{name} cell {number + 1}>', 'exec'), namespace)
+    finally:
+        plt.close('all')
+    return time.perf_counter() - started
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Build the charts of analyse.ipynb in parallel, skipping unchanged ones.")
+    parser.add_argument('tasks', nargs='*', help="task names to build (default: all)")
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1, help="worker processes (default: CPU count)")
+    parser.add_argument('--force', action='store_true', help="rebuild even if nothing changed")
+    parser.add_argument('--data', default=DATA_PATH, help="spreadsheet or CSV the notebook's df is read from")
+    parser.add_argument('--output', default=OUTPUT_DIR, help="directory the charts are written to")
+    parser.add_argument('--list', action='store_true', help="list the tasks and whether they are up to date")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    setup, cells, writers, builders = read_notebook(NOTEBOOK)
+    undeclared = sorted(set(writers) - {name for task in TASKS for name in task.outputs})
+    if undeclared:
+        logger.warning(f"Charts saved by the notebook but not declared as tasks: {', '.join(undeclared)}")
+
+    unknown = set(args.tasks) - {task.name for task in TASKS}
+    if unknown:
+        logger.error(f"Unknown tasks: {', '.join(sorted(unknown))}")
+        return 2
+    tasks = [task for task in TASKS if not args.tasks or task.name in args.tasks]
+
+    versions = f"{library_versions()};analytics={analytics_hash()}"
+    data_hash = file_hash(args.data)
+    # Keys of the last builds, per output directory
+    manifests = load_manifest()
+    manifest = manifests.setdefault(os.path.abspath(args.output), {})
+    plan = []
+    for task in tasks:
+        sources = task_cells(task, cells, writers)
+        shared = shared_sources(task, builders)
+        key = task_key(task, setup, sources, shared, versions, data_hash)
+        current = manifest.get(task.name) == key and all(
+            os.path.exists(os.path.join(args.output, name)) for name in task.outputs
+        )
+        if args.list:
+            print(f"{task.name:28} {'up to date' if current else 'stale':11} {', '.join(task.outputs)}")
+        elif args.force or not current:
+            plan.append((task, sources, shared, key))
+    if args.list:
+        return 0
+    if not plan:
+        logger.info("All charts are up to date")
+        return 0
+
+    frame_path = None
+    if any(FRAME in task.inputs for task, _, _, _ in plan):
+        frame_path = cached_frame(args.data, data_hash)
+
+    os.makedirs(args.output, exist_ok=True)
+    started = time.perf_counter()
+    failed = []
+    jobs = max(1, min(args.jobs, len(plan)))
+    logger.info(f"Building {len(plan)} of {len(tasks)} tasks with {jobs} processes")
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(setup, frame_path)) as pool:
+        running = {}
+        for task, sources, shared, key in plan:
+            # Staged next to the output directory, so the final moves are renames
+            staging = tempfile.mkdtemp(prefix=f'.{task.name}-', dir=args.output)
+            future = pool.submit(_run_task, task.name, sources, FRAME in task.inputs, shared, staging)
+            running[future] = (task, key, staging)
+
+        for future in as_completed(running):
+            task, key, staging = running[future]
+            try:
+                seconds = future.result()
+                missing = [name for name in task.outputs if not os.path.exists(os.path.join(staging, name))]
+                if missing:
+                    raise RuntimeError(f"did not write {', '.join(missing)}")
+                for name in task.outputs:
+                    os.replace(os.path.join(staging, name), os.path.join(args.output, name))
+                manifest[task.name] = key
+                save_manifest(manifests)
+                logger.info(f"Built {task.name} ({len(task.outputs)} charts) in {seconds:.1f}s")
+            except Exception as e:
+                failed.append(task.name)
+                logger.error(f"Task {task.name} failed: {e!r}")
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+
+    logger.info(f"Built {len(plan) - len(failed)} tasks in {time.perf_counter() - started:.1f}s"
+                + (f"; failed: {', '.join(failed)}" if failed else ''))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,26 @@
+"""Process metrics shared by the dashboard, the Telegram bot and the notebook.
+
+The apps import this package from the repository root, which they add to
+sys.path on startup. Each dataset version is aggregated once, by
+RunningAggregates.from_frame(), and endpoints, charts and summaries read
+their per-group figures from the result. analytics.streaming computes the
+same aggregates from sources too large to load, reading them in chunks, and
+analytics.trends rolls their daily groups up into weekly and monthly
+trends; analytics.cube answers slices of the process dimensions from the
+cells of an aggregate cube.
+"""
+from analytics.aggregates import (
+    DIMENSIONS,
+    MEASURES,
+    PER_TON_COLUMNS,
+    RunningAggregates,
+    add_per_ton,
+)
+from analytics.cube import CUBE_COLUMNS, CUBE_DIMENSION, Cube
+from analytics.ranking import TopK, top_positions
+from analytics.trends import FREQUENCIES, TREND_DIMENSION, trend_table
+
+__all__ = [
+    'CUBE_COLUMNS', 'CUBE_DIMENSION', 'Cube', 'DIMENSIONS', 'FREQUENCIES', 'MEASURES', 'PER_TON_COLUMNS',
+    'RunningAggregates', 'TREND_DIMENSION', 'TopK', 'add_per_ton', 'top_positions', 'trend_table',
+]
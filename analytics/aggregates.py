@@ -0,0 +1,371 @@
+"""Running, mergeable aggregates of the process measures.
+
+from_frame() computes the totals and, per dimension, every group statistic
+in a single multi-column aggregation pass. Each group keeps count, sum, min,
+max and m2 (the sum of squared deviations from the mean) per measure; means
+are sum / count and variances m2 / (count - 1). These statistics are
+mergeable: aggregates of a batch of new rows combine with the existing ones
+in O(number of groups). Ingesting rows therefore costs O(1) per row
+regardless of how much history has been loaded, and summary and per-group
+figures are read from the maintained state instead of a groupby over the
+whole frame.
+
+Frames are aggregated in blocks of BLOCK_ROWS rows, which bounds the
+working memory, and the blocks' aggregates are merged in row order. A
+source read in chunks of any size (see analytics.streaming) is regrouped
+into the same blocks, so it gets bit-for-bit the same figures as the whole
+frame in memory: floating-point sums do not depend on how the source was
+read.
+
+A dimension is a column name, a function of a frame returning one key per
+row (such as the day a process started, see analytics.trends), or a tuple
+of these, whose groups are the combinations that occur, indexed by a
+MultiIndex.
+"""
+import functools
+
+import numpy as np
+import pandas as pd
+
+# Short name -> source column
+MEASURES = {
+    'efficiency': 'Emalın Səmərəliliyi (%)',
+    'energy': 'Enerji İstifadəsi (kWh)',
+    'cost': 'Əməliyyat Xərcləri (AZN)',
+    'co2': 'Ətraf Mühitə Təsir (g CO2 ekvivalent)',
+    'co2_per_ton': 'CO2_per_ton',
+    'incidents': 'Təhlükəsizlik Hadisələri',
+    'duration': 'Prosesin Müddəti (saat)',
+    'volume': 'Emal Həcmi (ton)',
+    'workers': 'İşçi Sayı',
+    'energy_per_ton': 'Energy_per_ton',
+    'cost_per_ton': 'Cost_per_ton',
+}
+
+DIMENSIONS = ['Proses Tipi', 'İstifadə Edilən Katalizatorlar', 'Proses Addımı', 'Təchizatçı Adı']
+
+# Per-ton columns -> the measure they divide by the processed volume
+PER_TON_COLUMNS = {
+    'Energy_per_ton': 'Enerji İstifadəsi (kWh)',
+    'CO2_per_ton': 'Ətraf Mühitə Təsir (g CO2 ekvivalent)',
+    'Cost_per_ton': 'Əməliyyat Xərcləri (AZN)',
+}
+
+STATS = ('count', 'sum', 'min', 'max', 'm2')
+
+# Rows aggregated at a time; also the block size of streamed sources
+BLOCK_ROWS = 500_000
+
+# Key of the single row of the dataset-wide totals
+TOTAL = '__total__'
+
+
+def add_per_ton(frame):
+    """Derive the per-ton columns a frame lacks, in place.
+
+    data.csv carries them; the spreadsheet and ingested rows may not.
+    Columns already present are kept as they are.
+    """
+    for column, source in PER_TON_COLUMNS.items():
+        if column not in frame.columns and source in frame.columns and 'Emal Həcmi (ton)' in frame.columns:
+            frame[column] = pd.to_numeric(frame[source]) / pd.to_numeric(frame['Emal Həcmi (ton)'])
+    return frame
+
+
+def _dimension_name(dimension):
+    return dimension if isinstance(dimension, str) else dimension.__name__
+
+
+def _factorize(keys, names):
+    """Group codes of each row (-1 for rows without a group) and the group labels.
+
+    keys holds one array-like per level. A single level is labelled by an
+    object Index, several by a MultiIndex of the combinations that occur.
+    Labels, and so the group codes, are in sorted order.
+    """
+    if len(keys) == 1:
+        codes, labels = pd.factorize(keys[0], sort=True)
+        return codes, pd.Index(np.asarray(labels, dtype=object), dtype=object)
+
+    level_codes, levels = zip(*(pd.factorize(key, sort=True) for key in keys))
+    # One code per combination, in mixed radix of the level sizes
+    combined = np.zeros(len(level_codes[0]), dtype=np.int64)
+    missing = np.zeros(len(combined), dtype=bool)
+    for part, level in zip(level_codes, levels):
+        combined = combined * len(level) + part
+        missing |= part < 0
+    codes = np.full(len(combined), -1, dtype=np.intp)
+    codes[~missing], combinations = pd.factorize(combined[~missing], sort=True)
+
+    decoded = []
+    for level in reversed(levels):
+        decoded.append(combinations % len(level))
+        combinations = combinations // len(level)
+    return codes, pd.MultiIndex(levels=levels, codes=decoded[::-1], names=names)
+
+
+def _group_codes(frame, dimension):
+    parts = dimension if isinstance(dimension, tuple) else (dimension,)
+    keys = [part(frame) if callable(part) else frame[part] for part in parts]
+    return _factorize(keys, [_dimension_name(part) for part in parts])
+
+
+def _measure_values(frame):
+    """The measures of a frame as a float matrix with one row per measure"""
+    return np.stack([frame[column].to_numpy(dtype=np.float64, na_value=np.nan) for column in MEASURES.values()])
+
+
+def _column_stats(values, codes, size):
+    """count, sum, min, max and m2 of each measure per group code 0 .. size - 1.
+
+    values holds one measure per row. Each statistic is accumulated for all
+    groups at once with bincount or ufunc.at, in row order, without sorting
+    the rows by group. The result has one row per group code.
+    """
+    stats = np.empty((len(STATS), len(values), size))
+    counts, sums, minima, maxima, m2 = stats
+    minima.fill(np.nan)
+    maxima.fill(np.nan)
+    for measure, column in enumerate(values):
+        missing = np.isnan(column)
+        filled = np.where(missing, 0.0, column)
+        counts[measure] = np.bincount(codes, weights=~missing, minlength=size)
+        sums[measure] = np.bincount(codes, weights=filled, minlength=size)
+        np.fmin.at(minima[measure], codes, column)
+        np.fmax.at(maxima[measure], codes, column)
+        # Deviations from each group's own mean, so m2 does not lose
+        # precision the way a sum of squares minus the squared sum would
+        deviations = filled - (sums[measure] / np.maximum(counts[measure], 1))[codes]
+        deviations[missing] = 0.0
+        m2[measure] = np.bincount(codes, weights=deviations * deviations, minlength=size)
+    return stats.reshape(len(STATS) * len(values), size).T
+
+
+def blocks(chunks, rows):
+    """Regroup a sequence of frames into frames of exactly `rows` rows each.
+
+    Only the last block may be shorter. Chunks that already have `rows`
+    rows, such as a CSV read with chunksize=rows, pass through unchanged.
+    """
+    pending, count = [], 0
+    for chunk in chunks:
+        while len(chunk):
+            part = chunk.iloc[:rows - count]
+            chunk = chunk.iloc[len(part):]
+            pending.append(part)
+            count += len(part)
+            if count == rows:
+                yield pending[0] if len(pending) == 1 else pd.concat(pending, ignore_index=True)
+                pending, count = [], 0
+    if pending:
+        yield pending[0] if len(pending) == 1 else pd.concat(pending, ignore_index=True)
+
+
+def partial_aggregates(frame, dimension=None, values=None):
+    """Aggregate a frame into one stats row per group (or one total row).
+
+    Columns are '<measure>_<stat>' plus 'rows', the number of rows per group.
+    The measures are read into one float matrix and each statistic is
+    accumulated for all groups in one pass over it. Rows with no group are
+    left out. values, the frame's measure matrix, can be passed in to share
+    it between dimensions.
+    """
+    if values is None:
+        values = _measure_values(frame)
+    if dimension is None:
+        codes = np.zeros(values.shape[1], dtype=np.intp)
+        labels = pd.Index([TOTAL], dtype=object)
+    else:
+        codes, labels = _group_codes(frame, dimension)
+        if len(codes) and codes.min() < 0:
+            keep = codes >= 0
+            codes, values = codes[keep], values[:, keep]
+
+    rows = np.bincount(codes, minlength=len(labels))
+    stats = _column_stats(values, codes, len(labels))
+    if dimension is not None:
+        # Groups without rows are left out; the total row is kept even for
+        # an empty frame, with nothing counted or summed
+        present = np.flatnonzero(rows)
+        rows, stats, labels = rows[present], stats[present], labels[present]
+    return _stats_frame(stats, rows, labels)
+
+
+def _stats_frame(stats, rows, labels):
+    stats = pd.DataFrame(
+        stats,
+        index=labels,
+        columns=[f'{name}_{stat}' for stat in STATS for name in MEASURES],
+    )
+    stats['rows'] = rows.astype(np.float64)
+    return stats
+
+
+def regroup_partials(stats, keys, names):
+    """Merge the groups of a partial aggregate that share a key.
+
+    keys holds one array-like per level of the new groups, aligned with the
+    rows of stats; e.g. daily groups roll up into weekly ones with the week
+    of each day. Only the group statistics are read, never the rows.
+    """
+    codes, labels = _factorize(keys, names)
+    merged = regroup_matrix(stats.to_numpy(dtype=np.float64), list(stats.columns), codes, len(labels))
+    return pd.DataFrame(merged, index=labels, columns=stats.columns)
+
+
+@functools.lru_cache(maxsize=None)
+def _stat_positions(columns):
+    """Positions of each statistic's column per measure, in STATS order"""
+    return [[columns.index(f'{measure}_{stat}') for measure in MEASURES] for stat in STATS]
+
+
+def regroup_matrix(values, columns, codes, size):
+    """regroup_partials() on the matrix of a partial aggregate.
+
+    values has one row per group and the given columns; rows with the same
+    code 0 .. size - 1 are merged, all columns at once.
+    """
+    count, total, minimum, maximum, m2 = _stat_positions(tuple(columns))
+    merged = np.zeros((size, len(columns)))
+    # count, sum and rows add up; min, max and m2 are replaced below
+    np.add.at(merged, codes, values)
+
+    for positions, merge in ((minimum, np.fmin), (maximum, np.fmax)):
+        extrema = np.full((size, len(positions)), np.nan)
+        merge.at(extrema, codes, values[:, positions])
+        merged[:, positions] = extrema
+
+    # Each group's m2 plus its count times its mean's squared distance from
+    # the merged mean
+    mean = values[:, total] / np.maximum(values[:, count], 1)
+    merged_mean = merged[:, total] / np.maximum(merged[:, count], 1)
+    spread = np.where(values[:, count] > 0, values[:, count] * (mean - merged_mean[codes]) ** 2, 0.0)
+    deviations = np.zeros((size, len(m2)))
+    np.add.at(deviations, codes, values[:, m2] + spread)
+    merged[:, m2] = deviations
+    return merged
+
+
+def _merge_m2(left, right, measure):
+    """m2 of two merged groups (Chan et al.'s pairwise update)"""
+    left_count = left[f'{measure}_count'].fillna(0)
+    right_count = right[f'{measure}_count'].fillna(0)
+    both = (left_count > 0) & (right_count > 0)
+    delta = right[f'{measure}_sum'] / right_count.where(both) - left[f'{measure}_sum'] / left_count.where(both)
+    correction = (delta * delta * left_count * right_count / (left_count + right_count)).fillna(0)
+    return left[f'{measure}_m2'].fillna(0) + right[f'{measure}_m2'].fillna(0) + correction
+
+
+def merge_partials(left, right):
+    """Combine two partial aggregates produced by partial_aggregates"""
+    index = left.index.union(right.index, sort=False)
+    left = left.reindex(index)
+    right = right.reindex(index)
+
+    merged = pd.DataFrame(index=index)
+    for column in left.columns:
+        if column.endswith('_min'):
+            merged[column] = np.fmin(left[column], right[column])
+        elif column.endswith('_max'):
+            merged[column] = np.fmax(left[column], right[column])
+        elif column.endswith('_m2'):
+            merged[column] = _merge_m2(left, right, column[:-len('_m2')])
+        else:
+            merged[column] = left[column].fillna(0) + right[column].fillna(0)
+    return merged
+
+
+def statistic(stats, measure, stat):
+    """A statistic of a measure per row of partial aggregates.
+
+    stat is one of STATS or mean, var or std; groups with too few values
+    get NaN. stats is a frame of partial aggregates, giving a Series on its
+    index, or a mapping of its columns to arrays, giving an array.
+    """
+    if stat not in ('mean', 'var', 'std'):
+        return stats[f'{measure}_{stat}']
+    count = np.asarray(stats[f'{measure}_count'])
+    if stat == 'mean':
+        value = np.asarray(stats[f'{measure}_sum']) / np.where(count > 0, count, np.nan)
+    else:
+        # Sample variance, as pandas' var() and std()
+        value = np.asarray(stats[f'{measure}_m2']) / (np.where(count > 1, count, np.nan) - 1)
+        if stat == 'std':
+            value = np.sqrt(value)
+    return pd.Series(value, index=stats.index) if isinstance(stats, pd.DataFrame) else value
+
+
+class RunningAggregates:
+    """Totals and per-dimension group statistics for one dataset version.
+
+    Instances are immutable: add() returns a new object, so a request holding
+    an older Dataset keeps consistent figures.
+    """
+
+    def __init__(self, totals, groups):
+        self.totals = totals
+        self.groups = groups
+
+    @classmethod
+    def from_frame(cls, frame, dimensions=DIMENSIONS):
+        if len(frame) > BLOCK_ROWS:
+            return cls.from_chunks([frame], dimensions)
+        return cls._from_block(frame, dimensions)
+
+    @classmethod
+    def from_chunks(cls, chunks, dimensions=DIMENSIONS):
+        """Aggregate the consecutive chunks of one source, one block at a time.
+
+        Returns None if there are no rows.
+        """
+        aggregates = None
+        for block in blocks(chunks, BLOCK_ROWS):
+            partial = cls._from_block(block, dimensions)
+            aggregates = partial if aggregates is None else aggregates.merge(partial)
+        return aggregates
+
+    @classmethod
+    def _from_block(cls, frame, dimensions):
+        values = _measure_values(frame)
+        return cls(
+            partial_aggregates(frame, values=values),
+            {dimension: partial_aggregates(frame, dimension, values) for dimension in dimensions},
+        )
+
+    def merge(self, other):
+        """Return the aggregates of these rows followed by other's"""
+        return RunningAggregates(
+            merge_partials(self.totals, other.totals),
+            {dimension: merge_partials(stats, other.groups[dimension]) for dimension, stats in self.groups.items()},
+        )
+
+    def add(self, frame):
+        """Return the aggregates with the rows of `frame` folded in"""
+        if frame.empty:
+            return self
+        return self.merge(RunningAggregates.from_frame(frame, list(self.groups)))
+
+    @property
+    def rows(self):
+        return int(self.totals['rows'].iloc[0])
+
+    def total(self, measure, stat='sum'):
+        """A dataset-wide statistic, e.g. total('energy') or total('efficiency', 'mean')"""
+        return statistic(self.totals, measure, stat).iloc[0]
+
+    def by(self, dimension, measure, stat='mean'):
+        """A per-group statistic as a Series indexed by group, sorted by group"""
+        return statistic(self.groups[dimension], measure, stat).sort_index()
+
+    def table(self, dimension, measures, stat='mean'):
+        """Several per-group statistics as a frame with one column per measure.
+
+        Columns carry the source column names, so code written against a
+        groupby over the raw columns reads the table unchanged.
+        """
+        table = pd.DataFrame({MEASURES[measure]: self.by(dimension, measure, stat) for measure in measures})
+        return table if isinstance(dimension, tuple) else table.rename_axis(dimension)
+
+    def counts(self, dimension):
+        """Rows per group as an int Series, sorted by group"""
+        return self.groups[dimension]['rows'].astype(np.int64).sort_index()
@@ -0,0 +1,108 @@
+"""Aggregate cube over the categorical process dimensions.
+
+RunningAggregates keep the CUBE_DIMENSION groups, one cell per combination
+of process type, step, catalyst, supplier and equipment that occurs, like
+any other dimension: built in the same aggregation pass and merged as rows
+arrive. Every cell holds the mergeable statistics of aggregates.STATS, so
+Cube.rollup() answers any slice (a filter on some dimensions) grouped by
+any subset of the dimensions by merging cells, without reading the rows.
+The number of cells is the number of combinations in the data, which does
+not grow with the number of processes.
+"""
+import numpy as np
+import pandas as pd
+
+from analytics.aggregates import MEASURES, TOTAL, regroup_matrix, statistic
+
+CUBE_COLUMNS = [
+    'Proses Tipi',
+    'Proses Addımı',
+    'İstifadə Edilən Katalizatorlar',
+    'Təchizatçı Adı',
+    'İstifadə Edilən Avadanlıq',
+]
+
+CUBE_DIMENSION = tuple(CUBE_COLUMNS)
+
+
+class Cube:
+    """The cells of one dataset version's aggregates, ready for rollups.
+
+    The cells are held as plain arrays: per cube column, the sorted labels
+    and each cell's label code, and the statistics as one matrix. A rollup
+    selects cells and merges them by code with a few array operations, in
+    time proportional to the number of cells.
+    """
+
+    def __init__(self, cells):
+        self.columns = list(cells.columns)
+        self.values = cells.to_numpy(dtype=np.float64)
+        self.labels = {}
+        self.codes = {}
+        for name, level, codes in zip(cells.index.names, cells.index.levels, cells.index.codes):
+            # Labels in sorted order, so merged groups come out sorted
+            labels = np.asarray(level, dtype=object)
+            order = np.argsort(labels)
+            rank = np.empty(len(order), dtype=np.intp)
+            rank[order] = np.arange(len(order))
+            self.labels[name] = labels[order]
+            self.codes[name] = rank[np.asarray(codes)]
+
+    @classmethod
+    def from_aggregates(cls, aggregates):
+        return cls(aggregates.groups[CUBE_DIMENSION])
+
+    @property
+    def rows(self):
+        """Rows in the cells; fewer than the dataset's if some lack a cube column"""
+        return int(self.values[:, self.columns.index('rows')].sum())
+
+    def rollup(self, by=(), where=None):
+        """Statistics of the cells in a slice, merged per combination of `by`.
+
+        where maps cube columns to their accepted values (all when absent).
+        The result has the columns of aggregates.partial_aggregates and is
+        indexed by the `by` columns, sorted; with no `by` it has the one
+        TOTAL row, also for an empty slice.
+        """
+        selected = np.ones(len(self.values), dtype=bool)
+        for column, accepted in (where or {}).items():
+            selected &= np.isin(self.labels[column], list(accepted))[self.codes[column]]
+        values = self.values[selected]
+
+        by = list(by)
+        if not by:
+            merged = regroup_matrix(values, self.columns, np.zeros(len(values), dtype=np.intp), 1)
+            return pd.DataFrame(merged, index=pd.Index([TOTAL], dtype=object), columns=self.columns)
+
+        # One code per combination of the `by` labels, in mixed radix
+        combined = np.zeros(len(values), dtype=np.int64)
+        for column in by:
+            combined = combined * len(self.labels[column]) + self.codes[column][selected]
+        combinations, codes = np.unique(combined, return_inverse=True)
+        merged = regroup_matrix(values, self.columns, codes.reshape(-1), len(combinations))
+
+        level_codes = {}
+        for column in reversed(by):
+            level_codes[column] = combinations % len(self.labels[column])
+            combinations = combinations // len(self.labels[column])
+        if len(by) == 1:
+            index = pd.Index(self.labels[by[0]][level_codes[by[0]]], dtype=object, name=by[0])
+        else:
+            index = pd.MultiIndex(
+                levels=[self.labels[column] for column in by],
+                codes=[level_codes[column] for column in by],
+                names=by,
+                verify_integrity=False,
+            )
+        return pd.DataFrame(merged, index=index, columns=self.columns)
+
+    def table(self, by, measures, stat='mean', where=None):
+        """Several statistics of a rollup as a frame with one column per measure.
+
+        Like RunningAggregates.table(), columns carry the source column
+        names, so code written against a groupby over the raw columns reads
+        the table unchanged.
+        """
+        groups = self.rollup(by, where)
+        return pd.DataFrame({MEASURES[measure]: statistic(groups, measure, stat) for measure in measures})
@@ -0,0 +1,74 @@
+"""Request metrics, sampled profiling and /metrics for the Flask apps.
+
+The dashboard and the bot define their own metrics (in their metrics
+modules) and install the request hooks below with init_app(). This module
+needs flask and prometheus_client, so unlike the rest of the package it is
+not imported by analytics/__init__.py; the notebook does not need either.
+
+Setting PROFILE_SAMPLE_RATE (0-1, default 0) runs that fraction of requests
+under cProfile and writes each profile to PROFILE_DIR as
+<endpoint>-<timestamp>-<pid>.prof, for inspection with pstats or snakeviz.
+"""
+import cProfile
+import os
+import random
+import time
+
+from flask import Response, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+
+def _endpoint():
+    # The endpoint name rather than the URL keeps label cardinality bounded,
+    # and keeps secrets in URLs (the bot's webhook token) out of the labels
+    return request.endpoint or 'unmatched'
+
+
+def _before_request():
+    g.request_started = time.perf_counter()
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _teardown_request(exc):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = f"{_endpoint()}-{int(time.time() * 1000)}-{os.getpid()}.prof"
+        profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+
+
+def metrics_view():
+    # Under gunicorn, PROMETHEUS_MULTIPROC_DIR collects the figures of all workers
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app, request_latency, response_size):
+    """Install the request hooks and the /metrics endpoint on a Flask app.
+
+    request_latency is a Histogram labelled by endpoint, method and status,
+    and response_size one labelled by endpoint.
+    """
+    def after_request(response):
+        endpoint = _endpoint()
+        started = g.pop('request_started', None)
+        if started is not None:
+            request_latency.labels(endpoint, request.method, response.status_code).observe(time.perf_counter() - started)
+        if response.content_length is not None:
+            response_size.labels(endpoint).observe(response.content_length)
+        return response
+
+    app.before_request(_before_request)
+    app.after_request(after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
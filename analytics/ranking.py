@@ -0,0 +1,66 @@
+"""Best and worst rows by a measure, selected without sorting the whole source.
+
+top_positions() picks the k largest values of an array by partitioning.
+TopK keeps such a selection across the consecutive chunks of one source:
+each chunk contributes its own k candidates, which are merged with the k
+kept so far, so it holds at most 2k rows at any time and ends with the same
+rows, in the same order, as top_positions() over the whole source.
+"""
+import numpy as np
+import pandas as pd
+
+
+def top_positions(values, k):
+    """Row positions of the k largest values, largest first.
+
+    Ties are broken by row order, like nlargest(keep='first'), and NaN is
+    skipped. np.partition finds the k-th largest value in O(n); only the
+    rows above it plus the first tied rows are sorted.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    positions = np.flatnonzero(~np.isnan(values))
+    values = values[positions]
+    if len(values) > k:
+        threshold = np.partition(values, len(values) - k)[len(values) - k]
+        above = np.flatnonzero(values > threshold)
+        ties = np.flatnonzero(values == threshold)[:k - len(above)]
+        chosen = np.concatenate([above, ties])
+    else:
+        chosen = np.arange(len(values))
+    order = np.lexsort((chosen, -values[chosen]))
+    return positions[chosen[order]]
+
+
+class TopK:
+    """The k rows with the largest (or smallest) values of a column.
+
+    Feed it the chunks of a source in order with add(). rows holds the
+    selected rows' `columns`, best first, indexed by their position in the
+    source; ties go to the earlier row.
+    """
+
+    def __init__(self, k, column, columns, largest=True):
+        self.k = k
+        self.column = column
+        self.columns = list(dict.fromkeys([*columns, column]))
+        self.largest = largest
+        self.rows = pd.DataFrame(columns=self.columns)
+        self._offset = 0
+
+    def _keys(self, frame):
+        values = frame[self.column].to_numpy(dtype=np.float64, na_value=np.nan)
+        return values if self.largest else -values
+
+    def add(self, chunk):
+        """Fold in the next rows of the source"""
+        positions = top_positions(self._keys(chunk), self.k)
+        candidates = chunk[self.columns].iloc[positions]
+        candidates.index = self._offset + positions
+        self._offset += len(chunk)
+        if not len(self.rows):
+            self.rows = candidates
+            return self
+        rows = pd.concat([self.rows, candidates])
+        order = np.lexsort((rows.index.to_numpy(), -self._keys(rows)))
+        self.rows = rows.iloc[order[:self.k]]
+        return self
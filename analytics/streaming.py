@@ -0,0 +1,129 @@
+"""Out-of-core aggregation of process logs larger than memory.
+
+read_chunks() reads a CSV in chunks, or an Arrow IPC or Parquet file batch
+by batch, keeping only the columns the aggregates need. scan() folds the
+chunks into RunningAggregates and any TopK selections as they are read, so
+memory holds one block of rows (see aggregates.BLOCK_ROWS) plus the
+per-group statistics, however long the source is. The figures are the same,
+bit for bit, as RunningAggregates.from_frame() over the whole source.
+
+    python -m analytics.streaming history.csv
+
+prints the summary, per process type and catalyst figures of a source as
+JSON.
+"""
+import argparse
+import json
+import os
+import sys
+
+import pandas as pd
+
+from analytics.aggregates import BLOCK_ROWS, DIMENSIONS, MEASURES, RunningAggregates, add_per_ton
+
+# Columns scan() needs; the per-ton columns' sources are measures too
+COLUMNS = [*DIMENSIONS, *MEASURES.values()]
+
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ImportError("Reading Arrow and Parquet sources requires pyarrow") from None
+    return pyarrow
+
+
+def read_chunks(path, columns=COLUMNS, chunk_rows=BLOCK_ROWS):
+    """Yield the rows of a source as DataFrames of at most chunk_rows rows.
+
+    Requested columns the source lacks are skipped (the per-ton columns are
+    derived by scan()). Text columns of a CSV are read as categoricals.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.parquet':
+        pa = _pyarrow()
+        parquet = pa.parquet.ParquetFile(path)
+        present = [column for column in columns if column in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=present):
+            yield batch.to_pandas()
+    elif extension in ARROW_EXTENSIONS:
+        pa = _pyarrow()
+        with pa.memory_map(path, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            present = [column for column in columns if column in reader.schema.names]
+            for index in range(reader.num_record_batches):
+                # Batches are slices of the memory map; only chunk_rows rows
+                # at a time are converted
+                batch = reader.get_batch(index).select(present)
+                for start in range(0, batch.num_rows, chunk_rows):
+                    yield batch.slice(start, chunk_rows).to_pandas()
+    else:
+        header = pd.read_csv(path, nrows=0).columns
+        present = [column for column in columns if column in header]
+        dtype = {column: 'category' for column in DIMENSIONS if column in present}
+        with pd.read_csv(path, usecols=present, dtype=dtype, chunksize=chunk_rows) as reader:
+            yield from reader
+
+
+def scan(chunks, dimensions=DIMENSIONS, rankings=()):
+    """Aggregate the consecutive chunks of one source in a single pass.
+
+    Each TopK in rankings is fed every chunk too. Returns the
+    RunningAggregates, or None if the source has no rows.
+    """
+    def prepared():
+        for chunk in chunks:
+            add_per_ton(chunk)
+            for ranking in rankings:
+                ranking.add(chunk)
+            yield chunk
+
+    return RunningAggregates.from_chunks(prepared(), dimensions)
+
+
+def report(aggregates):
+    """Summary, per process type and per catalyst figures as JSON-ready data"""
+    by_type = pd.DataFrame({
+        'count': aggregates.counts('Proses Tipi'),
+        'avg_efficiency': aggregates.by('Proses Tipi', 'efficiency'),
+        'avg_energy': aggregates.by('Proses Tipi', 'energy'),
+        'avg_duration': aggregates.by('Proses Tipi', 'duration'),
+        'std_duration': aggregates.by('Proses Tipi', 'duration', 'std'),
+    })
+    catalysts = aggregates.by('İstifadə Edilən Katalizatorlar', 'efficiency')
+    return {
+        'total_processes': aggregates.rows,
+        'avg_efficiency': aggregates.total('efficiency', 'mean'),
+        'total_energy': aggregates.total('energy'),
+        'total_cost': aggregates.total('cost'),
+        'avg_co2_per_ton': aggregates.total('co2_per_ton', 'mean'),
+        'safety_incidents': aggregates.total('incidents'),
+        'by_process_type': by_type.to_dict('index'),
+        # Best mean efficiency first
+        'catalyst_efficiency': catalysts.sort_values(ascending=False, kind='stable').to_dict(),
+    }
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('source', help='process log: .csv, .parquet or an Arrow IPC file')
+    parser.add_argument('--chunk-rows', type=int, default=BLOCK_ROWS, help='rows read at a time')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    aggregates = scan(read_chunks(args.source, chunk_rows=args.chunk_rows))
+    if aggregates is None:
+        print(f"{args.source} has no rows", file=sys.stderr)
+        return 1
+    json.dump(report(aggregates), sys.stdout, ensure_ascii=False, indent=2, default=float)
+    print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Daily, weekly and monthly trends of the process measures per process type.
+
+RunningAggregates keep the TREND_DIMENSION groups, one per start day and
+process type, like any other dimension: they are built in the same
+aggregation pass as the rest and merged as rows arrive. Weekly and monthly
+figures are rolled up from the daily groups (see
+aggregates.regroup_partials), so a trend query reads a few thousand group
+statistics instead of resampling the rows, however many years they span.
+"""
+import numpy as np
+import pandas as pd
+
+from analytics.aggregates import regroup_partials, statistic
+
+START_DATE = 'Prosesin Başlama Tarixi'
+
+FREQUENCIES = ('day', 'week', 'month')
+
+
+def day(frame):
+    """The day each process started"""
+    return pd.to_datetime(frame[START_DATE], format='ISO8601').dt.normalize()
+
+
+# Start day x process type
+TREND_DIMENSION = (day, 'Proses Tipi')
+
+
+def bucket_starts(days, frequency):
+    """The first day of the day, week (starting on Monday) or month of each day"""
+    days = pd.DatetimeIndex(days)
+    if frequency == 'day':
+        return days
+    if frequency == 'week':
+        return days - pd.to_timedelta(days.dayofweek, unit='D')
+    if frequency == 'month':
+        return days - pd.to_timedelta(days.day - 1, unit='D')
+    raise ValueError(f"unknown frequency {frequency!r}; expected one of {', '.join(FREQUENCIES)}")
+
+
+def trend_buckets(aggregates, frequency='month', process_types=None, start=None, end=None):
+    """Group statistics per period and process type, sorted by both.
+
+    Only the daily groups of process_types (all when None) starting on or
+    after start and before end (either may be None) are rolled up.
+    """
+    daily = aggregates.groups[TREND_DIMENSION]
+    days = daily.index.get_level_values(0)
+    types = daily.index.get_level_values(1)
+    selected = np.ones(len(daily), dtype=bool)
+    if process_types is not None:
+        selected &= types.isin(process_types)
+    if start is not None:
+        selected &= days >= start
+    if end is not None:
+        selected &= days < end
+    daily = daily[selected]
+    return regroup_partials(
+        daily,
+        [bucket_starts(daily.index.get_level_values(0), frequency), daily.index.get_level_values(1)],
+        ['period', 'Proses Tipi'],
+    )
+
+
+def trend_table(aggregates, frequency='month', process_types=None, start=None, end=None):
+    """Trend figures with one row per period and process type.
+
+    Columns are period (the first day of the bucket), process_type, count,
+    avg_efficiency and the totals of energy, CO2, cost and safety incidents.
+    """
+    buckets = trend_buckets(aggregates, frequency, process_types, start, end)
+    return pd.DataFrame({
+        'period': buckets.index.get_level_values(0),
+        'process_type': buckets.index.get_level_values(1),
+        'count': buckets['rows'].to_numpy().astype('int64'),
+        'avg_efficiency': statistic(buckets, 'efficiency', 'mean').to_numpy(),
+        'total_energy': buckets['energy_sum'].to_numpy(),
+        'total_co2': buckets['co2_sum'].to_numpy(),
+        'total_cost': buckets['cost_sum'].to_numpy(),
+        'safety_incidents': buckets['incidents_sum'].to_numpy(),
+    })
@@ -0,0 +1,313 @@
+"""Benchmarks of the dashboard and the Telegram bot on synthetic data.
+
+    python bench.py                            # 10k and 100k rows
+    python bench.py --rows 1m 10m --repeat 3
+    python bench.py --save-baseline            # also record results/baseline.json
+    python bench.py -k summary                 # only benchmarks whose name contains 'summary'
+
+For each row count a synthetic process log is generated once (see
+generate_data.py) and kept in DATA_DIR. Each app is then benchmarked in a
+Python process of its own, since both apps have modules named app,
+data_store and metrics:
+
+- dashboard: loading the dataset from the CSV (load_csv, which converts it
+  to Arrow) and from the Arrow file written by that load (load_arrow), and
+  every GET /api/data/* route plus the VARIANTS below, through the Flask
+  test client. Requests are timed with the response cache cleared first
+  (per-version indexes stay built, as in production) and, as
+  '<request> cached', answered from the response cache.
+- bot: loading the dataset in memory (load) and in stream mode
+  (load_stream, which aggregates the CSV in chunks), generate_data_summary
+  (the summary statistics and text, on a fresh dataset version each time
+  so nothing is memoized) and each create_*_chart function.
+
+Each benchmark runs once untimed, then --repeat times. Results hold the
+median, minimum and maximum seconds per benchmark and each process's peak
+memory, and are written as JSON to --output. When a baseline exists they
+are compared to it: a benchmark whose median is more than --tolerance
+slower than in the baseline, and by more than MIN_REGRESSION_SECONDS, is a
+regression, and the exit status is 1.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+try:
+    import resource
+except ImportError:  # Windows: peak memory is not recorded
+    resource = None
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+DATA_DIR = os.path.join(BENCHMARKS_DIR, '.data')
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+BASELINE = os.path.join(RESULTS_DIR, 'baseline.json')
+
+SUITES = {
+    'dashboard': os.path.join(REPO_DIR, 'dashboard'),
+    'bot': os.path.join(REPO_DIR, 'telegram'),
+}
+
+# Dashboard requests timed besides each route with its default parameters:
+# (route, query parameters)
+VARIANTS = [
+    ('/api/data/summary', {'process_type': 'Neft Emalı'}),
+    ('/api/data/bundle', {'process_type': 'Neft Emalı'}),
+    ('/api/data/energy_vs_efficiency', {'mode': 'bins'}),
+    ('/api/data/efficiency_by_temp_pressure', {'mode': 'bins'}),
+    ('/api/data/timeline', {'supplier': 'AB Katalizatorları'}),
+]
+
+# Slowdowns smaller than this are treated as noise
+MIN_REGRESSION_SECONDS = 0.001
+
+logger = logging.getLogger(__name__)
+
+
+def row_count(text):
+    """Parse a row count such as 100000, 100k or 50m"""
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1:].lower(), 1)
+    number = text[:-1] if multiplier > 1 else text
+    try:
+        return int(float(number) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid row count: {text!r}")
+
+
+class Runner:
+    """Times benchmarks in the current process"""
+
+    def __init__(self, repeat, select=None):
+        self.repeat = repeat
+        self.select = select
+        self.results = {}
+
+    def wanted(self, name):
+        return not self.select or any(part in name for part in self.select)
+
+    def time(self, name, run, setup=None):
+        """Time run() repeat times after one untimed call; setup() runs before each, untimed"""
+        if not self.wanted(name):
+            return
+        seconds = []
+        for attempt in range(self.repeat + 1):
+            if setup is not None:
+                setup()
+            started = time.perf_counter()
+            run()
+            if attempt:
+                seconds.append(time.perf_counter() - started)
+        self.results[name] = {
+            'median': statistics.median(seconds),
+            'min': min(seconds),
+            'max': max(seconds),
+        }
+        logger.info(f"{name}: {statistics.median(seconds) * 1000:.2f} ms")
+
+
+def dashboard_suite(runner, data_path):
+    os.environ['DATA_PATH'] = data_path
+    from data_store import DataStore
+
+    arrow_path = os.path.splitext(data_path)[0] + '.arrow'
+
+    def remove_arrow():
+        if os.path.exists(arrow_path):
+            os.remove(arrow_path)
+
+    runner.time('load_csv', lambda: DataStore(data_path).get(), setup=remove_arrow)
+    DataStore(data_path).get()
+    runner.time('load_arrow', lambda: DataStore(data_path).get())
+
+    import app as dashboard
+    client = dashboard.app.test_client()
+    routes = sorted(
+        rule.rule for rule in dashboard.app.url_map.iter_rules()
+        if rule.rule.startswith('/api/data/') and 'GET' in rule.methods and not rule.arguments
+    )
+    for route, params in [(route, {}) for route in routes] + VARIANTS:
+        name = f'{route}?{urlencode(params)}' if params else route
+
+        def get():
+            response = client.get(route, query_string=params)
+            if response.status_code != 200:
+                raise RuntimeError(f"{name} answered {response.status_code}")
+
+        runner.time(name, get, setup=dashboard.response_cache.clear)
+        runner.time(f'{name} cached', get)
+
+
+def bot_suite(runner, data_path):
+    from data_store import Dataset, DataStore
+    from charts import CHARTS, chart_input, render_png
+    from summary import data_summary, render_summary
+
+    runner.time('load', lambda: DataStore(data_path).get())
+    runner.time('load_stream', lambda: DataStore(data_path, stream=True).get())
+    dataset = DataStore(data_path).get()
+
+    def generate_data_summary():
+        # A new version, so the aggregates and the summary are computed again
+        render_summary(data_summary(Dataset(dataset.frame, dataset.version, 0)))
+
+    runner.time('generate_data_summary', generate_data_summary)
+    for name, (create_chart, _) in CHARTS.items():
+        runner.time(create_chart.__name__, lambda name=name: render_png(name, chart_input(name, dataset)))
+
+
+def run_suite(suite, data_path, repeat, select, result_path):
+    """Run one suite in this process (started by run_suites) and write its results"""
+    app_dir = SUITES[suite]
+    os.chdir(app_dir)
+    sys.path.insert(0, app_dir)
+    sys.path.append(REPO_DIR)
+    if suite == 'bot':
+        import matplotlib
+        matplotlib.use('Agg')
+
+    runner = Runner(repeat, select)
+    {'dashboard': dashboard_suite, 'bot': bot_suite}[suite](runner, data_path)
+    result = {'benchmarks': runner.results}
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20, 1)
+    with open(result_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+
+
+def run_suites(suites, data_path, repeat, select):
+    results = {}
+    for suite in suites:
+        with tempfile.TemporaryDirectory() as directory:
+            result_path = os.path.join(directory, 'result.json')
+            command = [
+                sys.executable, os.path.abspath(__file__), '--run-suite', suite, '--data', data_path,
+                '--repeat', str(repeat), '--result-file', result_path,
+            ] + [f'-k={part}' for part in select or ()]
+            subprocess.run(command, check=True)
+            with open(result_path, encoding='utf-8') as f:
+                results[suite] = json.load(f)
+    return results
+
+
+def data_file(rows, seed):
+    """Path of the synthetic data for a row count, generated on first use"""
+    path = os.path.join(DATA_DIR, f'process-{rows}-seed{seed}.csv')
+    if not os.path.exists(path):
+        import generate_data
+        os.makedirs(DATA_DIR, exist_ok=True)
+        generate_data.generate(path, rows, seed)
+    return path
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Print each benchmark against the baseline; returns the number of regressions"""
+    regressions = 0
+    print(f"{'rows':>12}  {'benchmark':<60} {'median':>12} {'baseline':>12} {'change':>8}")
+    for rows, suites in results['results'].items():
+        for suite, result in suites.items():
+            base = baseline.get('results', {}).get(rows, {}).get(suite, {}).get('benchmarks', {})
+            for name, stats in result['benchmarks'].items():
+                line = f"{int(rows):>12,}  {suite + ' ' + name:<60} {stats['median'] * 1000:>9.2f} ms"
+                if name in base:
+                    before = base[name]['median']
+                    change = stats['median'] / before - 1 if before else 0.0
+                    line += f" {before * 1000:>9.2f} ms {change:>+8.1%}"
+                    if change > tolerance and stats['median'] - before > MIN_REGRESSION_SECONDS:
+                        line += '  REGRESSION'
+                        regressions += 1
+                print(line)
+    return regressions
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=row_count, nargs='+', default=[10_000, 100_000],
+                        help='row counts to benchmark, e.g. 10k 1m 50m')
+    parser.add_argument('--suite', choices=list(SUITES), nargs='+', default=list(SUITES))
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='timed runs per benchmark')
+    parser.add_argument('-k', dest='select', action='append', help='only benchmarks whose name contains this')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic data')
+    parser.add_argument('-o', '--output', default=os.path.join(RESULTS_DIR, 'latest.json'))
+    parser.add_argument('--baseline', default=BASELINE, help='results to compare against, if the file exists')
+    parser.add_argument('--save-baseline', action='store_true', help='also write the results to --baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='slowdown counted as a regression')
+    # Internal: run one suite in this process
+    parser.add_argument('--run-suite', choices=list(SUITES), help=argparse.SUPPRESS)
+    parser.add_argument('--data', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.run_suite:
+        # Only warnings from the apps, whose loads and renders log at INFO
+        logging.getLogger().setLevel(logging.WARNING)
+        logger.setLevel(logging.INFO)
+        run_suite(args.run_suite, args.data, args.repeat, args.select, args.result_file)
+        return 0
+
+    results = {
+        'meta': {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+        },
+        'results': {},
+    }
+    for rows in args.rows:
+        data_path = data_file(rows, args.seed)
+        logger.info(f"Benchmarking {rows:,} rows")
+        results['results'][str(rows)] = run_suites(args.suite, data_path, args.repeat, args.select)
+
+    write_json(args.output, results)
+    logger.info(f"Results written to {args.output}")
+    if args.save_baseline:
+        write_json(args.baseline, results)
+        logger.info(f"Baseline written to {args.baseline}")
+        return 0
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline or {}, args.tolerance)
+    if regressions:
+        logger.error(f"{regressions} benchmark(s) slower than the baseline by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""Seeded synthetic process data with the schema of data.csv.
+
+    python generate_data.py 1000000 -o data-1m.csv
+    python generate_data.py 50000000 -o data-50m.csv --seed 7 --years 10
+
+Rows are drawn at random from a source process log (by default the
+dashboard's data.csv), so every category occurs with its original
+frequency and only in the combinations found in the source: a process type
+keeps its own steps, catalysts, equipment and suppliers. The measures of
+each drawn row are scaled by a random factor around 1 (--jitter), so the
+generated data is not the same few hundred rows repeated, and the per-ton
+columns are recomputed from them. Start dates are spread evenly over
+--years in process ID order, as in a process log that is appended to;
+each end date keeps the offset of its source row.
+
+Rows are generated and written in chunks of CHUNK_ROWS, so memory stays
+bounded at any size. pyarrow writes the CSV (text values are quoted),
+about seven times faster than pandas. The output depends only on the
+source, the row count, the seed and the options.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+SOURCE_PATH = os.path.join(REPO_DIR, 'dashboard', 'data', 'data.csv')
+
+# The per-ton columns are derived as the analytics package at the repository root derives them
+sys.path.append(REPO_DIR)
+from analytics import PER_TON_COLUMNS
+
+CHUNK_ROWS = 1_000_000
+
+START_DATE = 'Prosesin Başlama Tarixi'
+END_DATE = 'Prosesin Bitmə Tarixi'
+VOLUME = 'Emal Həcmi (ton)'
+EFFICIENCY = 'Emalın Səmərəliliyi (%)'
+
+# Whole-number measures scaled by the jitter factor
+SCALED_COLUMNS = [
+    VOLUME,
+    'Temperatur (°C)',
+    'Təzyiq (bar)',
+    'Enerji İstifadəsi (kWh)',
+    'Ətraf Mühitə Təsir (g CO2 ekvivalent)',
+    'Əməliyyat Xərcləri (AZN)',
+]
+
+logger = logging.getLogger(__name__)
+
+
+def read_source(path=SOURCE_PATH):
+    source = pd.read_csv(path, parse_dates=[START_DATE, END_DATE])
+    source['_end_offset'] = source[END_DATE] - source[START_DATE]
+    return source
+
+
+def generate_chunk(source, rows, first_id, total_rows, rng, jitter=0.05, start='2020-01-01', years=5):
+    """Rows first_id .. first_id + rows - 1 of a total_rows row process log"""
+    frame = source.take(rng.integers(0, len(source), rows)).reset_index(drop=True)
+    frame['Proses ID'] = np.arange(first_id, first_id + rows, dtype=np.int64)
+
+    for column in SCALED_COLUMNS:
+        scaled = frame[column].to_numpy(dtype=np.float64) * rng.normal(1.0, jitter, rows)
+        frame[column] = np.maximum(np.rint(scaled), 1).astype(np.int64)
+    efficiency = frame[EFFICIENCY].to_numpy() + rng.integers(-1, 2, rows)
+    frame[EFFICIENCY] = np.clip(efficiency, 0, 100)
+
+    span_days = max(1, round(years * 365.25))
+    days = (frame['Proses ID'].to_numpy() - 1) * span_days // max(total_rows, 1)
+    frame[START_DATE] = pd.Timestamp(start) + pd.to_timedelta(days, unit='D')
+    frame[END_DATE] = frame[START_DATE] + frame['_end_offset']
+    # Written as plain dates, like the source
+    for column in (START_DATE, END_DATE):
+        frame[column] = frame[column].to_numpy().astype('datetime64[D]')
+
+    for column, measure in PER_TON_COLUMNS.items():
+        frame[column] = frame[measure] / frame[VOLUME]
+    return frame[[column for column in source.columns if column != '_end_offset']]
+
+
+def generate(path, rows, seed=0, source_path=SOURCE_PATH, **options):
+    """Write a rows-row synthetic process log to path as CSV"""
+    source = read_source(source_path)
+    started = time.perf_counter()
+    temporary = f'{path}.{os.getpid()}.tmp'
+    writer = None
+    try:
+        for index, first in enumerate(range(0, rows, CHUNK_ROWS)):
+            # One generator per chunk: the output does not depend on how
+            # much was generated before
+            rng = np.random.default_rng([seed, index])
+            chunk = generate_chunk(source, min(CHUNK_ROWS, rows - first), first + 1, rows, rng, **options)
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pa_csv.CSVWriter(temporary, table.schema)
+            writer.write_table(table)
+            if rows > CHUNK_ROWS:
+                logger.info(f"Generated {first + len(chunk):,} of {rows:,} rows")
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(temporary, path)
+    logger.info(f"Wrote {rows:,} rows to {path} in {time.perf_counter() - started:.1f}s")
+    return path
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('rows', type=int, help='number of rows to generate')
+    parser.add_argument('-o', '--output', required=True, help='CSV file to write')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--source', default=SOURCE_PATH, help='process log whose rows are sampled')
+    parser.add_argument('--jitter', type=float, default=0.05, help='standard deviation of the measure scaling')
+    parser.add_argument('--start', default='2020-01-01', help='first start date')
+    parser.add_argument('--years', type=float, default=5, help='years the start dates span')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    generate(args.output, args.rows, args.seed, args.source, jitter=args.jitter, start=args.start, years=args.years)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,109 +1,223 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template, jsonify, request, Response
+from functools import wraps
 import pandas as pd
+import hmac
+import io
 import json
 import os
+import sys
+import time
+
+# The analytics package shared with the Telegram bot lives at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_store import DataStore, IngestError
+from encoding import NotAcceptable, encode, negotiate
+from filters import ParameterError
+import metrics
+from panels import (
+    PANELS, PanelContext, compute_bundle, summary_panel, process_types_panel,
+    efficiency_by_process_panel, energy_vs_efficiency_panel, energy_by_process_panel,
+    co2_vs_cost_panel, catalyst_efficiency_panel, process_duration_panel,
+    efficiency_by_temp_pressure_panel, timeline_panel, trends_panel, cube_panel,
+)
+from response_cache import CachedResponse, ResponseCache
 
 app = Flask(__name__)
+metrics.init_app(app)
 
 # Load the data
-DATA_PATH = os.path.join(os.path.dirname(__file__), 'data', 'data.csv')
-df = pd.read_csv(DATA_PATH)
+# The CSV is converted once to a memory-mapped Arrow file (data/data.arrow)
+# and hot-reloaded whenever data.csv changes on disk. DATA_PATH points the
+# dashboard at another CSV, e.g. generated benchmark data.
+DATA_PATH = os.environ.get('DATA_PATH', os.path.join(os.path.dirname(__file__), 'data', 'data.csv'))
+store = DataStore(
+    DATA_PATH,
+    check_interval=float(os.environ.get('DATA_RELOAD_INTERVAL', 2)),
+    compact_rows=int(os.environ.get('DATA_COMPACT_ROWS', 100000)),
+)
+store.get()
+
+# Serialized API responses, valid for one dataset version
+response_cache = ResponseCache(max_entries=int(os.environ.get('RESPONSE_CACHE_SIZE', 512)))
+
+def cached_api(view):
+    """Serve an /api/data/* view from the response cache with ETag support.
+
+    The view is called with the current Dataset and only on a cache miss; it
+    returns a panel payload, which is encoded in the negotiated format (see
+    encoding.py). Results are keyed by dataset version, path, query string
+    and format, and every response carries a strong ETag so repeat loads
+    can be answered with 304. Large bodies are sent gzip-compressed to
+    clients that accept it.
+    """
+    panel = view.__name__.removeprefix('get_')
+
+    @wraps(view)
+    def wrapper(**kwargs):
+        dataset = store.get()
+        try:
+            fmt = negotiate(request)
+        except ParameterError as e:
+            return jsonify({'error': str(e)}), 400
+        key = (request.path, tuple(sorted(request.args.items(multi=True))), fmt)
 
-# Convert dates to datetime
-df['Prosesin Başlama Tarixi'] = pd.to_datetime(df['Prosesin Başlama Tarixi'])
-df['Prosesin Bitmə Tarixi'] = pd.to_datetime(df['Prosesin Bitmə Tarixi'])
+        entry = response_cache.get(dataset.version, key)
+        metrics.observe_cache('response', 'hit' if entry is not None else 'miss')
+        if entry is None:
+            # Errors are returned as-is and never cached
+            started = time.perf_counter()
+            try:
+                body, mimetype = encode(view(dataset, **kwargs), fmt)
+            except ParameterError as e:
+                return jsonify({'error': str(e)}), 400
+            except NotAcceptable as e:
+                return jsonify({'error': str(e)}), 406
+            metrics.PANEL_SECONDS.labels(panel).observe(time.perf_counter() - started)
+            entry = CachedResponse(body, mimetype)
+            response_cache.put(dataset.version, key, entry)
+
+        body, etag, headers = entry.body, entry.etag, dict(entry.headers)
+        if 'gzip' in request.accept_encodings and entry.gzipped is not None:
+            body, etag = entry.gzipped, entry.gzip_etag
+            headers['Content-Encoding'] = 'gzip'
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304, headers=headers)
+        else:
+            response = Response(body, mimetype=entry.mimetype, headers=headers)
+        response.set_etag(etag)
+        response.vary.update(['Accept', 'Accept-Encoding'])
+        # Let browsers keep the body but revalidate it on every load
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/api/data/summary', methods=['GET'])
-def get_summary():
+@cached_api
+def get_summary(dataset):
     """Return summary statistics for the dashboard"""
-    summary = {
-        'total_processes': len(df),
-        'avg_efficiency': round(df['Emalın Səmərəliliyi (%)'].mean(), 2),
-        'total_energy': int(df['Enerji İstifadəsi (kWh)'].sum()),
-        'total_cost': int(df['Əməliyyat Xərcləri (AZN)'].sum()),
-        'avg_co2': round(df['CO2_per_ton'].mean(), 2),
-        'process_types': df['Proses Tipi'].value_counts().to_dict(),
-        'safety_incidents': int(df['Təhlükəsizlik Hadisələri'].sum())
-    }
-    return jsonify(summary)
+    return summary_panel(PanelContext(dataset, request.args))
 
 @app.route('/api/data/process_types', methods=['GET'])
-def get_process_types():
+@cached_api
+def get_process_types(dataset):
     """Return counts of each process type"""
-    counts = df['Proses Tipi'].value_counts().reset_index()
-    counts.columns = ['process_type', 'count']
-    return jsonify(counts.to_dict(orient='records'))
+    return process_types_panel(PanelContext(dataset, request.args))
 
 @app.route('/api/data/efficiency_by_process', methods=['GET'])
-def get_efficiency_by_process():
+@cached_api
+def get_efficiency_by_process(dataset):
     """Return average efficiency by process type"""
-    efficiency = df.groupby('Proses Tipi')['Emalın Səmərəliliyi (%)'].mean().reset_index()
-    efficiency.columns = ['process_type', 'avg_efficiency']
-    return jsonify(efficiency.to_dict(orient='records'))
+    return efficiency_by_process_panel(PanelContext(dataset, request.args))
 
 @app.route('/api/data/energy_vs_efficiency', methods=['GET'])
-def get_energy_vs_efficiency():
+@cached_api
+def get_energy_vs_efficiency(dataset):
     """Return energy usage vs efficiency data for scatter plot"""
-    data = df[['Enerji İstifadəsi (kWh)', 'Emalın Səmərəliliyi (%)', 'Proses Tipi']].copy()
-    data.columns = ['energy_usage', 'efficiency', 'process_type']
-    
-    # Convert to records for JSON serialization
-    return jsonify(data.to_dict(orient='records'))
+    return energy_vs_efficiency_panel(PanelContext(dataset, request.args))
 
 @app.route('/api/data/energy_by_process', methods=['GET'])
-def get_energy_by_process():
+@cached_api
+def get_energy_by_process(dataset):
     """Return average energy usage by process type"""
-    energy = df.groupby('Proses Tipi')['Enerji İstifadəsi (kWh)'].mean().reset_index()
-    energy.columns = ['process_type', 'avg_energy']
-    return jsonify(energy.to_dict(orient='records'))
+    return energy_by_process_panel(PanelContext(dataset, request.args))
+
 @app.route('/api/data/co2_vs_cost', methods=['GET'])
-def get_co2_vs_cost():
+@cached_api
+def get_co2_vs_cost(dataset):
     """Return CO2 emissions vs operational cost"""
-    data = df[['CO2_per_ton', 'Cost_per_ton', 'Proses Tipi']].copy()
-    data.columns = ['co2_per_ton', 'cost_per_ton', 'process_type']
-    return jsonify(data.to_dict(orient='records'))
+    return co2_vs_cost_panel(PanelContext(dataset, request.args))
 
 @app.route('/api/data/catalyst_efficiency', methods=['GET'])
-def get_catalyst_efficiency():
+@cached_api
+def get_catalyst_efficiency(dataset):
     """Return average efficiency by catalyst type"""
-    catalyst_data = df.groupby('İstifadə Edilən Katalizatorlar')['Emalın Səmərəliliyi (%)'].mean().reset_index()
-    catalyst_data = catalyst_data.sort_values('Emalın Səmərəliliyi (%)', ascending=False)
-    catalyst_data.columns = ['catalyst', 'avg_efficiency']
-    
-    # Take top 10 for readability
-    return jsonify(catalyst_data.head(10).to_dict(orient='records'))
+    return catalyst_efficiency_panel(PanelContext(dataset, request.args))
 
 @app.route('/api/data/process_duration', methods=['GET'])
-def get_process_duration():
+@cached_api
+def get_process_duration(dataset):
     """Return average process duration by process type"""
-    duration = df.groupby('Proses Tipi')['Prosesin Müddəti (saat)'].mean().reset_index()
-    duration.columns = ['process_type', 'avg_duration']
-    return jsonify(duration.to_dict(orient='records'))
+    return process_duration_panel(PanelContext(dataset, request.args))
 
 @app.route('/api/data/efficiency_by_temp_pressure', methods=['GET'])
-def get_efficiency_by_temp_pressure():
+@cached_api
+def get_efficiency_by_temp_pressure(dataset):
     """Return efficiency data by temperature and pressure"""
-    data = df[['Temperatur (°C)', 'Təzyiq (bar)', 'Emalın Səmərəliliyi (%)', 'Proses Tipi']].copy()
-    data.columns = ['temperature', 'pressure', 'efficiency', 'process_type']
-    return jsonify(data.to_dict(orient='records'))
+    return efficiency_by_temp_pressure_panel(PanelContext(dataset, request.args))
 
 @app.route('/api/data/timeline', methods=['GET'])
-def get_timeline():
+@cached_api
+def get_timeline(dataset):
     """Return process timeline data"""
-    timeline = df[['Proses ID', 'Proses Tipi', 'Prosesin Başlama Tarixi', 'Prosesin Bitmə Tarixi', 'Emalın Səmərəliliyi (%)']].copy()
-    
-    # Convert dates to string for JSON serialization
-    timeline['Prosesin Başlama Tarixi'] = timeline['Prosesin Başlama Tarixi'].dt.strftime('%Y-%m-%d')
-    timeline['Prosesin Bitmə Tarixi'] = timeline['Prosesin Bitmə Tarixi'].dt.strftime('%Y-%m-%d')
-    
-    timeline.columns = ['process_id', 'process_type', 'start_date', 'end_date', 'efficiency']
-    
-    # Only return most recent 50 processes for performance
-    return jsonify(timeline.tail(50).to_dict(orient='records'))
+    return timeline_panel(PanelContext(dataset, request.args))
+
+@app.route('/api/data/trends', methods=['GET'])
+@cached_api
+def get_trends(dataset):
+    """Return daily, weekly or monthly trends per process type"""
+    return trends_panel(PanelContext(dataset, request.args))
+
+@app.route('/api/data/cube', methods=['GET'])
+@cached_api
+def get_cube(dataset):
+    """Return a slice of the aggregate cube, grouped by the requested dimensions"""
+    return cube_panel(PanelContext(dataset, request.args))
+
+@app.route('/api/data/bundle', methods=['GET'])
+@cached_api
+def get_bundle(dataset):
+    """Return several dashboard panels in one response.
+
+    ?panels=summary,timeline selects a subset; all panels are returned by default.
+    """
+    requested = request.args.get('panels')
+    names = [name.strip() for name in requested.split(',') if name.strip()] if requested else list(PANELS)
+    unknown = [name for name in names if name not in PANELS]
+    if unknown:
+        raise ParameterError(f"Unknown panels: {', '.join(unknown)} (available: {', '.join(PANELS)})")
+    return compute_bundle(dataset, names, request.args)
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest():
+    """Append process records to the dataset.
+
+    Accepts a JSON list of records (or {"records": [...]}) or a text/csv body
+    with a header row, using the same column names as data/data.csv. The
+    per-ton columns may be omitted and are then derived. When INGEST_TOKEN
+    is set, requests must send it as "Authorization: Bearer <token>".
+    """
+    token = os.environ.get('INGEST_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        if request.mimetype == 'text/csv':
+            rows = pd.read_csv(io.BytesIO(request.get_data()))
+        elif request.is_json:
+            payload = request.get_json(silent=True)
+            if payload is None:
+                raise IngestError('Request body is not valid JSON')
+            records = payload.get('records') if isinstance(payload, dict) else payload
+            if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+                raise IngestError('Expected a list of records (JSON objects)')
+            rows = pd.DataFrame.from_records(records)
+        else:
+            return jsonify({'error': 'Send application/json or text/csv'}), 415
+        dataset = store.ingest(rows)
+    except (IngestError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'ingested': len(rows),
+        'total_processes': len(dataset),
+        'version': dataset.version,
+    })
 
 if __name__ == '__main__':
     # Get port from environment variable or use 5000 as default
@@ -0,0 +1,411 @@
+"""Columnar data store for the dashboard.
+
+The process log CSV is converted once into an Arrow IPC file that sits next
+to it. The IPC file is memory-mapped on load, so start-up cost and resident
+memory no longer grow with the size of the CSV text. When the CSV changes on
+disk the store rebuilds the IPC file and swaps the new dataset in without a
+restart.
+
+Rows can also be appended while running, either through DataStore.ingest()
+or by another process appending lines to the CSV ("tail mode"). Appended
+rows are parsed on their own and folded into the running aggregates; the
+rest of the file is not read again.
+
+Several processes (e.g. gunicorn workers) can serve the same files. Numeric
+columns of the loaded frame point straight into the memory-mapped IPC file,
+so workers share those pages through the OS page cache instead of each
+holding a private copy. A file lock makes sure only one process converts
+the CSV or appends to it at a time; the others wait and then map the
+snapshot it wrote.
+"""
+import contextlib
+import io
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+from analytics import CUBE_DIMENSION, DIMENSIONS, TREND_DIMENSION, RunningAggregates, add_per_ton
+import metrics
+
+logger = logging.getLogger(__name__)
+
+START_DATE_COLUMN = 'Prosesin Başlama Tarixi'
+END_DATE_COLUMN = 'Prosesin Bitmə Tarixi'
+
+# Low-cardinality text columns stored dictionary-encoded (pandas categoricals)
+CATEGORICAL_COLUMNS = [
+    'Proses Tipi',
+    'Proses Addımı',
+    'İstifadə Edilən Katalizatorlar',
+    'Emal Məhsulları',
+    'İstifadə Edilən Avadanlıq',
+    'Təchizatçı Adı',
+    'Proses Qrupları',
+]
+
+DATE_COLUMNS = [START_DATE_COLUMN, END_DATE_COLUMN]
+
+# Schema metadata key recording which CSV an IPC file was built from
+SOURCE_SIGNATURE_KEY = b'source_signature'
+
+# Bytes before the end of the consumed CSV that must be unchanged for new
+# bytes to be treated as an append rather than a rewrite
+TAIL_MARKER_SIZE = 256
+
+
+# Groups kept in the running aggregates: the per-category figures, the
+# daily trend buckets of /api/data/trends and the cells of /api/data/cube
+AGGREGATE_DIMENSIONS = [*DIMENSIONS, TREND_DIMENSION, CUBE_DIMENSION]
+
+
+class IngestError(ValueError):
+    """Raised when ingested rows do not match the dataset schema"""
+
+
+class Dataset:
+    """An immutable, loaded version of the process data"""
+
+    def __init__(self, frame, version, load_seconds, aggregates=None):
+        self.frame = frame
+        self.version = version
+        self.load_seconds = load_seconds
+        self.aggregates = aggregates if aggregates is not None else RunningAggregates.from_frame(frame, AGGREGATE_DIMENSIONS)
+        self.loaded_at = time.time()
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.frame)
+
+    def derived(self, name, build):
+        """Return build(frame), computed once per dataset version.
+
+        Used for indexes and other structures that are expensive to build
+        but only depend on the (immutable) frame.
+        """
+        value = self._derived.get(name)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(name)
+                if value is None:
+                    value = build(self.frame)
+                    self._derived[name] = value
+        return value
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Hold an exclusive advisory lock on `path` across processes"""
+    with open(path, 'a') as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def source_signature(path):
+    """Return a cheap fingerprint of a file based on its size and mtime"""
+    return stat_signature(os.stat(path))
+
+
+def stat_signature(stat):
+    """source_signature() of an os.stat() result"""
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+
+def _column_types():
+    types = {column: pa.dictionary(pa.int32(), pa.string()) for column in CATEGORICAL_COLUMNS}
+    types.update({column: pa.timestamp('ns') for column in DATE_COLUMNS})
+    return types
+
+
+def _sort_dictionary(column):
+    """Re-encode a dictionary column so its categories are in sorted order.
+
+    Keeps groupby/value_counts output in the same alphabetical order the
+    dashboard returned when the columns were plain strings.
+    """
+    chunk = column.combine_chunks()
+    order = pc.sort_indices(chunk.dictionary)
+    rank = pc.sort_indices(order)
+    indices = pc.take(rank, chunk.indices).cast(chunk.indices.type)
+    return pa.DictionaryArray.from_arrays(indices, chunk.dictionary.take(order))
+
+
+def convert_csv(csv_path, ipc_path, signature):
+    """Convert the CSV at csv_path into a typed Arrow IPC file at ipc_path"""
+    table = pa_csv.read_csv(
+        csv_path,
+        convert_options=pa_csv.ConvertOptions(column_types=_column_types()),
+    )
+    # Batches parsed in parallel carry their own dictionaries; the IPC file
+    # format needs a single dictionary per column
+    table = table.unify_dictionaries().combine_chunks()
+    for column in CATEGORICAL_COLUMNS:
+        index = table.schema.get_field_index(column)
+        table = table.set_column(index, column, _sort_dictionary(table.column(index)))
+    table = table.replace_schema_metadata({SOURCE_SIGNATURE_KEY: signature.encode()})
+
+    # Write to a temporary file and rename so readers never see a partial file
+    tmp_path = f'{ipc_path}.{os.getpid()}.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, ipc_path)
+    return table.num_rows
+
+
+def conform_rows(rows, frame):
+    """Validate new rows against the dataset frame and convert their types"""
+    # Per-ton columns are derived from the raw measures when omitted
+    rows = add_per_ton(rows.copy())
+
+    missing = [column for column in frame.columns if column not in rows.columns]
+    if missing:
+        raise IngestError(f"Missing columns: {', '.join(missing)}")
+    extra = [column for column in rows.columns if column not in frame.columns]
+    if extra:
+        raise IngestError(f"Unknown columns: {', '.join(extra)}")
+    rows = rows[list(frame.columns)]
+
+    for column in frame.columns:
+        dtype = frame[column].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            values = rows[column]
+            # Rows read from the CSV tail already hold text categories
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                if not values.map(pd.api.types.is_scalar).all():
+                    raise IngestError(f"Invalid value in '{column}': expected text")
+                # Categories are text; e.g. a numeric supplier code read from CSV
+                rows[column] = values.where(values.isna(), values.astype(str))
+            continue
+        try:
+            if dtype.kind == 'M':
+                rows[column] = pd.to_datetime(rows[column], format='ISO8601').astype(dtype)
+            elif dtype.kind in 'iuf':
+                values = pd.to_numeric(rows[column])
+                if dtype.kind != 'f' and values.notna().all() and (values == values.round()).all():
+                    values = values.astype(dtype)
+                rows[column] = values
+        except (TypeError, ValueError) as e:
+            raise IngestError(f"Invalid value in '{column}': {e}")
+    return rows.reset_index(drop=True)
+
+
+def append_rows(frame, rows):
+    """Concatenate conformed rows to a frame, merging categories"""
+    columns = {}
+    for column in frame.columns:
+        if isinstance(frame[column].dtype, pd.CategoricalDtype):
+            columns[column] = pd.api.types.union_categoricals(
+                [frame[column].array, pd.Categorical(rows[column])],
+                sort_categories=True,
+            )
+        else:
+            columns[column] = pd.concat([frame[column], rows[column]], ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def read_ipc(ipc_path):
+    """Memory-map an Arrow IPC file and return (table, source signature)"""
+    source = pa.memory_map(ipc_path, 'r')
+    table = pa.ipc.open_file(source).read_all()
+    metadata = table.schema.metadata or {}
+    signature = metadata.get(SOURCE_SIGNATURE_KEY, b'').decode()
+    return table, signature
+
+
+class DataStore:
+    """Serves the current Dataset and hot-reloads it when the CSV changes.
+
+    Change detection is a stat() of the source file, done at most once per
+    check_interval seconds on the request path. The first request to notice a
+    change updates the dataset; concurrent requests keep serving the previous
+    version until the new one is swapped in. If the file only grew, the new
+    lines are appended; any other change triggers a full reload.
+    """
+
+    def __init__(self, csv_path, ipc_path=None, check_interval=2.0, compact_rows=100000):
+        self.csv_path = csv_path
+        self.ipc_path = ipc_path or os.path.splitext(csv_path)[0] + '.arrow'
+        self.lock_path = self.ipc_path + '.lock'
+        self.check_interval = check_interval
+        # Appended rows live in private memory; after this many the dataset
+        # is reloaded from a fresh (shared, memory-mapped) snapshot
+        self.compact_rows = compact_rows
+        self._appended_rows = 0
+        self._dataset = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+        # How much of the CSV the current dataset covers, and its last bytes
+        self._source_size = 0
+        self._tail_marker = b''
+
+    def get(self):
+        """Return the current Dataset, reloading first if the source changed"""
+        if self._dataset is None:
+            with self._reload_lock:
+                if self._dataset is None:
+                    self._load()
+        elif time.monotonic() - self._last_check >= self.check_interval:
+            # Only one thread checks/rebuilds; others keep the current dataset
+            if self._reload_lock.acquire(blocking=False):
+                try:
+                    self._refresh()
+                finally:
+                    self._reload_lock.release()
+        return self._dataset
+
+    def ingest(self, rows):
+        """Append rows (a DataFrame with the CSV's columns) to the dataset.
+
+        The rows are validated, appended to the CSV so they survive restarts,
+        and folded into the current dataset without re-reading the file.
+        Returns the new Dataset.
+        """
+        with self._reload_lock:
+            if self._dataset is None:
+                self._load()
+            else:
+                # Pick up a rewrite by another process before validating
+                self._refresh()
+            # An empty payload has no columns to validate
+            if rows.empty:
+                return self._dataset
+            rows = conform_rows(rows, self._dataset.frame)
+
+            text = rows.to_csv(header=False, index=False, date_format='%Y-%m-%d')
+            with file_lock(self.lock_path):
+                # Read what other processes appended since the last check
+                # first, so the dataset covers the file up to where these
+                # rows are written
+                if not self._append_tail():
+                    raise IngestError(f"{self.csv_path} was rewritten during ingestion, retry")
+                with open(self.csv_path, 'rb+') as source:
+                    end = source.seek(0, os.SEEK_END)
+                    if end > 0:
+                        source.seek(-1, os.SEEK_END)
+                        if source.read(1) != b'\n':
+                            text = '\n' + text
+                    written = source.write(text.encode('utf-8'))
+                    source.flush()
+                    signature = stat_signature(os.fstat(source.fileno()))
+            # Bytes of a line another process left unfinished (if any) are
+            # skipped along with these rows
+            return self._append(rows, signature, consumed=end - self._source_size + written)
+
+    def _refresh(self):
+        self._last_check = time.monotonic()
+        try:
+            signature = source_signature(self.csv_path)
+        except OSError as e:
+            logger.warning(f"Cannot stat {self.csv_path}, keeping current data: {e}")
+            return
+        if signature == self._dataset.version:
+            return
+        try:
+            if self._appended_rows >= self.compact_rows:
+                logger.info(f"Compacting {self._appended_rows} appended rows into a new snapshot")
+                self._load()
+            elif not self._append_tail():
+                logger.info(f"Source data changed, reloading {self.csv_path}")
+                self._load()
+        except Exception as e:
+            logger.error(f"Reload failed, keeping version {self._dataset.version}: {e}")
+
+    def _append_tail(self):
+        """Append lines added to the CSV since the last read.
+
+        Returns False if the file was rewritten rather than appended to.
+        """
+        with open(self.csv_path, 'rb') as source:
+            # Read no further than the size the signature records, so bytes
+            # written after the stat are left for the next check
+            stat = os.fstat(source.fileno())
+            signature = stat_signature(stat)
+            size = stat.st_size
+            if size < self._source_size:
+                return False
+            source.seek(self._source_size - len(self._tail_marker))
+            if source.read(len(self._tail_marker)) != self._tail_marker:
+                return False
+            new_bytes = source.read(size - self._source_size)
+
+        # A writer may be part-way through a line; leave it for the next check
+        complete = new_bytes.rfind(b'\n') + 1
+        if complete == 0:
+            return True
+        frame = self._dataset.frame
+        table = pa_csv.read_csv(
+            io.BytesIO(new_bytes[:complete]),
+            read_options=pa_csv.ReadOptions(column_names=list(frame.columns)),
+            convert_options=pa_csv.ConvertOptions(column_types=_column_types()),
+        )
+        rows = conform_rows(table.to_pandas(), frame)
+        self._append(rows, signature, consumed=complete)
+        logger.info(f"Appended {len(rows)} rows from {self.csv_path}")
+        return True
+
+    def _append(self, rows, signature, consumed):
+        """Fold rows read from the next `consumed` bytes of the CSV into the dataset"""
+        started = time.perf_counter()
+        previous = self._dataset
+        frame = append_rows(previous.frame, rows)
+        aggregates = previous.aggregates.add(rows)
+
+        self._source_size += consumed
+        self._appended_rows += len(rows)
+        self._tail_marker = self._read_marker()
+        self._dataset = Dataset(frame, signature, time.perf_counter() - started, aggregates)
+        metrics.observe_dataset('append', self._dataset)
+        return self._dataset
+
+    def _read_marker(self):
+        with open(self.csv_path, 'rb') as source:
+            start = max(0, self._source_size - TAIL_MARKER_SIZE)
+            source.seek(start)
+            return source.read(self._source_size - start)
+
+    def _load(self):
+        started = time.perf_counter()
+
+        # The first process to get the lock converts; the rest reuse its file
+        with file_lock(self.lock_path):
+            stat = os.stat(self.csv_path)
+            signature = stat_signature(stat)
+            size = stat.st_size
+            table = None
+            if os.path.exists(self.ipc_path):
+                table, built_from = read_ipc(self.ipc_path)
+                if built_from != signature:
+                    table = None
+            if table is None:
+                rows = convert_csv(self.csv_path, self.ipc_path, signature)
+                logger.info(f"Converted {self.csv_path} to {self.ipc_path} ({rows} rows)")
+                table, _ = read_ipc(self.ipc_path)
+
+        # split_blocks keeps numeric columns as views of the memory map
+        frame = table.to_pandas(split_blocks=True)
+        self._appended_rows = 0
+        self._source_size = size
+        self._tail_marker = self._read_marker()
+        dataset = Dataset(frame, signature, time.perf_counter() - started)
+        self._dataset = dataset
+        self._last_check = time.monotonic()
+        logger.info(f"Loaded dataset version {signature}: {len(frame)} rows in {dataset.load_seconds:.3f}s")
+        metrics.observe_dataset('full', dataset)
+        return dataset
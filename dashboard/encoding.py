@@ -0,0 +1,97 @@
+"""Response encodings for the dashboard API.
+
+Panels return plain dicts/lists with pandas DataFrames for their tabular
+parts. This module turns such a payload into bytes in one of three formats:
+
+    records   JSON, one object per row (the default, what the charts use)
+    columnar  JSON, {"columns": [...], "data": {column: [...]}} per table
+    arrow     Apache Arrow IPC stream (application/vnd.apache.arrow.stream)
+
+JSON is serialized with orjson, which writes numpy arrays directly, so the
+columnar shape never builds a Python object per value.
+"""
+import orjson
+import pandas as pd
+import pyarrow as pa
+
+from filters import ParameterError
+
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+JSON_MIMETYPE = 'application/json'
+
+FORMATS = ('records', 'columnar', 'arrow')
+
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+class NotAcceptable(Exception):
+    """Raised when a payload cannot be encoded in the requested format"""
+
+
+def negotiate(request):
+    """Pick the response format from ?format= or the Accept header"""
+    requested = request.args.get('format')
+    if requested:
+        if requested not in FORMATS:
+            raise ParameterError(f"'format' must be one of: {', '.join(FORMATS)}")
+        return requested
+    if request.accept_mimetypes.best_match([JSON_MIMETYPE, ARROW_MIMETYPE]) == ARROW_MIMETYPE:
+        return 'arrow'
+    return 'records'
+
+
+def _column_values(series):
+    # Numeric columns go to orjson as numpy arrays; text, categorical and
+    # datetime columns have no native numpy representation there
+    if series.dtype.kind == 'M':
+        series = series.dt.strftime('%Y-%m-%d')
+    if series.dtype.kind in 'biuf':
+        return series.to_numpy()
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _columnar(frame):
+    return {
+        'columns': list(frame.columns),
+        'data': {column: _column_values(frame[column]) for column in frame.columns},
+    }
+
+
+def _jsonable(payload, fmt):
+    if isinstance(payload, pd.DataFrame):
+        return _columnar(payload) if fmt == 'columnar' else payload.to_dict(orient='records')
+    if isinstance(payload, dict):
+        return {key: _jsonable(value, fmt) for key, value in payload.items()}
+    if isinstance(payload, list):
+        return [_jsonable(value, fmt) for value in payload]
+    return payload
+
+
+def _arrow(payload):
+    """Encode the single table in a payload; other scalars become metadata"""
+    if isinstance(payload, pd.DataFrame):
+        frame, metadata = payload, {}
+    else:
+        tables = [key for key, value in payload.items() if isinstance(value, pd.DataFrame)] if isinstance(payload, dict) else []
+        if len(tables) != 1:
+            raise NotAcceptable('Only single-table responses are available as Arrow')
+        frame = payload[tables[0]]
+        metadata = {
+            key: orjson.dumps(value, option=_ORJSON_OPTIONS)
+            for key, value in payload.items() if key != tables[0]
+        }
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    if metadata:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode(payload, fmt):
+    """Serialize a panel payload; returns (body, mimetype)"""
+    if fmt == 'arrow':
+        return _arrow(payload), ARROW_MIMETYPE
+    return orjson.dumps(_jsonable(payload, fmt), option=_ORJSON_OPTIONS), JSON_MIMETYPE
@@ -0,0 +1,116 @@
+"""Row filter grammar shared by every /api/data/* endpoint.
+
+Query parameters:
+
+    process_type, step, supplier, catalyst, equipment
+        Exact category match. Repeat a parameter to match any of several
+        values (?catalyst=Aktiv+karbon&catalyst=Platinum+katalizatoru).
+    date_from, date_to
+        Process start date range, both inclusive (YYYY-MM-DD).
+    temperature_min, temperature_max, pressure_min, pressure_max
+        Inclusive numeric ranges.
+
+Filters are resolved against the per-version indexes in indexes.py and
+combined by intersecting sorted row positions, so the cost depends on how
+many rows match rather than on the size of the dataset.
+"""
+import numpy as np
+import pandas as pd
+
+from indexes import category_index, numeric_index, start_date_index
+
+CATEGORY_FILTERS = {
+    'process_type': 'Proses Tipi',
+    'step': 'Proses Addımı',
+    'supplier': 'Təchizatçı Adı',
+    'catalyst': 'İstifadə Edilən Katalizatorlar',
+    'equipment': 'İstifadə Edilən Avadanlıq',
+}
+
+RANGE_FILTERS = {
+    'temperature': 'Temperatur (°C)',
+    'pressure': 'Təzyiq (bar)',
+}
+
+
+class ParameterError(ValueError):
+    """Raised when a query parameter is malformed"""
+
+
+class RowFilter:
+    """A parsed set of filter conditions"""
+
+    def __init__(self, categories=None, date_from=None, date_to=None, ranges=None):
+        # column -> list of accepted values
+        self.categories = categories or {}
+        self.date_from = date_from
+        self.date_to = date_to
+        # column -> (minimum, maximum); either bound may be None
+        self.ranges = ranges or {}
+
+    def __bool__(self):
+        return bool(self.categories or self.ranges or self.date_from is not None or self.date_to is not None)
+
+    @classmethod
+    def from_params(cls, params):
+        categories = {}
+        for name, column in CATEGORY_FILTERS.items():
+            values = [value for value in params.getlist(name) if value != '']
+            if values:
+                categories[column] = values
+
+        ranges = {}
+        for name, column in RANGE_FILTERS.items():
+            bounds = (float_param(params, f'{name}_min'), float_param(params, f'{name}_max'))
+            if bounds != (None, None):
+                ranges[column] = bounds
+
+        date_to = date_param(params, 'date_to')
+        if date_to is not None:
+            # Inclusive end date: everything before the start of the next day
+            date_to = date_to.normalize() + pd.Timedelta(days=1)
+
+        return cls(categories, date_param(params, 'date_from'), date_to, ranges)
+
+    def rows(self, dataset):
+        """Sorted positions of the matching rows, or None when unfiltered"""
+        if not self:
+            return None
+
+        selections = [category_index(dataset, column).rows(values) for column, values in self.categories.items()]
+        selections += [numeric_index(dataset, column).rows(*bounds) for column, bounds in self.ranges.items()]
+        if self.date_from is not None or self.date_to is not None:
+            index = start_date_index(dataset)
+            lo, hi = index.window(self.date_from, self.date_to)
+            selections.append(np.sort(index.positions[lo:hi]))
+
+        # Intersect the smallest selections first
+        selections.sort(key=len)
+        rows = selections[0]
+        for selection in selections[1:]:
+            if len(rows) == 0:
+                break
+            rows = np.intersect1d(rows, selection, assume_unique=True)
+        return rows
+
+
+def float_param(params, name):
+    """Read a float query parameter (or None)"""
+    raw = params.get(name)
+    if raw is None or raw == '':
+        return None
+    try:
+        return float(raw)
+    except ValueError:
+        raise ParameterError(f"'{name}' must be a number")
+
+
+def date_param(params, name):
+    """Read an ISO date query parameter as a Timestamp (or None)"""
+    raw = params.get(name)
+    if raw is None or raw == '':
+        return None
+    try:
+        return pd.Timestamp(raw)
+    except ValueError:
+        raise ParameterError(f"'{name}' must be a date (YYYY-MM-DD)")
@@ -0,0 +1,19 @@
+"""Gunicorn settings for the dashboard.
+
+The app is imported once in the master before the workers fork, so the
+dataset is converted and memory-mapped a single time and every worker
+starts from the same shared pages (see data_store.py).
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(4, multiprocessing.cpu_count())))
+preload_app = True
+
+
+def child_exit(server, worker):
+    # Drop a dead worker's live gauges from the multiprocess metrics
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
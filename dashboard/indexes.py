@@ -0,0 +1,116 @@
+"""Per-version row indexes over the process data.
+
+Indexes are built once per dataset version (see Dataset.derived) and turn
+range and equality lookups into binary searches instead of full scans. The
+aggregate cube, read by category-filtered requests, is kept the same way.
+"""
+import numpy as np
+
+from analytics import Cube
+from data_store import START_DATE_COLUMN
+
+
+class DateIndex:
+    """Row positions sorted by (start date, process id, row position).
+
+    The process id breaks ties between processes starting on the same day.
+    Ingest does not enforce unique ids, so the row position breaks the
+    remaining ties; rows are only ever appended, so the sort key of a row
+    stays the same across dataset versions.
+    """
+
+    def __init__(self, dates, ids):
+        dates = np.asarray(dates, dtype='datetime64[ns]')
+        ids = np.asarray(ids)
+        # Rows without a start date cannot be placed on the timeline
+        positions = np.flatnonzero(~np.isnat(dates))
+        order = np.lexsort((ids[positions], dates[positions]))
+        self.positions = positions[order]
+        self.dates = dates[self.positions]
+        self.ids = ids[self.positions]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def window(self, start=None, end=None):
+        """Return the [lo, hi) slice of sorted rows with start <= date < end"""
+        lo = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, 'ns'), 'left'))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(end, 'ns'), 'left'))
+        return lo, max(lo, hi)
+
+    def locate(self, date, process_id, position=0):
+        """Return the sorted position of the key (date, process_id, position)"""
+        date = np.datetime64(date, 'ns')
+        lo = int(np.searchsorted(self.dates, date, 'left'))
+        hi = int(np.searchsorted(self.dates, date, 'right'))
+        ids = self.ids[lo:hi]
+        first = lo + int(np.searchsorted(ids, process_id, 'left'))
+        last = lo + int(np.searchsorted(ids, process_id, 'right'))
+        return first + int(np.searchsorted(self.positions[first:last], position, 'left'))
+
+
+class CategoryIndex:
+    """Row positions of a categorical column, grouped by category code.
+
+    Rows of category k are positions[offsets[k]:offsets[k + 1]], already in
+    ascending row order, so an equality lookup is two array reads.
+    """
+
+    def __init__(self, column):
+        self.categories = column.cat.categories
+        codes = column.cat.codes.to_numpy()
+        self.positions = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.categories))
+        # Missing values (code -1) sort first and are skipped by the offsets
+        missing = len(codes) - counts.sum()
+        self.offsets = np.concatenate(([0], np.cumsum(counts))) + missing
+
+    def rows(self, values):
+        """Sorted row positions whose value is any of `values`"""
+        codes = self.categories.get_indexer(list(values))
+        parts = [self.positions[self.offsets[code]:self.offsets[code + 1]] for code in codes if code >= 0]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts))
+
+
+class NumericIndex:
+    """Row positions sorted by a numeric column, for range lookups"""
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        positions = np.flatnonzero(~np.isnan(values))
+        order = np.argsort(values[positions], kind='stable')
+        self.positions = positions[order]
+        self.values = values[self.positions]
+
+    def rows(self, minimum=None, maximum=None):
+        """Sorted row positions with minimum <= value <= maximum"""
+        lo = 0 if minimum is None else int(np.searchsorted(self.values, minimum, 'left'))
+        hi = len(self.values) if maximum is None else int(np.searchsorted(self.values, maximum, 'right'))
+        return np.sort(self.positions[lo:max(lo, hi)])
+
+
+def category_index(dataset, column):
+    """The CategoryIndex on `column` for a dataset version"""
+    return dataset.derived(f'category:{column}', lambda frame: CategoryIndex(frame[column]))
+
+
+def numeric_index(dataset, column):
+    """The NumericIndex on `column` for a dataset version"""
+    return dataset.derived(f'numeric:{column}', lambda frame: NumericIndex(frame[column].to_numpy()))
+
+
+def start_date_index(dataset):
+    """The DateIndex on 'Prosesin Başlama Tarixi' for a dataset version"""
+    return dataset.derived(
+        'start_date_index',
+        lambda frame: DateIndex(frame[START_DATE_COLUMN].to_numpy(), frame['Proses ID'].to_numpy()),
+    )
+
+
+def aggregate_cube(dataset):
+    """The Cube of a dataset version's running aggregates"""
+    return dataset.derived('cube', lambda frame: Cube.from_aggregates(dataset.aggregates))
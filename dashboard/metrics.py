@@ -0,0 +1,63 @@
+"""Prometheus metrics and sampled profiling for the dashboard.
+
+init_app() registers request hooks that record latency and response size
+per endpoint, and serves everything at /metrics. The data store and the
+API views record dataset loads, response cache lookups and panel compute
+times through the helpers below.
+
+Under gunicorn with several workers, set PROMETHEUS_MULTIPROC_DIR to an
+empty directory so /metrics aggregates the figures of all workers.
+
+The request hooks, sampled profiling (PROFILE_SAMPLE_RATE) and the
+/metrics view are shared with the other app, in analytics.flask_metrics.
+"""
+from prometheus_client import Counter, Gauge, Histogram
+
+from analytics import flask_metrics
+
+REQUEST_LATENCY = Histogram(
+    'dashboard_request_seconds',
+    'Request latency per endpoint',
+    ['endpoint', 'method', 'status'],
+)
+RESPONSE_SIZE = Histogram(
+    'dashboard_response_bytes',
+    'Response body size per endpoint',
+    ['endpoint'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216),
+)
+DATASET_LOAD = Histogram(
+    'dashboard_dataset_load_seconds',
+    'Time to load the dataset (full) or fold in appended rows (append)',
+    ['kind'],
+)
+DATASET_ROWS = Gauge(
+    'dashboard_dataset_rows',
+    'Rows in the current dataset version',
+    multiprocess_mode='livemax',
+)
+CACHE_REQUESTS = Counter(
+    'dashboard_cache_requests',
+    'Cache lookups by cache and result (hit or miss)',
+    ['cache', 'result'],
+)
+PANEL_SECONDS = Histogram(
+    'dashboard_panel_seconds',
+    'Time to compute and encode a panel payload on a cache miss',
+    ['panel'],
+)
+
+def observe_dataset(kind, dataset):
+    """Record a dataset load ('full') or append ('append')"""
+    DATASET_LOAD.labels(kind).observe(dataset.load_seconds)
+    DATASET_ROWS.set(len(dataset))
+
+
+def observe_cache(cache, result):
+    """Count a cache lookup; result is 'hit' or 'miss'"""
+    CACHE_REQUESTS.labels(cache, result).inc()
+
+
+def init_app(app):
+    """Install the request hooks and the /metrics endpoint on a Flask app"""
+    flask_metrics.init_app(app, REQUEST_LATENCY, RESPONSE_SIZE)
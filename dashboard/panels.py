@@ -0,0 +1,434 @@
+"""Dashboard panel computations.
+
+Each panel turns the process data into the payload of one chart: a dict, or
+a DataFrame for tabular data, which encoding.py serializes in the format the
+client asked for. Panels take a PanelContext rather than a raw frame so
+that several panels computed together (see /api/data/bundle) share one
+pass over the data.
+"""
+import base64
+import binascii
+import json
+
+import numpy as np
+import pandas as pd
+from werkzeug.datastructures import MultiDict
+
+from analytics import (
+    CUBE_COLUMNS, CUBE_DIMENSION, FREQUENCIES, MEASURES, TREND_DIMENSION, Cube, RunningAggregates, trend_table,
+)
+from analytics.aggregates import statistic
+from filters import CATEGORY_FILTERS, ParameterError, RowFilter, date_param
+from indexes import aggregate_cube, start_date_index
+from sampling import grid_bins, stratified_sample
+
+# Scatter panels return at most this many points unless ?max_points= is given
+DEFAULT_POINT_BUDGET = 2000
+MAX_POINT_BUDGET = 50000
+DEFAULT_GRID_BINS = 40
+MAX_GRID_BINS = 200
+DEFAULT_TIMELINE_LIMIT = 50
+MAX_TIMELINE_LIMIT = 1000
+DEFAULT_CATALYST_LIMIT = 10
+MAX_CATALYST_LIMIT = 10000
+
+# /api/data/cube defaults: measures and statistics per group
+DEFAULT_CUBE_MEASURES = ['efficiency', 'energy', 'cost', 'co2', 'incidents', 'duration', 'volume', 'workers']
+DEFAULT_CUBE_STATS = ['mean', 'sum']
+CUBE_STATS = ('count', 'sum', 'mean', 'min', 'max', 'std', 'var')
+
+# Dimensions the panels group filtered rows by
+PANEL_DIMENSIONS = ['Proses Tipi', 'İstifadə Edilən Katalizatorlar']
+
+
+class PanelContext:
+    """A filtered dataset version plus intermediate results shared between panels.
+
+    The row filters in the query parameters (see filters.py) are applied
+    once here, so every panel computed from this context sees the same rows.
+    """
+
+    def __init__(self, dataset, params=None):
+        self.dataset = dataset
+        self.params = params if params is not None else MultiDict()
+        self.filter = RowFilter.from_params(self.params)
+        self._rows = self._df = None
+        self._aggregates = None
+        self._by_process = None
+
+    @property
+    def rows(self):
+        """Sorted positions of the selected rows, or None when unfiltered"""
+        if self._rows is None and self.filter:
+            self._rows = self.filter.rows(self.dataset)
+        return self._rows
+
+    @property
+    def df(self):
+        """The selected rows"""
+        if self._df is None:
+            self._df = self.dataset.frame if self.rows is None else self.dataset.frame.take(self.rows)
+        return self._df
+
+    @property
+    def cube_slice(self):
+        """The category filters when the aggregate cube answers them, else None.
+
+        That is when there are no other filters and every row of the dataset
+        is in a cube cell.
+        """
+        row_filter = self.filter
+        if row_filter.ranges or row_filter.date_from is not None or row_filter.date_to is not None:
+            return None
+        if not set(row_filter.categories) <= set(CUBE_COLUMNS):
+            return None
+        if aggregate_cube(self.dataset).rows != len(self.dataset):
+            return None
+        return row_filter.categories
+
+    @property
+    def aggregates(self):
+        """Totals and per-group statistics of the selected rows.
+
+        The dataset's running aggregates when unfiltered, rolled up from the
+        aggregate cube when only category filters apply, otherwise computed
+        in one aggregation pass over the selected rows, shared by the panels.
+        """
+        if self._aggregates is None:
+            if not self.filter:
+                self._aggregates = self.dataset.aggregates
+            elif self.cube_slice is not None:
+                cube = aggregate_cube(self.dataset)
+                self._aggregates = RunningAggregates(
+                    cube.rollup(where=self.cube_slice),
+                    {dimension: cube.rollup([dimension], self.cube_slice) for dimension in PANEL_DIMENSIONS},
+                )
+            else:
+                self._aggregates = RunningAggregates.from_frame(self.df, PANEL_DIMENSIONS)
+        return self._aggregates
+
+    @property
+    def by_process(self):
+        """Per process type aggregates"""
+        if self._by_process is None:
+            aggregates = self.aggregates
+            self._by_process = pd.DataFrame({
+                'count': aggregates.counts('Proses Tipi'),
+                'avg_efficiency': aggregates.by('Proses Tipi', 'efficiency'),
+                'avg_energy': aggregates.by('Proses Tipi', 'energy'),
+                'avg_duration': aggregates.by('Proses Tipi', 'duration'),
+            })
+        return self._by_process
+
+    def int_param(self, name, default, minimum, maximum):
+        """Read an integer query parameter, validating its range"""
+        raw = self.params.get(name)
+        if raw is None or raw == '':
+            return default
+        try:
+            value = int(raw)
+        except ValueError:
+            raise ParameterError(f"'{name}' must be an integer")
+        if not minimum <= value <= maximum:
+            raise ParameterError(f"'{name}' must be between {minimum} and {maximum}")
+        return value
+
+    def list_param(self, name, default, choices):
+        """Read a comma-separated list query parameter, validating each item"""
+        raw = self.params.get(name)
+        if raw is None:
+            return list(default)
+        values = [value.strip() for value in raw.split(',') if value.strip()]
+        unknown = [value for value in values if value not in choices]
+        if unknown:
+            raise ParameterError(f"Unknown {name}: {', '.join(unknown)} (available: {', '.join(choices)})")
+        return values
+
+    def process_type_counts(self):
+        """Process type counts, most frequent first (like value_counts)"""
+        return self.by_process['count'].sort_values(ascending=False, kind='stable')
+
+
+def _by_process_records(ctx, column):
+    values = ctx.by_process[column].reset_index()
+    values.columns = ['process_type', column]
+    return values
+
+
+def _round(value):
+    # None rather than NaN (invalid JSON) when a filter matches no rows
+    return None if pd.isna(value) else round(value, 2)
+
+
+def summary_panel(ctx):
+    """Summary statistics for the dashboard"""
+    aggregates = ctx.aggregates
+    return {
+        'total_processes': aggregates.rows,
+        'avg_efficiency': _round(aggregates.total('efficiency', 'mean')),
+        'total_energy': int(aggregates.total('energy')),
+        'total_cost': int(aggregates.total('cost')),
+        'avg_co2': _round(aggregates.total('co2_per_ton', 'mean')),
+        'process_types': ctx.process_type_counts().to_dict(),
+        'safety_incidents': int(aggregates.total('incidents'))
+    }
+
+
+def process_types_panel(ctx):
+    """Counts of each process type"""
+    counts = ctx.process_type_counts().reset_index()
+    counts.columns = ['process_type', 'count']
+    return counts
+
+
+def efficiency_by_process_panel(ctx):
+    """Average efficiency by process type"""
+    return _by_process_records(ctx, 'avg_efficiency')
+
+
+def _scatter(ctx, columns, names, value_column=None):
+    """Downsample a scatter panel to a fixed-size payload.
+
+    ?mode=sample (default) returns at most ?max_points= rows, stratified by
+    process type. ?mode=bins returns per process type grid cells of the first
+    two columns (?bins= per axis) with a point count, plus the mean of
+    value_column when one is given.
+    """
+    mode = ctx.params.get('mode', 'sample')
+    df = ctx.df
+
+    if mode == 'sample':
+        budget = ctx.int_param('max_points', DEFAULT_POINT_BUDGET, 1, MAX_POINT_BUDGET)
+        if len(df) > budget:
+            df = df.take(stratified_sample(df['Proses Tipi'].cat.codes.to_numpy(), budget))
+        data = df[columns].copy()
+        data.columns = names
+        return data
+
+    if mode == 'bins':
+        bins = ctx.int_param('bins', DEFAULT_GRID_BINS, 1, MAX_GRID_BINS)
+        process_type = df['Proses Tipi']
+        valid = (process_type.cat.codes >= 0) & df[columns[:2]].notna().all(axis=1)
+        if value_column is not None:
+            valid &= df[value_column].notna()
+        df = df[valid]
+        if df.empty:
+            return pd.DataFrame(columns=names + ['count'])
+
+        group_codes, x, y, counts, means = grid_bins(
+            df[columns[0]].to_numpy(),
+            df[columns[1]].to_numpy(),
+            df['Proses Tipi'].cat.codes.to_numpy(),
+            bins,
+            None if value_column is None else df[value_column].to_numpy(),
+        )
+        data = pd.DataFrame({names[0]: x, names[1]: y})
+        if means is not None:
+            data[names[columns.index(value_column)]] = means
+        data['process_type'] = process_type.cat.categories.to_numpy()[group_codes]
+        data['count'] = counts
+        return data
+
+    raise ParameterError("'mode' must be 'sample' or 'bins'")
+
+
+def energy_vs_efficiency_panel(ctx):
+    """Energy usage vs efficiency data for scatter plot"""
+    return _scatter(
+        ctx,
+        ['Enerji İstifadəsi (kWh)', 'Emalın Səmərəliliyi (%)', 'Proses Tipi'],
+        ['energy_usage', 'efficiency', 'process_type'],
+    )
+
+
+def energy_by_process_panel(ctx):
+    """Average energy usage by process type"""
+    return _by_process_records(ctx, 'avg_energy')
+
+
+def co2_vs_cost_panel(ctx):
+    """CO2 emissions vs operational cost"""
+    return _scatter(
+        ctx,
+        ['CO2_per_ton', 'Cost_per_ton', 'Proses Tipi'],
+        ['co2_per_ton', 'cost_per_ton', 'process_type'],
+    )
+
+
+def catalyst_efficiency_panel(ctx):
+    """Average efficiency by catalyst type, best first.
+
+    The top ?top= catalysts (default 10, for readability); ?top=all ranks
+    every catalyst. (Not ?limit=, which a bundle would share with the
+    timeline.)
+    """
+    if ctx.params.get('top') == 'all':
+        limit = None
+    else:
+        limit = ctx.int_param('top', DEFAULT_CATALYST_LIMIT, 1, MAX_CATALYST_LIMIT)
+
+    catalyst_data = ctx.aggregates.by('İstifadə Edilən Katalizatorlar', 'efficiency').reset_index()
+    catalyst_data.columns = ['catalyst', 'avg_efficiency']
+    catalyst_data = catalyst_data.sort_values('avg_efficiency', ascending=False)
+    return catalyst_data if limit is None else catalyst_data.head(limit)
+
+
+def process_duration_panel(ctx):
+    """Average process duration by process type"""
+    return _by_process_records(ctx, 'avg_duration')
+
+
+def efficiency_by_temp_pressure_panel(ctx):
+    """Efficiency data by temperature and pressure"""
+    return _scatter(
+        ctx,
+        ['Temperatur (°C)', 'Təzyiq (bar)', 'Emalın Səmərəliliyi (%)', 'Proses Tipi'],
+        ['temperature', 'pressure', 'efficiency', 'process_type'],
+        value_column='Emalın Səmərəliliyi (%)',
+    )
+
+
+def _encode_cursor(date, process_id, position):
+    key = json.dumps([int(date.astype('int64')), int(process_id), int(position)])
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        # Cursors issued before the row position was added hold two values
+        date_ns, process_id, *position = json.loads(base64.urlsafe_b64decode(padded))
+        if len(position) > 1:
+            raise ValueError(cursor)
+        return pd.Timestamp(int(date_ns)), int(process_id), int(position[0]) if position else 0
+    except (binascii.Error, ValueError, TypeError):
+        raise ParameterError("'cursor' is not a valid timeline cursor")
+
+
+def timeline_panel(ctx):
+    """Process timeline data.
+
+    Returns the most recent ?limit= processes (default 50) starting within
+    the optional ?from= / ?to= dates (both inclusive) and the row filters,
+    oldest first. When older processes exist, next_cursor pages back to
+    them via ?cursor=.
+    The cursor holds the sort key of the page's first row, so it stays valid
+    across data reloads.
+    """
+    index = start_date_index(ctx.dataset)
+    start = date_param(ctx.params, 'from')
+    end = date_param(ctx.params, 'to')
+    if end is not None:
+        end = end.normalize() + pd.Timedelta(days=1)
+    limit = ctx.int_param('limit', DEFAULT_TIMELINE_LIMIT, 1, MAX_TIMELINE_LIMIT)
+
+    lo, hi = index.window(start, end)
+    cursor = ctx.params.get('cursor')
+    if cursor:
+        hi = max(lo, min(hi, index.locate(*_decode_cursor(cursor))))
+
+    # Slots (positions in start date order) of the rows on this page
+    if ctx.rows is None:
+        page = np.arange(max(lo, hi - limit), hi)
+        more = page[0] > lo if len(page) else False
+    else:
+        matching = lo + np.flatnonzero(np.isin(index.positions[lo:hi], ctx.rows))
+        page = matching[-limit:]
+        more = len(matching) > limit
+
+    # Only the rows on this page are formatted
+    timeline = ctx.dataset.frame.take(index.positions[page])[['Proses ID', 'Proses Tipi', 'Prosesin Başlama Tarixi', 'Prosesin Bitmə Tarixi', 'Emalın Səmərəliliyi (%)']].copy()
+
+    # Convert dates to string for serialization
+    timeline['Prosesin Başlama Tarixi'] = timeline['Prosesin Başlama Tarixi'].dt.strftime('%Y-%m-%d')
+    timeline['Prosesin Bitmə Tarixi'] = timeline['Prosesin Bitmə Tarixi'].dt.strftime('%Y-%m-%d')
+
+    timeline.columns = ['process_id', 'process_type', 'start_date', 'end_date', 'efficiency']
+
+    return {
+        'items': timeline,
+        'next_cursor': _encode_cursor(index.dates[page[0]], index.ids[page[0]], index.positions[page[0]]) if more else None,
+    }
+
+
+def trends_panel(ctx):
+    """Efficiency, energy, CO2, cost and safety incidents over time per process type.
+
+    ?frequency= is day, week (starting on Monday) or month (the default);
+    period is the first day of each bucket. With no filters other than
+    process_type and whole-day date_from / date_to the buckets are rolled
+    up from the dataset's daily aggregates without reading any rows.
+    """
+    frequency = ctx.params.get('frequency') or 'month'
+    if frequency not in FREQUENCIES:
+        raise ParameterError(f"'frequency' must be one of {', '.join(FREQUENCIES)}")
+
+    row_filter = ctx.filter
+    whole_days = all(date is None or date == date.normalize() for date in (row_filter.date_from, row_filter.date_to))
+    if not row_filter.ranges and set(row_filter.categories) <= {'Proses Tipi'} and whole_days:
+        trends = trend_table(
+            ctx.dataset.aggregates, frequency, row_filter.categories.get('Proses Tipi'),
+            row_filter.date_from, row_filter.date_to,
+        )
+    else:
+        trends = trend_table(RunningAggregates.from_frame(ctx.df, [TREND_DIMENSION]), frequency)
+
+    trends['period'] = trends['period'].dt.strftime('%Y-%m-%d')
+    trends['avg_efficiency'] = trends['avg_efficiency'].round(2)
+    return trends
+
+
+def cube_panel(ctx):
+    """Drill-down and roll-up over the aggregate cube.
+
+    ?by= lists the dimensions to group by (process_type, step, catalyst,
+    supplier, equipment; default process_type, empty for a single total
+    row), and the category filters select the slice. Each row has the group
+    labels, count (the number of processes) and <measure>_<stat> for each
+    of ?measures= (default DEFAULT_CUBE_MEASURES) and ?stats= (default
+    mean,sum). With only category filters the slice is merged from the
+    dataset's cube cells without reading any rows; other filters aggregate
+    the matching rows into cells first.
+    """
+    by = ctx.list_param('by', ['process_type'], list(CATEGORY_FILTERS))
+    measures = ctx.list_param('measures', DEFAULT_CUBE_MEASURES, list(MEASURES))
+    stats = ctx.list_param('stats', DEFAULT_CUBE_STATS, CUBE_STATS)
+
+    columns = [CATEGORY_FILTERS[name] for name in dict.fromkeys(by)]
+    if ctx.cube_slice is not None:
+        groups = aggregate_cube(ctx.dataset).rollup(columns, ctx.cube_slice)
+    else:
+        cells = RunningAggregates.from_frame(ctx.df, [CUBE_DIMENSION]).groups[CUBE_DIMENSION]
+        groups = Cube(cells).rollup(columns)
+
+    # The statistics are read from the columns as arrays
+    values = dict(zip(groups.columns, groups.to_numpy().T))
+    table = {name: groups.index.get_level_values(column) for name, column in zip(dict.fromkeys(by), columns)}
+    table['count'] = values['rows'].astype('int64')
+    for measure in measures:
+        for stat in stats:
+            table[f'{measure}_{stat}'] = statistic(values, measure, stat)
+    return pd.DataFrame(table)
+
+
+# Panel name (as used in /api/data/<name> and /api/data/bundle) -> function
+PANELS = {
+    'summary': summary_panel,
+    'process_types': process_types_panel,
+    'efficiency_by_process': efficiency_by_process_panel,
+    'energy_vs_efficiency': energy_vs_efficiency_panel,
+    'energy_by_process': energy_by_process_panel,
+    'co2_vs_cost': co2_vs_cost_panel,
+    'catalyst_efficiency': catalyst_efficiency_panel,
+    'process_duration': process_duration_panel,
+    'efficiency_by_temp_pressure': efficiency_by_temp_pressure_panel,
+    'timeline': timeline_panel,
+    'trends': trends_panel,
+    'cube': cube_panel,
+}
+
+
+def compute_bundle(dataset, names, params=None):
+    """Compute several panels over one shared context"""
+    ctx = PanelContext(dataset, params)
+    return {name: PANELS[name](ctx) for name in names}
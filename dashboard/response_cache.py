@@ -0,0 +1,93 @@
+"""Versioned cache of serialized API responses.
+
+Entries belong to one dataset version. As soon as a lookup arrives for a
+newer version the whole cache is dropped, so a data reload invalidates every
+cached aggregate at once. Versions are file signatures with no order, so the
+cache remembers the last few it has moved past: a late lookup for one of
+those (a request that read the dataset just before a reload) is a miss and
+leaves the newer entries in place.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict, deque
+
+
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+
+# Replaced dataset versions remembered, so late lookups for them are ignored
+RETIRED_VERSIONS = 16
+
+
+class CachedResponse:
+    """Serialized response body plus the metadata needed to replay it"""
+
+    def __init__(self, body, mimetype, headers=None):
+        self.body = body
+        self.mimetype = mimetype
+        self.headers = headers or {}
+        # Strong validator: identical bytes always get the identical tag
+        self.etag = hashlib.sha1(body).hexdigest()
+        self._gzipped = None
+
+    @property
+    def gzipped(self):
+        """gzip-compressed body, built on first use; None for small bodies"""
+        if len(self.body) < GZIP_MIN_SIZE:
+            return None
+        if self._gzipped is None:
+            # mtime=0 keeps the compressed bytes (and their ETag) deterministic
+            self._gzipped = gzip.compress(self.body, compresslevel=6, mtime=0)
+        return self._gzipped
+
+    @property
+    def gzip_etag(self):
+        # A strong ETag must differ between content encodings
+        return f'{self.etag}-gzip'
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of CachedResponse keyed by (version, key)"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._retired = deque(maxlen=RETIRED_VERSIONS)
+        self._lock = threading.Lock()
+
+    def get(self, version, key):
+        with self._lock:
+            if version != self.version:
+                if version in self._retired:
+                    self.misses += 1
+                    return None
+                if self.version is not None:
+                    self._retired.append(self.version)
+                self._entries.clear()
+                self.version = version
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, version, key, entry):
+        with self._lock:
+            # A reload may have happened while this entry was being computed
+            if version != self.version:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.version = None
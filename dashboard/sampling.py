@@ -0,0 +1,85 @@
+"""Vectorized downsampling for the scatter panels.
+
+Both reducers return a payload whose size depends only on the requested
+budget, never on the number of rows in the dataset.
+"""
+import numpy as np
+
+
+def stratified_sample(codes, budget, seed=0):
+    """Pick at most `budget` row positions, stratified by group code.
+
+    Every group gets a share of the budget proportional to its size (and at
+    least one row while the budget has one per group), so small process
+    types stay visible in the sample. A fixed seed keeps the sample - and
+    therefore the response ETag - stable for a given dataset version.
+    """
+    codes = np.asarray(codes)
+    n = len(codes)
+    if n <= budget:
+        return np.arange(n)
+
+    # Negative codes (missing group) are sampled as a group of their own
+    codes = np.where(codes < 0, codes.max() + 1, codes)
+    counts = np.bincount(codes)
+    present = counts > 0
+
+    # Proportional allocation, topped up by largest remainder
+    exact = counts * (budget / n)
+    quota = np.floor(exact).astype(np.int64)
+    quota[present] = np.maximum(quota[present], 1)
+    # The minimum of one row per group can overshoot the budget; take the
+    # surplus back a row at a time from the largest quotas, of the smallest
+    # group among equal quotas
+    for _ in range(quota.sum() - budget):
+        largest = np.flatnonzero(quota == quota.max())
+        quota[largest[np.argmin(counts[largest])]] -= 1
+    shortfall = budget - quota.sum()
+    if shortfall > 0:
+        remainder = np.where(present & (quota < counts), exact - quota, -1.0)
+        quota[np.argsort(-remainder, kind='stable')[:shortfall]] += 1
+    quota = np.minimum(quota, counts)
+
+    # Rank rows inside their group by a random key and keep the first `quota`
+    keys = np.random.default_rng(seed).random(n)
+    order = np.lexsort((keys, codes))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rank = np.arange(n) - starts[codes[order]]
+    keep = order[rank < quota[codes[order]]]
+    return np.sort(keep)
+
+
+def _bin_index(values, bins):
+    low, high = np.nanmin(values), np.nanmax(values)
+    width = (high - low) / bins if high > low else 1.0
+    index = np.clip(((values - low) / width).astype(np.int64), 0, bins - 1)
+    centers = low + (np.arange(bins) + 0.5) * width
+    return index, centers
+
+
+def grid_bins(x, y, codes, bins, values=None):
+    """Aggregate points into a bins x bins grid per group code.
+
+    Codes must be non-negative and x/y free of NaNs. Returns (group_codes,
+    x_centers, y_centers, counts, value_means) for the non-empty cells
+    only. value_means is None unless `values` is given.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.int64)
+    xi, x_centers = _bin_index(x, bins)
+    yi, y_centers = _bin_index(y, bins)
+
+    # One flat cell id per (group, x bin, y bin), counted in a single bincount
+    cell = (codes * bins + xi) * bins + yi
+    all_counts = np.bincount(cell)
+    cells = np.flatnonzero(all_counts)
+    counts = all_counts[cells]
+
+    means = None
+    if values is not None:
+        sums = np.bincount(cell, weights=np.asarray(values, dtype=np.float64))
+        means = sums[cells] / counts
+
+    group_codes = cells // (bins * bins)
+    return group_codes, x_centers[(cells // bins) % bins], y_centers[cells % bins], counts, means
@@ -1,13 +1,13 @@
 // Process Analytics Dashboard JavaScript
 document.addEventListener('DOMContentLoaded', function() {
-    // Initialize dashboard
+    // Initialize dashboard (also populates the filters once data is loaded)
     initDashboard();
     
     // Set up navigation
     setupNavigation();
     
-    // Setup filters
-    setupFilters();
+    // Timeline paging
+    document.getElementById('loadEarlierTimeline').addEventListener('click', fetchEarlierTimeline);
 });
 
 // Global data store
@@ -20,28 +20,35 @@ const dashboardData = {
     catalystEfficiency: null,
     processDuration: null,
     tempPressureEfficiency: null,
-    timeline: null
+    timeline: null,
+    timelineCursor: null
+};
+
+// Bundle panel name -> dashboardData key
+const bundlePanels = {
+    summary: 'summary',
+    process_types: 'processTypes',
+    efficiency_by_process: 'efficiencyByProcess',
+    energy_vs_efficiency: 'energyVsEfficiency',
+    energy_by_process: 'energyByProcess',
+    co2_vs_cost: 'co2VsCost',
+    catalyst_efficiency: 'catalystEfficiency',
+    process_duration: 'processDuration',
+    efficiency_by_temp_pressure: 'tempPressureEfficiency',
+    timeline: 'timeline'
 };
 
 // Dashboard initialization
 async function initDashboard() {
     try {
-        // Load all data in parallel
-        await Promise.all([
-            fetchSummaryData(),
-            fetchProcessTypesData(),
-            fetchEfficiencyByProcessData(),
-            fetchEnergyVsEfficiencyData(),
-            fetchEnergyByProcessData(),
-            fetchCO2VsCostData(),
-            fetchCatalystEfficiencyData(),
-            fetchProcessDurationData(),
-            fetchEfficiencyByTempPressureData(),
-            fetchTimelineData()
-        ]);
+        // Load all panels in a single request
+        await fetchDashboardBundle();
         
         // Render all visualizations
         renderDashboard();
+        
+        // Setup filters
+        setupFilters();
     } catch (error) {
         console.error('Error initializing dashboard:', error);
         showError('Dashboard yüklənərkən xəta baş verdi. Lütfən, səhifəni yeniləyin.');
@@ -91,128 +98,87 @@ function showSection(sectionId) {
 // Setup data filters
 function setupFilters() {
     const processTypeFilter = document.getElementById('processTypeFilter');
+    if (!dashboardData.processTypes) return;
     
-    // Wait for process types data to be loaded
-    const checkDataLoaded = setInterval(() => {
-        if (dashboardData.processTypes) {
-            clearInterval(checkDataLoaded);
-            
-            // Populate filter dropdown
-            dashboardData.processTypes.forEach(item => {
-                const option = document.createElement('option');
-                option.value = item.process_type;
-                option.textContent = item.process_type;
-                processTypeFilter.appendChild(option);
-            });
-            
-            // Add event listener
-            processTypeFilter.addEventListener('change', filterDashboardData);
-        }
-    }, 100);
-}
-
-// Filter dashboard data based on selected filters
-function filterDashboardData() {
-    const selectedProcessType = document.getElementById('processTypeFilter').value;
+    // Populate filter dropdown
+    dashboardData.processTypes.forEach(item => {
+        const option = document.createElement('option');
+        option.value = item.process_type;
+        option.textContent = item.process_type;
+        processTypeFilter.appendChild(option);
+    });
     
-    // Apply filter and re-render
-    if (selectedProcessType === 'all') {
-        // Reset to all data
-        renderDashboard();
-    } else {
-        // Filter data and re-render
-        renderFilteredDashboard(selectedProcessType);
-    }
-}
-
-// Data fetching functions
-async function fetchSummaryData() {
-    try {
-        const response = await fetch('/api/data/summary');
-        dashboardData.summary = await response.json();
-    } catch (error) {
-        console.error('Error fetching summary data:', error);
-    }
-}
-
-async function fetchProcessTypesData() {
-    try {
-        const response = await fetch('/api/data/process_types');
-        dashboardData.processTypes = await response.json();
-    } catch (error) {
-        console.error('Error fetching process types data:', error);
-    }
-}
-
-async function fetchEfficiencyByProcessData() {
-    try {
-        const response = await fetch('/api/data/efficiency_by_process');
-        dashboardData.efficiencyByProcess = await response.json();
-    } catch (error) {
-        console.error('Error fetching efficiency by process data:', error);
-    }
+    // Add event listener
+    processTypeFilter.addEventListener('change', filterDashboardData);
 }
 
-async function fetchEnergyVsEfficiencyData() {
-    try {
-        const response = await fetch('/api/data/energy_vs_efficiency');
-        dashboardData.energyVsEfficiency = await response.json();
-    } catch (error) {
-        console.error('Error fetching energy vs efficiency data:', error);
-    }
-}
-
-async function fetchEnergyByProcessData() {
+// Filter dashboard data based on selected filters
+async function filterDashboardData() {
+    // Filters are applied server-side, so every chart reflects the selection
     try {
-        const response = await fetch('/api/data/energy_by_process');
-        dashboardData.energyByProcess = await response.json();
+        await fetchDashboardBundle();
+        renderDashboard();
     } catch (error) {
-        console.error('Error fetching energy by process data:', error);
+        console.error('Error filtering dashboard data:', error);
+        showError('Filtr tətbiq edilərkən xəta baş verdi.');
     }
 }
 
-async function fetchCO2VsCostData() {
-    try {
-        const response = await fetch('/api/data/co2_vs_cost');
-        dashboardData.co2VsCost = await response.json();
-    } catch (error) {
-        console.error('Error fetching CO2 vs cost data:', error);
+// Query string for the selected filters (see filters.py for the grammar)
+function filterQuery() {
+    const params = new URLSearchParams();
+    const selectedProcessType = document.getElementById('processTypeFilter').value;
+    
+    if (selectedProcessType !== 'all') {
+        params.append('process_type', selectedProcessType);
     }
+    return params;
 }
 
-async function fetchCatalystEfficiencyData() {
-    try {
-        const response = await fetch('/api/data/catalyst_efficiency');
-        dashboardData.catalystEfficiency = await response.json();
-    } catch (error) {
-        console.error('Error fetching catalyst efficiency data:', error);
+// Data fetching functions
+async function fetchDashboardBundle(panels = null) {
+    const params = filterQuery();
+    if (panels) {
+        params.set('panels', panels.join(','));
     }
-}
-
-async function fetchProcessDurationData() {
-    try {
-        const response = await fetch('/api/data/process_duration');
-        dashboardData.processDuration = await response.json();
-    } catch (error) {
-        console.error('Error fetching process duration data:', error);
+    const query = params.toString();
+    const response = await fetch(query ? `/api/data/bundle?${query}` : '/api/data/bundle');
+    if (!response.ok) {
+        throw new Error(`Bundle request failed: ${response.status}`);
     }
+    const bundle = await response.json();
+    
+    Object.entries(bundle).forEach(([panel, data]) => {
+        if (panel === 'timeline') {
+            setTimelinePage(data);
+        } else {
+            dashboardData[bundlePanels[panel]] = data;
+        }
+    });
 }
 
-async function fetchEfficiencyByTempPressureData() {
-    try {
-        const response = await fetch('/api/data/efficiency_by_temp_pressure');
-        dashboardData.tempPressureEfficiency = await response.json();
-    } catch (error) {
-        console.error('Error fetching efficiency by temp and pressure data:', error);
+// The timeline is paged: each page carries a cursor to the processes before it
+function setTimelinePage(page, prepend = false) {
+    dashboardData.timeline = prepend ? page.items.concat(dashboardData.timeline) : page.items;
+    dashboardData.timelineCursor = page.next_cursor;
+    
+    const button = document.getElementById('loadEarlierTimeline');
+    if (button) {
+        button.style.display = page.next_cursor ? 'inline-block' : 'none';
     }
 }
 
-async function fetchTimelineData() {
+async function fetchEarlierTimeline() {
+    if (!dashboardData.timelineCursor) return;
+    
     try {
-        const response = await fetch('/api/data/timeline');
-        dashboardData.timeline = await response.json();
+        const params = filterQuery();
+        params.set('cursor', dashboardData.timelineCursor);
+        const response = await fetch(`/api/data/timeline?${params}`);
+        setTimelinePage(await response.json(), true);
+        renderTimelineChart();
     } catch (error) {
-        console.error('Error fetching timeline data:', error);
+        console.error('Error fetching earlier timeline data:', error);
     }
 }
 
@@ -233,24 +199,6 @@ function renderDashboard() {
     renderTimelineChart();
 }
 
-function renderFilteredDashboard(processType) {
-    // Filter the data
-    const filteredData = {
-        energyVsEfficiency: dashboardData.energyVsEfficiency.filter(item => item.process_type === processType),
-        co2VsCost: dashboardData.co2VsCost.filter(item => item.process_type === processType),
-        tempPressureEfficiency: dashboardData.tempPressureEfficiency.filter(item => item.process_type === processType),
-        timeline: dashboardData.timeline.filter(item => item.process_type === processType)
-    };
-    
-    // Re-render with filtered data
-    renderEnergyVsEfficiencyChart(filteredData.energyVsEfficiency);
-    renderCO2VsCostChart(filteredData.co2VsCost);
-    renderTempPressureEfficiencyChart(filteredData.tempPressureEfficiency);
-    renderTimelineChart(filteredData.timeline);
-    
-    // Process type specific charts remain the same
-}
-
 function renderSummaryCards() {
     if (!dashboardData.summary) return;
     
@@ -332,8 +280,8 @@ function renderEnergyByProcessChart() {
     Plotly.newPlot('energyByProcessChart', barData, layout);
 }
 
-function renderEnergyVsEfficiencyChart(filteredData = null) {
-    const data = filteredData || dashboardData.energyVsEfficiency;
+function renderEnergyVsEfficiencyChart() {
+    const data = dashboardData.energyVsEfficiency;
     if (!data) return;
     
     // Group by process type
@@ -349,7 +297,7 @@ function renderEnergyVsEfficiencyChart(filteredData = null) {
             type: 'scatter',
             name: processType,
             marker: {
-                size: 10
+                size: markerSizes(processData)
             }
         };
     });
@@ -371,8 +319,8 @@ function renderEnergyVsEfficiencyChart(filteredData = null) {
     Plotly.newPlot('energyVsEfficiencyChart', scatterData, layout);
 }
 
-function renderCO2VsCostChart(filteredData = null) {
-    const data = filteredData || dashboardData.co2VsCost;
+function renderCO2VsCostChart() {
+    const data = dashboardData.co2VsCost;
     if (!data) return;
     
     // Group by process type
@@ -388,7 +336,7 @@ function renderCO2VsCostChart(filteredData = null) {
             type: 'scatter',
             name: processType,
             marker: {
-                size: 10
+                size: markerSizes(processData)
             }
         };
     });
@@ -459,8 +407,8 @@ function renderProcessDurationChart() {
     Plotly.newPlot('processDurationChart', barData, layout);
 }
 
-function renderTempPressureEfficiencyChart(filteredData = null) {
-    const data = filteredData || dashboardData.tempPressureEfficiency;
+function renderTempPressureEfficiencyChart() {
+    const data = dashboardData.tempPressureEfficiency;
     if (!data) return;
     
     // Group by process type
@@ -499,8 +447,8 @@ function renderTempPressureEfficiencyChart(filteredData = null) {
     Plotly.newPlot('tempPressureEfficiencyChart', scatterData, layout);
 }
 
-function renderTimelineChart(filteredData = null) {
-    const data = filteredData || dashboardData.timeline;
+function renderTimelineChart() {
+    const data = dashboardData.timeline;
     if (!data) return;
     
     // Group by process type
@@ -538,6 +486,12 @@ function renderTimelineChart(filteredData = null) {
 }
 
 // Helper functions
+
+// Binned scatter payloads (?mode=bins) carry a point count per cell
+function markerSizes(points) {
+    return points.map(item => item.count ? 6 + 3 * Math.log2(item.count) : 10);
+}
+
 function formatNumber(num) {
     return num.toString().replace(/\B(?=(\d{3})+(?!\d))/g, ",");
 }
@@ -0,0 +1,99 @@
+"""Pooled HTTP with retries for every Telegram Bot API call.
+
+telebot opens a requests session per thread and gives up on the first
+error. install() makes it send every call through one TelegramSender
+instead: a single requests.Session shared by all threads, whose connection
+pool keeps connections to api.telegram.org alive between calls, and which
+retries
+
+- 429 Too Many Requests after the retry_after Telegram asks for (calls
+  asking for more than max_retry_after seconds fail at once, so a flood
+  wait does not block an update worker),
+- 5xx responses, and connections that could not be opened, with
+  exponential backoff.
+
+Requests that failed once sent (the connection dropped mid-request, or
+timed out waiting for the response) are not retried, since Telegram may
+have processed them and a retry could send a message twice.
+"""
+import logging
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from telebot import apihelper
+from urllib3.exceptions import NewConnectionError
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {500, 502, 503, 504}
+
+
+def _retry_after(response):
+    """Seconds a 429 response asks to wait"""
+    try:
+        return float(response.json()['parameters']['retry_after'])
+    except (ValueError, KeyError, TypeError):
+        return float(response.headers.get('Retry-After', 1))
+
+
+def _not_sent(error):
+    """Whether a requests.ConnectionError failed before the request was sent"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    # requests wraps urllib3's MaxRetryError, whose reason is the cause
+    cause = error.args[0] if error.args else None
+    return isinstance(getattr(cause, 'reason', cause), NewConnectionError)
+
+
+def _rewind(files):
+    # Uploads are read by the failed attempt; start them over
+    for value in (files or {}).values():
+        file = value[1] if isinstance(value, tuple) else value
+        if hasattr(file, 'seek'):
+            file.seek(0)
+
+
+class TelegramSender:
+    """requests-compatible sender for telebot's apihelper.CUSTOM_REQUEST_SENDER"""
+
+    def __init__(self, pool_size=10, max_retries=3, backoff=0.5, max_retry_after=30):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+    def __call__(self, method, url, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            retry = attempt < self.max_retries
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.ConnectionError as e:
+                if not retry or not _not_sent(e):
+                    raise
+                reason, delay = 'connection', self.backoff * 2 ** attempt
+            else:
+                if response.status_code == 429:
+                    reason, delay = 'rate_limited', _retry_after(response)
+                    if delay > self.max_retry_after:
+                        return response
+                elif response.status_code in RETRY_STATUSES:
+                    reason, delay = 'server_error', self.backoff * 2 ** attempt
+                else:
+                    return response
+                if not retry:
+                    return response
+            metrics.observe_telegram_retry(reason)
+            logger.warning(f"Telegram API call failed ({reason}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            _rewind(kwargs.get('files'))
+
+
+def install(**options):
+    """Send all telebot API calls through a TelegramSender"""
+    sender = TelegramSender(**options)
+    apihelper.CUSTOM_REQUEST_SENDER = sender
+    return sender
@@ -1,19 +1,39 @@
+# Imported first so the startup report covers every other import
+import startup
+from startup import lazy_import
+
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
 import logging
+import multiprocessing
+import sys
+import threading
 import telebot
 from telebot import types
-import openai
 from io import BytesIO
-import plotly.express as px
-import plotly.io as pio
 from dotenv import load_dotenv
-from flask import Flask, request
+from flask import Flask, jsonify, request
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# The analytics package shared with the dashboard lives at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_session
+import metrics
+from chart_cache import ChartCache
+from chart_pool import ChartPool
+from charts import CHARTS, chart_available, chart_input, plotly_renderer
+from data_store import DataStore
+from flow_control import ALLOW, DROP, ChatRateLimiter, SingleFlight
+from insights import InsightsBusy, InsightsService
+from job_queue import DUPLICATE, REJECTED, UpdateQueue
+from summary import data_summary, render_summary
+
+# matplotlib, seaborn, plotly and openai take seconds to import and are only
+# needed by some handlers, so they are loaded with lazy_import() on first use
+startup.mark('imports')
 
 # Load environment variables
 load_dotenv()
@@ -24,10 +44,22 @@ logger = logging.getLogger(__name__)
 
 # Initialize the Flask app
 app = Flask(__name__)
+metrics.init_app(app)
 
 # Initialize OpenAI API
+# OPENAI_BASE_URL can point the client at any OpenAI-compatible server (e.g. a local stub)
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-openai.api_key = OPENAI_API_KEY
+
+def create_openai_client():
+    openai = lazy_import('openai')
+    return openai.OpenAI(api_key=OPENAI_API_KEY or '', base_url=os.getenv('OPENAI_BASE_URL') or None)
+
+insights_service = InsightsService(
+    create_openai_client,
+    model=os.getenv('OPENAI_MODEL', 'gpt-4'),
+    max_concurrent=int(os.getenv('OPENAI_MAX_CONCURRENT', 2)),
+    timeout=float(os.getenv('OPENAI_TIMEOUT', 60)),
+)
 
 # Initialize Telegram bot
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
@@ -37,7 +69,12 @@ if not TELEGRAM_TOKEN:
     TELEGRAM_TOKEN = "test"
 
 bot = telebot.TeleBot(TELEGRAM_TOKEN)
-# Add this near the beginning of your app.py file, after bot initialization:
+
+BOT_WORKERS = int(os.environ.get('BOT_WORKERS', 4))
+
+# All Telegram API calls share one keep-alive connection pool and are retried
+# on 429 (after retry_after), 5xx and connection errors
+api_session.install(pool_size=BOT_WORKERS + 2)
 
 # Define bot commands
 bot_commands = [
@@ -47,243 +84,265 @@ bot_commands = [
     types.BotCommand("summary", "Əsas məlumatların xülasəsini göstərmək")
 ]
 
-# If in production mode, set commands when setting webhook
-# Add this to your production setup in if __name__ == '__main__':
-if os.environ.get('ENVIRONMENT') == 'production':
-    # Remove any existing webhook first
-    bot.remove_webhook()
-    time.sleep(0.5)  # Give Telegram servers some time to process
-    
-    # Set commands
-    try:
+PRODUCTION = os.environ.get('ENVIRONMENT') == 'production'
+
+# Seconds to wait before retrying a failed Telegram API setup
+SETUP_RETRY_DELAYS = (5, 30, 120)
+
+_setup_lock = threading.Lock()
+_setup_done = False
+
+def sync_commands():
+    current = [(command.command, command.description) for command in bot.get_my_commands()]
+    if current != [(command.command, command.description) for command in bot_commands]:
         bot.set_my_commands(bot_commands)
         logger.info("Bot commands set successfully")
-    except Exception as e:
-        logger.error(f"Error setting bot commands: {e}")
-    
-    # Set webhook
+
+def sync_webhook():
     url = os.environ.get('APP_URL', '')
-    if url:
-        webhook_url = f"{url}/{TELEGRAM_TOKEN}"
+    if not url:
+        logger.error("APP_URL environment variable not set")
+        return
+    webhook_url = f"{url}/{TELEGRAM_TOKEN}"
+    # set_webhook replaces any previous webhook, so there is nothing to remove first
+    if bot.get_webhook_info().url != webhook_url:
         bot.set_webhook(url=webhook_url)
         logger.info(f"Webhook set to {webhook_url}")
-    else:
-        logger.error("APP_URL environment variable not set")
-else:
-    # For development, set commands in polling mode
-    try:
-        bot.set_my_commands(bot_commands)
-        logger.info("Bot commands set successfully")
-    except Exception as e:
-        logger.error(f"Error setting bot commands: {e}")
-        
-# Load the data - check both locations
-def load_data():
+
+def sync_menu_button():
+    if bot.get_chat_menu_button().type != 'commands':
+        bot.set_chat_menu_button(menu_button=types.MenuButtonCommands())
+        logger.info("Menu button set to commands")
+
+def setup_bot():
+    """Register the commands, and in production the webhook and menu button, with Telegram.
+
+    Each setting is read first and only written when it differs, so restarts
+    and several workers do not repeat the writes. Returns True once
+    everything is set up; later calls then return at once.
+    """
+    global _setup_done
+    with _setup_lock:
+        if _setup_done:
+            return True
+        steps = [sync_commands]
+        if PRODUCTION:
+            steps += [sync_webhook, sync_menu_button]
+        with startup.timed('telegram_setup'):
+            failed = False
+            for step in steps:
+                try:
+                    step()
+                except Exception as e:
+                    logger.error(f"Telegram setup step {step.__name__} failed: {e}")
+                    failed = True
+        _setup_done = not failed
+        return _setup_done
+
+def deferred_startup():
+    """Renderer warm-up and Telegram API setup, run off the request path after import"""
+    plotly_renderer.start()
+    threading.Thread(target=chart_pool.start, name='chart-pool-warmup', daemon=True).start()
+    for delay in (0,) + SETUP_RETRY_DELAYS:
+        time.sleep(delay)
+        if setup_bot():
+            return
+
+# The process data is parsed once and re-read only when data.csv changes
+store = DataStore(
+    os.environ.get('DATA_PATH'),
+    check_interval=float(os.environ.get('DATA_RELOAD_INTERVAL', 2)),
+    # 'stream' aggregates the CSV in chunks instead of loading it
+    stream=os.environ.get('DATA_MODE') == 'stream',
+)
+
+def load_dataset():
+    """Return the current Dataset (frame plus version), or None if it cannot be loaded"""
     try:
-        # Try data.csv in root directory first
-        try:
-            data = pd.read_csv('data.csv')
-            logger.info(f"Data loaded from root directory: {data.shape[0]} rows, {data.shape[1]} columns")
-            return data
-        except Exception as e:
-            logger.warning(f"Error loading data from root: {e}")
-            
-        # Try data directory
-        try:
-            data = pd.read_csv('data/data.csv')
-            logger.info(f"Data loaded from data directory: {data.shape[0]} rows, {data.shape[1]} columns")
-            return data
-        except Exception as e:
-            logger.warning(f"Error loading data from data directory: {e}")
-            
-        # Try working directory
-        import glob
-        logger.info(f"Files in current directory: {glob.glob('*')}")
-        logger.info(f"Current working directory: {os.getcwd()}")
-            
-        raise Exception("Could not find data.csv in any location")
+        return store.get()
     except Exception as e:
         logger.error(f"Error loading data: {e}")
         return None
 
-# Function to generate insights using OpenAI in Azerbaijani
-def generate_insights(data_description):
-    try:
-        completion = openai.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Sən dəqiq və analitik neft və qaz emalı prosesləri üzrə məlumatlar haqqında Azərbaycan dilində təhlil təqdim edən köməkçisən."},
-                {"role": "user", "content": f"Aşağıdakı məlumatları təhlil et və biznes üçün əhəmiyyətli nəticələri Azərbaycan dilində təqdim et: {data_description}"}
-            ]
-        )
-        return completion.choices[0].message.content
-    except Exception as e:
-        logger.error(f"Error generating insights with OpenAI: {e}")
-        return "OpenAI ilə təhlil yaradılarkən xəta baş verdi."
+# Identical concurrent work (same action and data version) is done once
+flights = SingleFlight()
 
-# Function to create charts
-def create_efficiency_chart(data):
-    try:
-        plt.figure(figsize=(12, 8))
-        sns.boxplot(x='Proses Tipi', y='Emalın Səmərəliliyi (%)', data=data)
-        plt.title('Proses Tipinə görə Emal Səmərəliliyi', fontsize=16)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        plt.close()
-        return buffer
-    except Exception as e:
-        logger.error(f"Error creating efficiency chart: {str(e)}")
-        raise
+# Rendered chart PNGs and their Telegram file_ids, per dataset version
+chart_cache = ChartCache(
+    max_entries=int(os.environ.get('CHART_CACHE_SIZE', 64)),
+    max_bytes=int(os.environ.get('CHART_CACHE_BYTES', 64 * 1024 * 1024)),
+)
 
-def create_energy_chart(data):
-    try:
-        plt.figure(figsize=(12, 8))
-        fig = px.scatter(data, 
-                        x='Emal Həcmi (ton)', 
-                        y='Enerji İstifadəsi (kWh)',
-                        color='Proses Tipi',
-                        size='Energy_per_ton',
-                        hover_data=['Proses ID', 'Təzyiq (bar)', 'Temperatur (°C)'])
-        fig.update_layout(title='Emal Həcmi və Enerji İstifadəsi Arasında Əlaqə')
-        
-        buffer = BytesIO()
-        pio.write_image(fig, buffer, format='png')
-        buffer.seek(0)
-        return buffer
-    except Exception as e:
-        logger.error(f"Error creating energy chart: {str(e)}")
-        raise
+# Worker processes for the pyplot charts; CHART_PROCESSES=0 renders them in the update workers
+chart_pool = ChartPool(processes=int(os.environ.get('CHART_PROCESSES', 3)))
 
-def create_environmental_chart(data):
-    try:
-        plt.figure(figsize=(12, 8))
-        avg_co2_by_type = data.groupby('Proses Tipi')['Ətraf Mühitə Təsir (g CO2 ekvivalent)'].mean().reset_index()
-        avg_co2_by_type = avg_co2_by_type.sort_values('Ətraf Mühitə Təsir (g CO2 ekvivalent)', ascending=False)
-        
-        plt.barh(avg_co2_by_type['Proses Tipi'], avg_co2_by_type['Ətraf Mühitə Təsir (g CO2 ekvivalent)'])
-        plt.title('Proses Tipinə görə Ortalama CO2 Emissiyası', fontsize=16)
-        plt.xlabel('CO2 Emissiyası (g)', fontsize=12)
-        plt.ylabel('Proses Tipi', fontsize=12)
-        plt.tight_layout()
-        
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        plt.close()
-        return buffer
-    except Exception as e:
-        logger.error(f"Error creating environmental chart: {str(e)}")
-        raise
+# Telegram allows 4096 characters per message and about one edit per second
+MESSAGE_LIMIT = 4000
+INSIGHTS_EDIT_INTERVAL = 1.5
 
-def create_cost_chart(data):
-    try:
-        plt.figure(figsize=(12, 8))
-        cost_by_type = data.groupby('Proses Tipi')['Əməliyyat Xərcləri (AZN)'].sum().reset_index()
-        cost_by_type = cost_by_type.sort_values('Əməliyyat Xərcləri (AZN)', ascending=False)
-        
-        plt.bar(cost_by_type['Proses Tipi'], cost_by_type['Əməliyyat Xərcləri (AZN)'] / 1000)
-        plt.title('Proses Tipinə görə Ümumi Əməliyyat Xərcləri', fontsize=16)
-        plt.xlabel('Proses Tipi', fontsize=12)
-        plt.ylabel('Əməliyyat Xərcləri (Min AZN)', fontsize=12)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        plt.close()
-        return buffer
-    except Exception as e:
-        logger.error(f"Error creating cost chart: {str(e)}")
-        raise
+def send_insights(chat_id, dataset, status_message):
+    """Show the insights for a dataset version, streaming them into the chat.
+
+    The status message is edited as text arrives; text beyond MESSAGE_LIMIT
+    continues in further messages. Cached insights are shown at once, and
+    requests arriving while the same version's insights are being generated
+    wait for that completion instead of starting another.
+    """
+    summary = generate_data_summary(dataset)
+    messages = [status_message.message_id]
+    shown = ['']
+
+    def show(text):
+        chunks = [text[i:i + MESSAGE_LIMIT] for i in range(0, len(text), MESSAGE_LIMIT)]
+        for i, chunk in enumerate(chunks):
+            if i == len(messages):
+                messages.append(bot.send_message(chat_id, chunk).message_id)
+                shown.append(chunk)
+            elif chunk != shown[i]:
+                bot.edit_message_text(chunk, chat_id, messages[i])
+                shown[i] = chunk
+
+    def stream():
+        text = ''
+        last_edit = time.monotonic()
+        for piece in insights_service.stream(summary):
+            text += piece
+            if time.monotonic() - last_edit >= INSIGHTS_EDIT_INTERVAL:
+                show(text)
+                last_edit = time.monotonic()
+        return text
+
+    text = insights_service.cached(summary)
+    if text is None:
+        text = flights.do(('insights', dataset.version), stream)
+    if not text:
+        text = "OpenAI ilə təhlil yaradılarkən xəta baş verdi."
+    show(text)
 
 # Generate a summary of the data
-def generate_data_summary(data):
+def generate_data_summary(dataset):
+    """Summary text of a dataset version; the statistics are computed once per version"""
     try:
-        summary = {
-            'total_processes': data.shape[0],
-            'process_types': data['Proses Tipi'].nunique(),
-            'avg_efficiency': data['Emalın Səmərəliliyi (%)'].mean(),
-            'total_energy': data['Enerji İstifadəsi (kWh)'].sum(),
-            'total_cost': data['Əməliyyat Xərcləri (AZN)'].sum(),
-            'avg_co2': data['Ətraf Mühitə Təsir (g CO2 ekvivalent)'].mean(),
-            'max_volume': data['Emal Həcmi (ton)'].max(),
-            'safety_incidents': data['Təhlükəsizlik Hadisələri'].sum()
-        }
-        
-        # Top and bottom performers
-        top_efficiency = data.sort_values('Emalın Səmərəliliyi (%)', ascending=False).head(3)
-        low_efficiency = data.sort_values('Emalın Səmərəliliyi (%)', ascending=True).head(3)
-        
-        # Most efficient process type
-        process_efficiency = data.groupby('Proses Tipi')['Emalın Səmərəliliyi (%)'].mean().reset_index()
-        best_process = process_efficiency.loc[process_efficiency['Emalın Səmərəliliyi (%)'].idxmax()]
-        
-        summary_text = f"""
-Ümumi Məlumat Təhlili:
-- Ümumi proses sayı: {summary['total_processes']}
-- Fərqli proses tipləri: {summary['process_types']}
-- Ortalama emal səmərəliliyi: {summary['avg_efficiency']:.2f}%
-- Ümumi enerji istifadəsi: {summary['total_energy']:,} kWh
-- Ümumi əməliyyat xərcləri: {summary['total_cost']:,} AZN
-- Ortalama CO2 emissiyası: {summary['avg_co2']:,.2f} g
-- Maksimum emal həcmi: {summary['max_volume']:,} ton
-- Qeydə alınmış təhlükəsizlik hadisələri: {summary['safety_incidents']}
-
-Ən Yüksək Səmərəliliyə Malik Proseslər:
-"""
-        
-        for i, row in top_efficiency.iterrows():
-            summary_text += f"- Proses ID: {row['Proses ID']}, Tipi: {row['Proses Tipi']}, Səmərəlilik: {row['Emalın Səmərəliliyi (%)']}%\n"
-        
-        summary_text += f"\nƏn Aşağı Səmərəliliyə Malik Proseslər:\n"
-        
-        for i, row in low_efficiency.iterrows():
-            summary_text += f"- Proses ID: {row['Proses ID']}, Tipi: {row['Proses Tipi']}, Səmərəlilik: {row['Emalın Səmərəliliyi (%)']}%\n"
-        
-        summary_text += f"\nƏn Səmərəli Proses Tipi: {best_process['Proses Tipi']} (Ortalama {best_process['Emalın Səmərəliliyi (%)']}%)"
-        
-        return summary_text
+        return render_summary(data_summary(dataset))
     except Exception as e:
         logger.error(f"Error generating data summary: {str(e)}")
         raise
 
-# Webhook handler (this is what actually works on Render.com)
-@app.route(f'/{TELEGRAM_TOKEN}', methods=['POST'])
-def webhook():
-    logger.info("Received webhook request")
+def render_chart(name, dataset, filters=()):
+    """Render a chart into the chart cache unless another request just did"""
+    entry = chart_cache.get(dataset.version, name, filters)
+    if entry is None:
+        metrics.observe_cache('chart', 'miss')
+        entry = chart_cache.put(dataset.version, name, chart_pool.render(name, chart_input(name, dataset)), filters)
+    return entry
+
+def send_chart(chat_id, name, dataset, filters=()):
+    """Send a chart, rendering and uploading it only once per dataset version.
+
+    The first send uploads the PNG and records the file_id Telegram returns;
+    later sends of the same chart reference that file_id instead.
+    """
+    _, caption = CHARTS[name]
+    entry = chart_cache.get(dataset.version, name, filters)
+
+    if entry is not None and entry.file_id is not None:
+        try:
+            bot.send_photo(chat_id, entry.file_id, caption=caption)
+            metrics.observe_cache('chart', 'file_id')
+            return
+        except Exception as e:
+            # Fall back to uploading the cached bytes again
+            logger.warning(f"Sending cached file_id for {name} chart failed: {e}")
+            entry.file_id = None
+
+    if entry is None:
+        # Concurrent requests for the same chart share one rendering
+        entry = flights.do(('chart', name, dataset.version, filters), lambda: render_chart(name, dataset, filters))
+    else:
+        metrics.observe_cache('chart', 'png')
+
+    message = bot.send_photo(chat_id, BytesIO(entry.png), caption=caption)
+    if message.photo:
+        # The last size is the original resolution
+        entry.file_id = message.photo[-1].file_id
+
+def send_full_report(chat_id, dataset):
+    """Send every chart (in stream mode, every aggregate chart) in one album.
+
+    Charts missing from the cache render in parallel: the pyplot charts in
+    the chart process pool and the energy chart through the plotly renderer,
+    so the report takes about as long as its slowest chart. Cached charts are
+    sent by file_id.
+    """
+    names = [name for name in CHARTS if chart_available(name, dataset)]
+
+    def entry(name):
+        cached = chart_cache.get(dataset.version, name)
+        if cached is not None:
+            metrics.observe_cache('chart', 'file_id' if cached.file_id is not None else 'png')
+            return cached
+        return flights.do(('chart', name, dataset.version, ()), lambda: render_chart(name, dataset))
+
+    with ThreadPoolExecutor(len(names), thread_name_prefix='full-report') as threads:
+        entries = list(threads.map(entry, names))
+
+    def album(use_file_ids):
+        return [
+            types.InputMediaPhoto(
+                entry.file_id if use_file_ids and entry.file_id is not None else BytesIO(entry.png),
+                caption=CHARTS[name][1],
+            )
+            for name, entry in zip(names, entries)
+        ]
+
     try:
-        if request.headers.get('content-type') == 'application/json':
-            json_str = request.get_data().decode('UTF-8')
-            logger.info(f"Webhook data: {json_str[:100]}...")
-            update = types.Update.de_json(json_str)
-            logger.info(f"Processing update: {update.update_id}")
-            
-            # Extract chat_id and message for direct handling
-            if hasattr(update, 'message') and update.message:
-                chat_id = update.message.chat.id
-                message_text = update.message.text if hasattr(update.message, 'text') else None
-                logger.info(f"Detected chat_id: {chat_id}, message: {message_text}")
-                
-                # Handle new chat members (user joined)
-                if hasattr(update.message, 'new_chat_members') and update.message.new_chat_members:
-                    logger.info("New chat member detected, sending welcome message")
-                    send_welcome_message(chat_id)
-                    return ''
-                
-                # Handle commands manually
-                if message_text == '/start':
-                    logger.info("Detected /start command, handling directly")
-                    send_welcome_message(chat_id)
-                    logger.info("Welcome message sent with keyboard")
-                
-                elif message_text == '/help':
-                    logger.info("Detected /help command")
-                    help_text = """
+        messages = bot.send_media_group(chat_id, album(use_file_ids=True))
+    except Exception as e:
+        if all(entry.file_id is None for entry in entries):
+            raise
+        # Fall back to uploading the cached bytes again
+        logger.warning(f"Sending full report by file_id failed: {e}")
+        messages = bot.send_media_group(chat_id, album(use_file_ids=False))
+
+    for entry, message in zip(entries, messages):
+        if message.photo:
+            entry.file_id = message.photo[-1].file_id
+
+# Commands and keyboard buttons, used as the action label of the webhook metrics
+BOT_ACTIONS = {
+    '/start', '/help', '/menu', '/keyboard', '/summary',
+    'Əsas Məlumatlar', 'Səmərəlilik Analizi', 'Enerji İstifadəsi',
+    'Ətraf Mühit Təsiri', 'Xərc Analizi', 'Zaman Trendləri', 'OpenAI Təhlili', 'Tam Hesabat',
+}
+
+def message_action(message):
+    """The action label of a message for metrics"""
+    if getattr(message, 'new_chat_members', None):
+        return 'new_chat_members'
+    text = getattr(message, 'text', None)
+    return text if text in BOT_ACTIONS else 'other'
+
+def handle_message(message):
+    """Handle one incoming message (run by the update workers)"""
+    chat_id = message.chat.id
+    message_text = message.text if hasattr(message, 'text') else None
+    logger.info(f"Detected chat_id: {chat_id}, message: {message_text}")
+    
+    # Handle new chat members (user joined)
+    if hasattr(message, 'new_chat_members') and message.new_chat_members:
+        logger.info("New chat member detected, sending welcome message")
+        send_welcome_message(chat_id)
+        return
+    
+    # Handle commands manually
+    if message_text == '/start':
+        logger.info("Detected /start command, handling directly")
+        send_welcome_message(chat_id)
+        logger.info("Welcome message sent with keyboard")
+    
+    elif message_text == '/help':
+        logger.info("Detected /help command")
+        help_text = """
 SOCAR Process Analyst Bot - Kömək
 
 Bu bot SOCAR neft və qaz emalı prosesləri üzrə məlumatların təhlili və vizualizasiyası üçün yaradılmışdır.
@@ -300,169 +359,243 @@ Panel düymələri vasitəsilə aşağıdakı təhlilləri əldə edə bilərsin
 - Enerji İstifadəsi: Enerji istifadəsi və emal həcmi arasında əlaqə
 - Ətraf Mühit Təsiri: CO2 emissiyalarının təhlili
 - Xərc Analizi: Əməliyyat xərclərinin təhlili
+- Zaman Trendləri: Səmərəlilik, enerji, CO2, xərc və hadisələrin həftəlik dinamikası
 - OpenAI Təhlili: Süni intellekt tərəfindən yaradılmış təhlil
+- Tam Hesabat: Bütün qrafiklər bir mesajda
 
 Əlavə məlumat üçün: ismetsemedov@gmail.com
 """
-                    bot.send_message(chat_id, help_text)
-                    logger.info("Help information sent to user")
-                
-                elif message_text == '/menu' or message_text == '/keyboard':
-                    logger.info("Detected /menu command")
-                    show_main_menu(chat_id)
-                    logger.info("Main menu sent to user")
+        bot.send_message(chat_id, help_text)
+        logger.info("Help information sent to user")
+    
+    elif message_text == '/menu' or message_text == '/keyboard':
+        logger.info("Detected /menu command")
+        show_main_menu(chat_id)
+        logger.info("Main menu sent to user")
+    
+    elif message_text == '/summary':
+        logger.info("Detected /summary command")
+        bot.send_message(chat_id, "Əsas məlumatlar yüklənir...")
+        
+        try:
+            dataset = load_dataset()
+            if dataset is None:
+                bot.send_message(chat_id, "Məlumatların yüklənməsində xəta baş verdi.")
+                return
+            
+            summary = generate_data_summary(dataset)
+            bot.send_message(chat_id, summary)
+            logger.info("Summary sent to user")
+        except Exception as e:
+            logger.error(f"Error processing data: {e}")
+            logger.error(traceback.format_exc())
+            bot.send_message(chat_id, f"Məlumatların emalında xəta: {str(e)}")
+    
+    elif message_text == 'Əsas Məlumatlar':
+        logger.info("Handling 'Əsas Məlumatlar' request")
+        bot.send_message(chat_id, "Əsas məlumatlar yüklənir...")
+        
+        try:
+            # Load data
+            dataset = load_dataset()
+            if dataset is None:
+                bot.send_message(chat_id, "Məlumatların yüklənməsində xəta baş verdi.")
+                return
                 
-                elif message_text == '/summary':
-                    logger.info("Detected /summary command")
-                    bot.send_message(chat_id, "Əsas məlumatlar yüklənir...")
-                    
-                    try:
-                        data = load_data()
-                        if data is None:
-                            bot.send_message(chat_id, "Məlumatların yüklənməsində xəta baş verdi.")
-                            return ''
-                        
-                        summary = generate_data_summary(data)
-                        bot.send_message(chat_id, summary)
-                        logger.info("Summary sent to user")
-                    except Exception as e:
-                        logger.error(f"Error processing data: {e}")
-                        logger.error(traceback.format_exc())
-                        bot.send_message(chat_id, f"Məlumatların emalında xəta: {str(e)}")
+            logger.info(f"Data loaded: {len(dataset)} rows")
+            
+            # Generate summary
+            summary = generate_data_summary(dataset)
+            logger.info("Data summary generated")
+            
+            # Send summary
+            bot.send_message(chat_id, summary)
+            logger.info("Summary sent to user")
+        except Exception as e:
+            logger.error(f"Error processing data: {e}")
+            logger.error(traceback.format_exc())
+            bot.send_message(chat_id, f"Məlumatların emalında xəta: {str(e)}")
+    
+    elif message_text == 'Səmərəlilik Analizi':
+        logger.info("Handling 'Səmərəlilik Analizi' request")
+        bot.send_message(chat_id, "Səmərəlilik analizi hazırlanır...")
+        
+        try:
+            # Load data
+            dataset = load_dataset()
+            if dataset is None:
+                bot.send_message(chat_id, "Məlumatların yüklənməsində xəta baş verdi.")
+                return
                 
-                elif message_text == 'Əsas Məlumatlar':
-                    logger.info("Handling 'Əsas Məlumatlar' request")
-                    bot.send_message(chat_id, "Əsas məlumatlar yüklənir...")
-                    
-                    try:
-                        # Load data
-                        data = load_data()
-                        if data is None:
-                            bot.send_message(chat_id, "Məlumatların yüklənməsində xəta baş verdi.")
-                            return ''
-                            
-                        logger.info(f"Data loaded: {data.shape[0]} rows, {data.shape[1]} columns")
-                        
-                        # Generate summary
-                        summary = generate_data_summary(data)
-                        logger.info("Data summary generated")
-                        
-                        # Send summary
-                        bot.send_message(chat_id, summary)
-                        logger.info("Summary sent to user")
-                    except Exception as e:
-                        logger.error(f"Error processing data: {e}")
-                        logger.error(traceback.format_exc())
-                        bot.send_message(chat_id, f"Məlumatların emalında xəta: {str(e)}")
+            logger.info("Data loaded for efficiency analysis")
+            
+            # Send chart (rendered only if not cached for this data version)
+            send_chart(chat_id, 'efficiency', dataset)
+            logger.info("Efficiency chart sent to user")
+        except Exception as e:
+            logger.error(f"Error creating chart: {e}")
+            logger.error(traceback.format_exc())
+            bot.send_message(chat_id, f"Qrafik yaradılarkən xəta: {str(e)}")
+    
+    elif message_text == 'Enerji İstifadəsi':
+        logger.info("Handling 'Enerji İstifadəsi' request")
+        bot.send_message(chat_id, "Enerji istifadəsi analizi hazırlanır...")
+        
+        try:
+            dataset = load_dataset()
+            if dataset is None:
+                bot.send_message(chat_id, "Məlumatların yüklənməsində xəta baş verdi.")
+                return
                 
-                elif message_text == 'Səmərəlilik Analizi':
-                    logger.info("Handling 'Səmərəlilik Analizi' request")
-                    bot.send_message(chat_id, "Səmərəlilik analizi hazırlanır...")
-                    
-                    try:
-                        # Load data
-                        data = load_data()
-                        if data is None:
-                            bot.send_message(chat_id, "Məlumatların yüklənməsində xəta baş verdi.")
-                            return ''
-                            
-                        logger.info("Data loaded for efficiency analysis")
-                        
-                        # Create chart
-                        chart = create_efficiency_chart(data)
-                        logger.info("Efficiency chart created")
-                        
-                        # Send chart
-                        bot.send_photo(chat_id, chart, caption="Proses Tipinə görə Emal Səmərəliliyi")
-                        logger.info("Efficiency chart sent to user")
-                    except Exception as e:
-                        logger.error(f"Error creating chart: {e}")
-                        logger.error(traceback.format_exc())
-                        bot.send_message(chat_id, f"Qrafik yaradılarkən xəta: {str(e)}")
+            send_chart(chat_id, 'energy', dataset)
+            logger.info("Energy chart sent to user")
+        except Exception as e:
+            logger.error(f"Error with energy chart: {e}")
+            logger.error(traceback.format_exc())
+            bot.send_message(chat_id, f"Qrafik yaradılarkən xəta: {str(e)}")
+    
+    elif message_text == 'Ətraf Mühit Təsiri':
+        logger.info("Handling 'Ətraf Mühit Təsiri' request")
+        bot.send_message(chat_id, "Ətraf mühit təsiri analizi hazırlanır...")
+        
+        try:
+            dataset = load_dataset()
+            if dataset is None:
+                bot.send_message(chat_id, "Məlumatların yüklənməsində xəta baş verdi.")
+                return
                 
-                elif message_text == 'Enerji İstifadəsi':
-                    logger.info("Handling 'Enerji İstifadəsi' request")
-                    bot.send_message(chat_id, "Enerji istifadəsi analizi hazırlanır...")
-                    
-                    try:
-                        data = load_data()
-                        if data is None:
-                            bot.send_message(chat_id, "Məlumatların yüklənməsində xəta baş verdi.")
-                            return ''
-                            
-                        chart = create_energy_chart(data)
-                        bot.send_photo(chat_id, chart, caption="Emal Həcmi və Enerji İstifadəsi Arasında Əlaqə")
-                        logger.info("Energy chart sent to user")
-                    except Exception as e:
-                        logger.error(f"Error with energy chart: {e}")
-                        logger.error(traceback.format_exc())
-                        bot.send_message(chat_id, f"Qrafik yaradılarkən xəta: {str(e)}")
+            send_chart(chat_id, 'environmental', dataset)
+            logger.info("Environmental chart sent to user")
+        except Exception as e:
+            logger.error(f"Error with environmental chart: {e}")
+            logger.error(traceback.format_exc())
+            bot.send_message(chat_id, f"Qrafik yaradılarkən xəta: {str(e)}")
+    
+    elif message_text == 'Xərc Analizi':
+        logger.info("Handling 'Xərc Analizi' request")
+        bot.send_message(chat_id, "Xərc analizi hazırlanır...")
+        
+        try:
+            dataset = load_dataset()
+            if dataset is None:
+                bot.send_message(chat_id, "Məlumatların yüklənməsində xəta baş verdi.")
+                return
                 
-                elif message_text == 'Ətraf Mühit Təsiri':
-                    logger.info("Handling 'Ətraf Mühit Təsiri' request")
-                    bot.send_message(chat_id, "Ətraf mühit təsiri analizi hazırlanır...")
-                    
-                    try:
-                        data = load_data()
-                        if data is None:
-                            bot.send_message(chat_id, "Məlumatların yüklənməsində xəta baş verdi.")
-                            return ''
-                            
-                        chart = create_environmental_chart(data)
-                        bot.send_photo(chat_id, chart, caption="Proses Tipinə görə Ortalama CO2 Emissiyası")
-                        logger.info("Environmental chart sent to user")
-                    except Exception as e:
-                        logger.error(f"Error with environmental chart: {e}")
-                        logger.error(traceback.format_exc())
-                        bot.send_message(chat_id, f"Qrafik yaradılarkən xəta: {str(e)}")
+            send_chart(chat_id, 'cost', dataset)
+            logger.info("Cost chart sent to user")
+        except Exception as e:
+            logger.error(f"Error with cost chart: {e}")
+            logger.error(traceback.format_exc())
+            bot.send_message(chat_id, f"Qrafik yaradılarkən xəta: {str(e)}")
+    
+    elif message_text == 'Zaman Trendləri':
+        logger.info("Handling 'Zaman Trendləri' request")
+        bot.send_message(chat_id, "Zaman trendləri hazırlanır...")
+        
+        try:
+            dataset = load_dataset()
+            if dataset is None:
+                bot.send_message(chat_id, "Məlumatların yüklənməsində xəta baş verdi.")
+                return
                 
-                elif message_text == 'Xərc Analizi':
-                    logger.info("Handling 'Xərc Analizi' request")
-                    bot.send_message(chat_id, "Xərc analizi hazırlanır...")
-                    
-                    try:
-                        data = load_data()
-                        if data is None:
-                            bot.send_message(chat_id, "Məlumatların yüklənməsində xəta baş verdi.")
-                            return ''
-                            
-                        chart = create_cost_chart(data)
-                        bot.send_photo(chat_id, chart, caption="Proses Tipinə görə Ümumi Əməliyyat Xərcləri")
-                        logger.info("Cost chart sent to user")
-                    except Exception as e:
-                        logger.error(f"Error with cost chart: {e}")
-                        logger.error(traceback.format_exc())
-                        bot.send_message(chat_id, f"Qrafik yaradılarkən xəta: {str(e)}")
+            send_chart(chat_id, 'trends', dataset)
+            logger.info("Trends chart sent to user")
+        except Exception as e:
+            logger.error(f"Error with trends chart: {e}")
+            logger.error(traceback.format_exc())
+            bot.send_message(chat_id, f"Qrafik yaradılarkən xəta: {str(e)}")
+    
+    elif message_text == 'Tam Hesabat':
+        logger.info("Handling 'Tam Hesabat' request")
+        bot.send_message(chat_id, "Tam hesabat hazırlanır...")
+        
+        try:
+            dataset = load_dataset()
+            if dataset is None:
+                bot.send_message(chat_id, "Məlumatların yüklənməsində xəta baş verdi.")
+                return
                 
-                elif message_text == 'OpenAI Təhlili':
-                    logger.info("Handling 'OpenAI Təhlili' request")
-                    bot.send_message(chat_id, "OpenAI təhlili hazırlanır, xahiş edirik gözləyin...")
-                    
-                    try:
-                        data = load_data()
-                        if data is None:
-                            bot.send_message(chat_id, "Məlumatların yüklənməsində xəta baş verdi.")
-                            return ''
-                            
-                        summary = generate_data_summary(data)
-                        insights = generate_insights(summary)
-                        
-                        if len(insights) > 4000:
-                            chunks = [insights[i:i+4000] for i in range(0, len(insights), 4000)]
-                            for chunk in chunks:
-                                bot.send_message(chat_id, chunk)
-                        else:
-                            bot.send_message(chat_id, insights)
-                        logger.info("OpenAI insights sent to user")
-                    except Exception as e:
-                        logger.error(f"Error with OpenAI analysis: {e}")
-                        logger.error(traceback.format_exc())
-                        bot.send_message(chat_id, f"Təhlil yaradılarkən xəta: {str(e)}")
+            send_full_report(chat_id, dataset)
+            logger.info("Full report sent to user")
+        except Exception as e:
+            logger.error(f"Error with full report: {e}")
+            logger.error(traceback.format_exc())
+            bot.send_message(chat_id, f"Hesabat yaradılarkən xəta: {str(e)}")
+    
+    elif message_text == 'OpenAI Təhlili':
+        logger.info("Handling 'OpenAI Təhlili' request")
+        status_message = bot.send_message(chat_id, "OpenAI təhlili hazırlanır, xahiş edirik gözləyin...")
+        
+        try:
+            dataset = load_dataset()
+            if dataset is None:
+                bot.send_message(chat_id, "Məlumatların yüklənməsində xəta baş verdi.")
+                return
                 
-                else:
-                    # Default response for unknown commands
-                    bot.send_message(chat_id, f"'{message_text}' əmri tanınmadı. Kömək üçün /help yazın və ya panel düymələrindən istifadə edin.")
-                    logger.info(f"Sent default response for: {message_text}")
+            send_insights(chat_id, dataset, status_message)
+            logger.info("OpenAI insights sent to user")
+        except InsightsBusy:
+            logger.warning("OpenAI completions busy, asking user to retry")
+            bot.send_message(chat_id, "OpenAI təhlili hazırda məşğuldur, xahiş edirik bir az sonra yenidən cəhd edin.")
+        except Exception as e:
+            logger.error(f"Error with OpenAI analysis: {e}")
+            logger.error(traceback.format_exc())
+            bot.send_message(chat_id, f"Təhlil yaradılarkən xəta: {str(e)}")
+    
+    else:
+        # Default response for unknown commands
+        bot.send_message(chat_id, f"'{message_text}' əmri tanınmadı. Kömək üçün /help yazın və ya panel düymələrindən istifadə edin.")
+        logger.info(f"Sent default response for: {message_text}")
+
+
+# Per-chat token bucket: BOT_RATE_BURST updates at once, refilled at BOT_RATE_PER_MINUTE
+rate_limiter = ChatRateLimiter(
+    per_minute=float(os.environ.get('BOT_RATE_PER_MINUTE', 20)),
+    burst=int(os.environ.get('BOT_RATE_BURST', 5)),
+)
+THROTTLE_REPLY = "Çox sayda sorğu göndərdiniz. Xahiş edirik bir neçə saniyə gözləyin və yenidən cəhd edin."
+
+# Updates are handled in the background; the webhook only queues them
+update_queue = UpdateQueue(
+    workers=BOT_WORKERS,
+    max_pending=int(os.environ.get('BOT_QUEUE_SIZE', 100)),
+)
+
+# Webhook handler (this is what actually works on Render.com)
+@app.route(f'/{TELEGRAM_TOKEN}', methods=['POST'])
+def webhook():
+    logger.info("Received webhook request")
+    try:
+        if request.headers.get('content-type') == 'application/json':
+            json_str = request.get_data().decode('UTF-8')
+            logger.info(f"Webhook data: {json_str[:100]}...")
+            update = types.Update.de_json(json_str)
+            logger.info(f"Queueing update: {update.update_id}")
+            
+            if hasattr(update, 'message') and update.message:
+                message = update.message
+                action = message_action(message)
+
+                def job():
+                    with metrics.timed_action(action):
+                        handle_message(message)
+
+                limit = rate_limiter.check(message.chat.id)
+                if limit != ALLOW:
+                    metrics.observe_rate_limit(limit)
+                    logger.info(f"Rate limiting chat {message.chat.id} ({limit})")
+                    if limit == DROP:
+                        return ''
+                    # Reply once, through the queue to keep the chat's order
+                    job = partial(bot.send_message, message.chat.id, THROTTLE_REPLY)
+
+                result = update_queue.submit(update.update_id, message.chat.id, job)
+                if result == REJECTED:
+                    # Telegram redelivers the update later
+                    logger.warning(f"Update queue full, rejecting update {update.update_id}")
+                    return '', 503, {'Retry-After': '5'}
+                if result == DUPLICATE:
+                    logger.info(f"Ignoring duplicate update {update.update_id}")
             
             return ''
         else:
@@ -473,6 +606,7 @@ Panel düymələri vasitəsilə aşağıdakı təhlilləri əldə edə bilərsin
         logger.error(traceback.format_exc())
         return '', 500
 
+
 # Helper functions for the bot
 def send_welcome_message(chat_id):
     """Send welcome message with bot information and show the main menu"""
@@ -502,9 +636,11 @@ def show_main_menu(chat_id):
     item3 = types.KeyboardButton('Enerji İstifadəsi')
     item4 = types.KeyboardButton('Ətraf Mühit Təsiri')
     item5 = types.KeyboardButton('Xərc Analizi')
-    item6 = types.KeyboardButton('OpenAI Təhlili')
+    item6 = types.KeyboardButton('Zaman Trendləri')
+    item7 = types.KeyboardButton('OpenAI Təhlili')
+    item8 = types.KeyboardButton('Tam Hesabat')
     
-    markup.add(item1, item2, item3, item4, item5, item6)
+    markup.add(item1, item2, item3, item4, item5, item6, item7, item8)
     bot.send_message(chat_id, "Lütfən, analiz növünü seçin:", reply_markup=markup)
 
 
@@ -516,45 +652,38 @@ def health_check():
 @app.route('/test-data', methods=['GET'])
 def test_data():
     try:
-        data = load_data()
-        if data is not None:
-            return f"CSV loaded successfully: {data.shape[0]} rows, {data.shape[1]} columns"
-        else:
+        dataset = load_dataset()
+        if dataset is None:
             return "Failed to load data.csv"
+        if dataset.frame is None:
+            return f"CSV streamed successfully: {len(dataset)} rows"
+        return f"CSV loaded successfully: {dataset.frame.shape[0]} rows, {dataset.frame.shape[1]} columns"
     except Exception as e:
         return f"Error loading data: {str(e)}"
 
+@app.route('/startup', methods=['GET'])
+def startup_report():
+    return jsonify(startup.report())
+
 @app.route('/')
 def index():
     return 'Telegram Bot is running!'
 
+startup.mark('app')
+startup.ready()
+
+# The webhook and commands are registered in the background, so the app
+# serves requests while the Telegram API calls are made. Chart pool workers
+# started from `python app.py` import this module too; they skip this.
+if multiprocessing.parent_process() is None:
+    threading.Thread(target=deferred_startup, name='deferred-startup', daemon=True).start()
+
 if __name__ == '__main__':
     # Get the port from environment variable provided by Render
     port = int(os.environ.get('PORT', 5000))
     
     # For production, use webhook mode
-    if os.environ.get('ENVIRONMENT') == 'production':
-        # Remove any existing webhook first
-        bot.remove_webhook()
-        time.sleep(0.5)  # Give Telegram servers some time to process
-        
-        # Set webhook
-        url = os.environ.get('APP_URL', '')
-        if url:
-            webhook_url = f"{url}/{TELEGRAM_TOKEN}"
-            bot.set_webhook(url=webhook_url)
-            
-            try:
-                # Set menu button to commands
-                bot.set_chat_menu_button(menu_button=types.MenuButtonCommands())
-                logger.info("Menu button set to commands")
-            except Exception as e:
-                logger.error(f"Error setting menu button: {e}")
-            
-            logger.info(f"Webhook set to {webhook_url}")
-        else:
-            logger.error("APP_URL environment variable not set")
-        
+    if PRODUCTION:
         # Only run the Flask app (no polling) in production
         app.run(host='0.0.0.0', port=port)
     else:
@@ -0,0 +1,91 @@
+"""Versioned cache of rendered chart images.
+
+A chart rendered from one dataset version is the same for every user, so
+its PNG bytes are kept, keyed by (chart, filters), in a bounded LRU cache.
+Once Telegram has stored an uploaded photo, its file_id is kept with the
+entry and later sends reference it instead of uploading again.
+
+Entries belong to one dataset version. As soon as a lookup arrives for a
+newer version the whole cache is dropped, so a data reload invalidates
+every cached chart at once. Versions are file signatures with no order, so
+the cache remembers the last few it has moved past: a late lookup for one
+of those (a render that started before the reload) is a miss and leaves
+the newer entries in place.
+"""
+import threading
+from collections import OrderedDict, deque
+
+# Replaced dataset versions remembered, so late lookups for them are ignored
+RETIRED_VERSIONS = 16
+
+
+class CachedChart:
+    """Rendered PNG bytes plus the Telegram file_id once uploaded"""
+
+    def __init__(self, png):
+        self.png = png
+        self.file_id = None
+
+
+class ChartCache:
+    """Thread-safe LRU cache of CachedChart keyed by (version, chart, filters).
+
+    Bounded both by entry count and by the total size of the PNG bytes.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._retired = deque(maxlen=RETIRED_VERSIONS)
+        self._lock = threading.Lock()
+
+    def get(self, version, chart, filters=()):
+        with self._lock:
+            if version != self.version:
+                if version in self._retired:
+                    self.misses += 1
+                    return None
+                if self.version is not None:
+                    self._retired.append(self.version)
+                self._clear()
+                self.version = version
+            key = (chart, filters)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, version, chart, png, filters=()):
+        """Store rendered PNG bytes; returns the CachedChart (cached or not)"""
+        entry = CachedChart(png)
+        with self._lock:
+            # A reload may have happened while the chart was being rendered
+            if version != self.version:
+                return entry
+            key = (chart, filters)
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous.png)
+            self._entries[key] = entry
+            self._size += len(png)
+            while len(self._entries) > self.max_entries or (self._size > self.max_bytes and len(self._entries) > 1):
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.png)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+            self.version = None
+
+    def _clear(self):
+        self._entries.clear()
+        self._size = 0
@@ -0,0 +1,84 @@
+"""Process pool for the charts drawn with pyplot.
+
+pyplot charts hold the GIL and PYPLOT_LOCK while they draw, so threads can
+only render them one at a time. ChartPool renders them in worker processes
+instead, so the charts of a full report, and of different chats, render in
+parallel. Other charts are rendered in the calling thread.
+
+Workers are spawned rather than forked: they import charts and its
+dependencies, not app, and do not inherit the bot's threads and locks. The
+pool is created on first use (or by start()) and kept, so each worker
+imports matplotlib once. If a worker dies the pool is replaced and the
+chart is rendered in the calling process instead.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from charts import POOL_CHARTS, render_png
+import metrics
+from startup import lazy_import
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker():
+    # Import the plotting modules before the first chart arrives
+    lazy_import('matplotlib.pyplot')
+    lazy_import('seaborn')
+
+
+def _ready():
+    return True
+
+
+class ChartPool:
+    """Renders the pyplot charts in a pool of worker processes"""
+
+    def __init__(self, processes=3):
+        # 0 renders every chart in the calling process
+        self.processes = processes
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self.processes,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def _discard(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        """Start the worker processes and wait until they are ready"""
+        if not self.processes:
+            return
+        executor = self._get_executor()
+        for future in [executor.submit(_ready) for _ in range(self.processes)]:
+            future.result()
+
+    def render(self, name, data):
+        """Render a chart to PNG bytes from its chart_input(), in a worker process if it draws with pyplot"""
+        with metrics.timed_chart(name):
+            return self._render(name, data)
+
+    def _render(self, name, data):
+        if not self.processes or name not in POOL_CHARTS:
+            return render_png(name, data)
+        executor = self._get_executor()
+        try:
+            return executor.submit(render_png, name, data).result()
+        except BrokenProcessPool as e:
+            logger.warning(f"Chart pool broken, rendering {name} chart in process: {e}")
+            self._discard(executor)
+            return render_png(name, data)
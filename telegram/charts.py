@@ -0,0 +1,233 @@
+"""The bot's charts, rendered to PNG.
+
+This module does not import app, so the chart process pool (chart_pool)
+can load it in its worker processes without starting a second bot.
+"""
+import logging
+from io import BytesIO
+
+from analytics import trend_table
+import metrics
+from renderer import PlotlyRenderer, RendererError, pyplot_chart
+from startup import lazy_import
+
+logger = logging.getLogger(__name__)
+
+# Image export for plotly charts, warmed by app.deferred_startup() and kept warm
+plotly_renderer = PlotlyRenderer()
+
+
+@pyplot_chart
+def create_efficiency_chart(data):
+    plt = lazy_import('matplotlib.pyplot')
+    sns = lazy_import('seaborn')
+    try:
+        plt.figure(figsize=(12, 8))
+        sns.boxplot(x='Proses Tipi', y='Emalın Səmərəliliyi (%)', data=data)
+        plt.title('Proses Tipinə görə Emal Səmərəliliyi', fontsize=16)
+        plt.xticks(rotation=45)
+        plt.tight_layout()
+        
+        buffer = BytesIO()
+        plt.savefig(buffer, format='png')
+        buffer.seek(0)
+        plt.close()
+        return buffer
+    except Exception as e:
+        logger.error(f"Error creating efficiency chart: {str(e)}")
+        raise
+
+
+def create_energy_chart(data):
+    try:
+        if plotly_renderer.available:
+            px = lazy_import('plotly.express')
+            fig = px.scatter(data, 
+                            x='Emal Həcmi (ton)', 
+                            y='Enerji İstifadəsi (kWh)',
+                            color='Proses Tipi',
+                            size='Energy_per_ton',
+                            hover_data=['Proses ID', 'Təzyiq (bar)', 'Temperatur (°C)'])
+            fig.update_layout(title='Emal Həcmi və Enerji İstifadəsi Arasında Əlaqə')
+            
+            try:
+                return BytesIO(plotly_renderer.render(fig))
+            except RendererError as e:
+                logger.warning(f"Plotly export failed, drawing energy chart with matplotlib: {e}")
+        
+        metrics.observe_renderer('fallback')
+        return create_energy_chart_matplotlib(data)
+    except Exception as e:
+        logger.error(f"Error creating energy chart: {str(e)}")
+        raise
+
+
+def create_energy_chart_matplotlib(data):
+    """Matplotlib version of the energy chart, used when plotly export fails"""
+    # The object-oriented API keeps no global state, so no lock is needed
+    fig = lazy_import('matplotlib.figure').Figure(figsize=(12, 8))
+    ax = fig.subplots()
+    # Marker area scaled like plotly's default size_max of 20px diameter
+    sizes = (data['Energy_per_ton'] / data['Energy_per_ton'].max() * 20) ** 2
+    for process_type, rows in data.groupby('Proses Tipi', observed=True):
+        ax.scatter(rows['Emal Həcmi (ton)'], rows['Enerji İstifadəsi (kWh)'], s=sizes[rows.index], alpha=0.7, label=process_type)
+    ax.set_title('Emal Həcmi və Enerji İstifadəsi Arasında Əlaqə', fontsize=16)
+    ax.set_xlabel('Emal Həcmi (ton)', fontsize=12)
+    ax.set_ylabel('Enerji İstifadəsi (kWh)', fontsize=12)
+    ax.legend(title='Proses Tipi')
+    fig.tight_layout()
+
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png')
+    buffer.seek(0)
+    return buffer
+
+
+@pyplot_chart
+def create_environmental_chart(avg_co2_by_type):
+    plt = lazy_import('matplotlib.pyplot')
+    try:
+        plt.figure(figsize=(12, 8))
+        avg_co2_by_type = avg_co2_by_type.sort_values(ascending=False)
+        
+        plt.barh(avg_co2_by_type.index, avg_co2_by_type.values)
+        plt.title('Proses Tipinə görə Ortalama CO2 Emissiyası', fontsize=16)
+        plt.xlabel('CO2 Emissiyası (g)', fontsize=12)
+        plt.ylabel('Proses Tipi', fontsize=12)
+        plt.tight_layout()
+        
+        buffer = BytesIO()
+        plt.savefig(buffer, format='png')
+        buffer.seek(0)
+        plt.close()
+        return buffer
+    except Exception as e:
+        logger.error(f"Error creating environmental chart: {str(e)}")
+        raise
+
+
+@pyplot_chart
+def create_cost_chart(cost_by_type):
+    plt = lazy_import('matplotlib.pyplot')
+    try:
+        plt.figure(figsize=(12, 8))
+        cost_by_type = cost_by_type.sort_values(ascending=False)
+        
+        plt.bar(cost_by_type.index, cost_by_type.values / 1000)
+        plt.title('Proses Tipinə görə Ümumi Əməliyyat Xərcləri', fontsize=16)
+        plt.xlabel('Proses Tipi', fontsize=12)
+        plt.ylabel('Əməliyyat Xərcləri (Min AZN)', fontsize=12)
+        plt.xticks(rotation=45)
+        plt.tight_layout()
+        
+        buffer = BytesIO()
+        plt.savefig(buffer, format='png')
+        buffer.seek(0)
+        plt.close()
+        return buffer
+    except Exception as e:
+        logger.error(f"Error creating cost chart: {str(e)}")
+        raise
+
+
+# Trend chart panels: trend_table() column -> axis label
+TREND_PANELS = {
+    'avg_efficiency': 'Səmərəlilik (%)',
+    'total_energy': 'Enerji (MWh)',
+    'total_co2': 'CO2 (kg)',
+    'total_cost': 'Xərclər (Min AZN)',
+    'safety_incidents': 'Təhlükəsizlik Hadisələri',
+}
+
+# Totals drawn in thousands: kWh as MWh, g as kg, AZN as thousands of AZN
+TREND_SCALE = {'total_energy': 1000, 'total_co2': 1000, 'total_cost': 1000}
+
+
+@pyplot_chart
+def create_trends_chart(trends):
+    plt = lazy_import('matplotlib.pyplot')
+    try:
+        fig, axes = plt.subplots(len(TREND_PANELS), 1, figsize=(12, 14), sharex=True)
+        for process_type, rows in trends.groupby('process_type', observed=True):
+            for ax, (column, label) in zip(axes, TREND_PANELS.items()):
+                ax.plot(rows['period'], rows[column] / TREND_SCALE.get(column, 1), marker='.', label=process_type)
+                ax.set_ylabel(label, fontsize=10)
+        axes[0].set_title('Həftəlik Trendlər (Proses Tipinə görə)', fontsize=16)
+        axes[0].legend(title='Proses Tipi', fontsize=8, loc='best')
+        for ax in axes:
+            ax.grid(alpha=0.3)
+        fig.autofmt_xdate()
+        plt.tight_layout()
+
+        buffer = BytesIO()
+        plt.savefig(buffer, format='png')
+        buffer.seek(0)
+        plt.close()
+        return buffer
+    except Exception as e:
+        logger.error(f"Error creating trends chart: {str(e)}")
+        raise
+
+
+# Chart name -> (render function, photo caption)
+CHARTS = {
+    'efficiency': (create_efficiency_chart, "Proses Tipinə görə Emal Səmərəliliyi"),
+    'energy': (create_energy_chart, "Emal Həcmi və Enerji İstifadəsi Arasında Əlaqə"),
+    'environmental': (create_environmental_chart, "Proses Tipinə görə Ortalama CO2 Emissiyası"),
+    'cost': (create_cost_chart, "Proses Tipinə görə Ümumi Əməliyyat Xərcləri"),
+    'trends': (create_trends_chart, "Həftəlik Trendlər: Səmərəlilik, Enerji, CO2, Xərclər və Hadisələr"),
+}
+
+# Charts drawn from one per process type statistic of the dataset's shared
+# aggregates: chart name -> (measure, statistic)
+AGGREGATE_CHARTS = {
+    'environmental': ('co2', 'mean'),
+    'cost': ('cost', 'sum'),
+}
+
+# Charts drawn from the trend buckets of the shared aggregates:
+# chart name -> bucket frequency (see analytics.trends)
+TREND_CHARTS = {
+    'trends': 'week',
+}
+
+# Columns read by the other charts drawn with pyplot
+FRAME_CHART_COLUMNS = {
+    'efficiency': ['Proses Tipi', 'Emalın Səmərəliliyi (%)'],
+}
+
+# Charts drawn with pyplot, which chart_pool renders in worker processes.
+# The energy chart is exported by the kaleido subprocess of plotly_renderer,
+# so it is rendered in the calling thread.
+POOL_CHARTS = set(AGGREGATE_CHARTS) | set(TREND_CHARTS) | set(FRAME_CHART_COLUMNS)
+
+
+def chart_input(name, dataset):
+    """The data a chart is drawn from.
+
+    The bar charts get a per process type Series read from the dataset's
+    aggregates instead of grouping the frame again, and the trend chart the
+    rolled-up trend buckets; the other charts get only the frame columns
+    they read, which keeps what is sent to the chart processes small.
+    """
+    if name in AGGREGATE_CHARTS:
+        measure, stat = AGGREGATE_CHARTS[name]
+        return dataset.aggregates.by('Proses Tipi', measure, stat)
+    if name in TREND_CHARTS:
+        return trend_table(dataset.aggregates, TREND_CHARTS[name])
+    if not chart_available(name, dataset):
+        raise ValueError("Bu qrafik məlumatlar axınla oxunduqda (DATA_MODE=stream) mövcud deyil")
+    if name in FRAME_CHART_COLUMNS:
+        return dataset.frame[FRAME_CHART_COLUMNS[name]]
+    return dataset.frame
+
+
+def chart_available(name, dataset):
+    """Whether a chart can be drawn: in stream mode there are only aggregates"""
+    return dataset.frame is not None or name in AGGREGATE_CHARTS or name in TREND_CHARTS
+
+
+def render_png(name, data):
+    """Render a chart to PNG bytes from its chart_input()"""
+    create_chart, _ = CHARTS[name]
+    return create_chart(data).getvalue()
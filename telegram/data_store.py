@@ -0,0 +1,212 @@
+"""In-process store for the bot's process data.
+
+The CSV is parsed once per process with explicit dtypes (categoricals for
+the text columns, parsed dates) and the same frame is handed to every
+handler. The file's mtime and size are checked at most every
+check_interval seconds; when they change, the request that notices
+re-reads the file while concurrent requests keep using the current data.
+
+In stream mode (DataStore(stream=True)) the file is never loaded whole:
+it is read in chunks, once per version, into the shared aggregates and the
+summary's best and worst processes (see analytics.streaming), so memory
+stays bounded however long the process history is. The summary and the
+aggregate charts are identical to the ones computed from the loaded frame;
+the charts that plot individual processes are not available.
+"""
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from analytics import DIMENSIONS, TREND_DIMENSION, RunningAggregates
+from analytics.streaming import COLUMNS as AGGREGATE_COLUMNS, read_chunks, scan
+from analytics.trends import START_DATE
+import metrics
+from summary import PROCESS_COLUMNS, rankings
+
+logger = logging.getLogger(__name__)
+
+# Places data.csv is looked for, in order: the working directory (as the bot
+# has always done) and the data/ folder next to this file
+DATA_PATHS = [
+    'data.csv',
+    os.path.join('data', 'data.csv'),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'data.csv'),
+]
+
+# The measures are read as floats, so blank or decimal values load like
+# they did when the types were inferred; only the process ID is an integer
+COLUMN_TYPES = {
+    'Proses ID': 'int64',
+    'Proses Tipi': 'category',
+    'Proses Addımı': 'category',
+    'Emal Həcmi (ton)': 'float64',
+    'Temperatur (°C)': 'float64',
+    'Təzyiq (bar)': 'float64',
+    'Prosesin Müddəti (saat)': 'float64',
+    'İstifadə Edilən Katalizatorlar': 'category',
+    'Emalın Səmərəliliyi (%)': 'float64',
+    'Enerji İstifadəsi (kWh)': 'float64',
+    'Ətraf Mühitə Təsir (g CO2 ekvivalent)': 'float64',
+    'Təhlükəsizlik Hadisələri': 'float64',
+    'Emal Məhsulları': 'category',
+    'Əməliyyat Xərcləri (AZN)': 'float64',
+    'İstifadə Edilən Avadanlıq': 'category',
+    'İşçi Sayı': 'float64',
+    'Təchizatçı Adı': 'category',
+    'Proses Qrupları': 'category',
+    'Energy_per_ton': 'float64',
+    'CO2_per_ton': 'float64',
+    'Cost_per_ton': 'float64',
+}
+
+DATE_COLUMNS = ['Prosesin Başlama Tarixi', 'Prosesin Bitmə Tarixi']
+
+# Groups kept in the shared aggregates: the per-category figures and the
+# daily trend buckets of the trends chart
+AGGREGATE_DIMENSIONS = [*DIMENSIONS, TREND_DIMENSION]
+
+
+def find_data_path():
+    """Return the first existing candidate in DATA_PATHS, or None"""
+    for path in DATA_PATHS:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def source_signature(path):
+    """Return a cheap fingerprint of a file based on its size and mtime"""
+    stat = os.stat(path)
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+
+def read_data(path):
+    """Parse the process CSV with the bot's column types"""
+    return pd.read_csv(path, dtype=COLUMN_TYPES, parse_dates=DATE_COLUMNS)
+
+
+def stream_data(path):
+    """Aggregate the process CSV in chunks, without loading it.
+
+    Returns the RunningAggregates and the summary's rankings, filled in the
+    same pass.
+    """
+    ranked = rankings()
+    columns = list(dict.fromkeys([*AGGREGATE_COLUMNS, START_DATE, *PROCESS_COLUMNS]))
+    aggregates = scan(read_chunks(path, columns), AGGREGATE_DIMENSIONS, ranked.values())
+    if aggregates is None:
+        raise ValueError(f"{path} has no rows")
+    return aggregates, ranked
+
+
+class Dataset:
+    """An immutable, loaded version of the process data.
+
+    In stream mode frame is None, and the aggregates and rankings computed
+    while streaming the file are passed in instead.
+    """
+
+    def __init__(self, frame, version, load_seconds, aggregates=None, rankings=None):
+        self.frame = frame
+        self.version = version
+        self.load_seconds = load_seconds
+        # The summary's TopK selections in stream mode, otherwise None
+        self.rankings = rankings
+        self._aggregates = aggregates
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.frame) if self.frame is not None else self.aggregates.rows
+
+    def derived(self, name, build):
+        """Return build(frame), computed once per dataset version"""
+        value = self._derived.get(name)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(name)
+                if value is None:
+                    value = build(self.frame)
+                    self._derived[name] = value
+        return value
+
+    @property
+    def aggregates(self):
+        """Totals and per-group statistics, computed in one pass per version.
+
+        Not to be read from inside a derived() build, which holds the lock.
+        """
+        if self._aggregates is not None:
+            return self._aggregates
+        return self.derived('aggregates', lambda frame: RunningAggregates.from_frame(frame, AGGREGATE_DIMENSIONS))
+
+
+class DataStore:
+    """Holds the current Dataset and reloads it when the CSV changes"""
+
+    def __init__(self, path=None, check_interval=2.0, stream=False):
+        self.path = path
+        self.check_interval = check_interval
+        self.stream = stream
+        self._dataset = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+
+    def get(self):
+        """Return the current Dataset, reloading first if the CSV changed.
+
+        Raises FileNotFoundError if no data file exists and nothing has been
+        loaded yet.
+        """
+        if self._dataset is None:
+            with self._reload_lock:
+                if self._dataset is None:
+                    self._load()
+        elif time.monotonic() - self._last_check >= self.check_interval:
+            # Only one thread checks/reloads; others keep the current dataset
+            if self._reload_lock.acquire(blocking=False):
+                try:
+                    self._refresh()
+                finally:
+                    self._reload_lock.release()
+        return self._dataset
+
+    def _refresh(self):
+        self._last_check = time.monotonic()
+        try:
+            signature = source_signature(self.path)
+        except OSError as e:
+            logger.warning(f"Cannot stat {self.path}, keeping current data: {e}")
+            return
+        if signature == self._dataset.version:
+            return
+        logger.info(f"{self.path} changed, reloading")
+        try:
+            self._load()
+        except Exception as e:
+            logger.error(f"Reload failed, keeping version {self._dataset.version}: {e}")
+
+    def _load(self):
+        if self.path is None:
+            self.path = find_data_path()
+            if self.path is None:
+                raise FileNotFoundError(f"Could not find data.csv in any of: {', '.join(DATA_PATHS)}")
+
+        started = time.perf_counter()
+        signature = source_signature(self.path)
+        if self.stream:
+            aggregates, ranked = stream_data(self.path)
+            dataset = Dataset(None, signature, time.perf_counter() - started, aggregates, ranked)
+            shape = f"{len(dataset)} rows, streamed"
+        else:
+            frame = read_data(self.path)
+            dataset = Dataset(frame, signature, time.perf_counter() - started)
+            shape = f"{frame.shape[0]} rows, {frame.shape[1]} columns"
+        self._dataset = dataset
+        self._last_check = time.monotonic()
+        metrics.observe_dataset(dataset.load_seconds, len(dataset))
+        logger.info(f"Loaded {self.path} version {signature}: {shape} in {dataset.load_seconds:.3f}s")
+        return dataset
@@ -0,0 +1,107 @@
+"""Load shedding for bursts of identical or repeated requests.
+
+SingleFlight coalesces concurrent calls with the same key: the first caller
+computes the result and callers arriving while it runs wait for it and get
+the same result (or exception), instead of repeating the work. Keys include
+the dataset version, so a data change starts a fresh computation.
+
+ChatRateLimiter is a token bucket per chat: each update takes a token,
+tokens refill at a steady rate up to a burst size, and a chat without
+tokens is throttled. Only the first throttled update after the chat runs
+dry gets a reply, so a tapping user is not answered with a reply per tap.
+"""
+import threading
+import time
+
+import metrics
+
+ALLOW = 'allow'
+# Throttled, and the chat should be told so
+THROTTLE = 'throttle'
+# Throttled again before tokens refilled; ignore silently
+DROP = 'drop'
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run one call per key at a time and share its outcome with concurrent callers"""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, compute):
+        """Return compute(), or the result of the same key's call already running"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        metrics.observe_flight('leader' if leader else 'shared')
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+class ChatRateLimiter:
+    """Token bucket per chat"""
+
+    # Buckets are pruned once there are more than this many chats
+    MAX_BUCKETS = 10000
+
+    def __init__(self, per_minute=20, burst=5):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        # chat_id -> [tokens, last refill time, throttle reply sent]
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def check(self, chat_id):
+        """Take a token for an update; returns ALLOW, THROTTLE or DROP"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(chat_id)
+            if bucket is None:
+                if len(self._buckets) >= self.MAX_BUCKETS:
+                    self._prune(now)
+                bucket = self._buckets[chat_id] = [float(self.burst), now, False]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                bucket[2] = False
+                return ALLOW
+            bucket[0] = tokens
+            if bucket[2]:
+                return DROP
+            bucket[2] = True
+            return THROTTLE
+
+    def _prune(self, now):
+        # Chats whose bucket has refilled completely behave like new chats
+        full = [
+            chat_id for chat_id, (tokens, last, _) in self._buckets.items()
+            if tokens + (now - last) * self.rate >= self.burst
+        ]
+        for chat_id in full:
+            del self._buckets[chat_id]
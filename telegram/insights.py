@@ -0,0 +1,116 @@
+"""OpenAI insights for the data summary.
+
+InsightsService wraps the chat completion call used by 'OpenAI Təhlili':
+
+- Results are cached by a hash of (model, summary text). The summary only
+  changes with the data, so repeat requests on the same data are answered
+  from memory.
+- Completions are streamed, so callers can show text as it arrives.
+- A semaphore limits concurrent completions; callers waiting longer than
+  the timeout for a slot get InsightsBusy.
+- Each call has a timeout, applied to the HTTP requests and to the stream
+  as a whole.
+- The OpenAI client comes from a factory called on first use, so the
+  openai package is not imported until insights are requested, and
+  OPENAI_BASE_URL can point it at a compatible local server (e.g. a stub
+  for testing).
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "Sən dəqiq və analitik neft və qaz emalı prosesləri üzrə məlumatlar haqqında Azərbaycan dilində təhlil təqdim edən köməkçisən."
+USER_PROMPT = "Aşağıdakı məlumatları təhlil et və biznes üçün əhəmiyyətli nəticələri Azərbaycan dilində təqdim et: {summary}"
+
+
+class InsightsBusy(Exception):
+    """Raised when no completion slot frees up within the timeout"""
+
+
+class InsightsService:
+    """Cached, streamed and concurrency-limited insight completions"""
+
+    def __init__(self, client_factory, model='gpt-4', max_concurrent=2, timeout=60.0, cache_size=128):
+        self.client_factory = client_factory
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.model = model
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """The OpenAI client, created on first use"""
+        with self._client_lock:
+            if self._client is None:
+                self._client = self.client_factory()
+            return self._client
+
+    def cache_key(self, summary):
+        return hashlib.sha256(f'{self.model}\0{summary}'.encode('utf-8')).hexdigest()
+
+    def cached(self, summary):
+        """Return the cached insights for a summary, or None"""
+        key = self.cache_key(summary)
+        with self._lock:
+            text = self._cache.get(key)
+            if text is not None:
+                self._cache.move_to_end(key)
+        metrics.observe_cache('insights', 'hit' if text is not None else 'miss')
+        return text
+
+    def stream(self, summary):
+        """Yield the insights text in pieces as the completion streams in.
+
+        The complete text is cached once the stream finishes. Raises
+        InsightsBusy, TimeoutError or the client's errors.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise InsightsBusy(f'{self.model} completions busy')
+        try:
+            deadline = time.monotonic() + self.timeout
+            parts = []
+            with metrics.openai_stream(self.model) as timer:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": USER_PROMPT.format(summary=summary)},
+                    ],
+                    stream=True,
+                    timeout=self.timeout,
+                )
+                try:
+                    for chunk in response:
+                        if time.monotonic() > deadline:
+                            raise TimeoutError(f'{self.model} completion exceeded {self.timeout:.0f}s')
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            parts.append(delta)
+                            # The caller's handling of the piece is not OpenAI time
+                            timer.pause()
+                            yield delta
+                            timer.resume()
+                finally:
+                    response.close()
+        finally:
+            self._slots.release()
+
+        self._store(summary, ''.join(parts))
+
+    def _store(self, summary, text):
+        if not text:
+            return
+        with self._lock:
+            self._cache[self.cache_key(summary)] = text
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
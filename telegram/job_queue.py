@@ -0,0 +1,103 @@
+"""Background processing of webhook updates.
+
+The webhook only validates an update and submits it here, so Telegram gets
+its 200 immediately instead of waiting for charts and OpenAI calls (and
+retrying the update when the response is late).
+
+Jobs run on a bounded pool of worker threads with three guarantees:
+
+- Per-chat ordering: jobs of one chat run one at a time, in arrival order.
+  Different chats are processed in parallel.
+- Deduplication: an update_id seen recently is not queued again, so
+  Telegram's redeliveries do not repeat work.
+- Backpressure: at most max_pending jobs wait at once. Beyond that submit()
+  refuses the update, the webhook answers 503 and Telegram redelivers it
+  later.
+"""
+import logging
+import queue
+import threading
+from collections import OrderedDict, deque
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+DUPLICATE = 'duplicate'
+REJECTED = 'rejected'
+
+
+class UpdateQueue:
+    """Bounded worker pool that runs jobs in order per chat"""
+
+    def __init__(self, workers=4, max_pending=100, dedup_size=10000):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.dedup_size = dedup_size
+        self._lock = threading.Lock()
+        # chat_id -> jobs not yet started; a chat is present while it has
+        # queued or running jobs
+        self._chats = {}
+        # Chats with a job ready to run; each chat appears at most once
+        self._ready = queue.Queue()
+        self._pending = 0
+        self._seen = OrderedDict()
+        self._threads = []
+
+    def submit(self, update_id, chat_id, job):
+        """Queue job() for chat_id; returns QUEUED, DUPLICATE or REJECTED"""
+        with self._lock:
+            if update_id in self._seen:
+                result = DUPLICATE
+            elif self._pending >= self.max_pending:
+                result = REJECTED
+            else:
+                self._remember(update_id)
+                self._pending += 1
+                jobs = self._chats.get(chat_id)
+                if jobs is None:
+                    # Chat idle: make it runnable
+                    self._chats[chat_id] = deque([job])
+                    self._ready.put(chat_id)
+                else:
+                    # A worker owns this chat and will pick the job up after the current one
+                    jobs.append(job)
+                self._start_workers()
+                result = QUEUED
+            pending = self._pending
+        metrics.observe_update(result, pending)
+        return result
+
+    def _remember(self, update_id):
+        self._seen[update_id] = None
+        while len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+
+    def _start_workers(self):
+        # Started on first use rather than at import, so they exist in the
+        # serving process even when the app is imported before a fork
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        for number in range(len(self._threads), self.workers):
+            thread = threading.Thread(target=self._work, name=f'update-worker-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            chat_id = self._ready.get()
+            with self._lock:
+                job = self._chats[chat_id].popleft()
+            try:
+                job()
+            except Exception:
+                logger.exception(f"Update job for chat {chat_id} failed")
+            with self._lock:
+                self._pending -= 1
+                if self._chats[chat_id]:
+                    # Requeue behind other chats so one busy chat cannot starve them
+                    self._ready.put(chat_id)
+                else:
+                    del self._chats[chat_id]
+                pending = self._pending
+            metrics.QUEUE_DEPTH.set(pending)
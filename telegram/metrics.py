@@ -0,0 +1,202 @@
+"""Prometheus metrics and sampled profiling for the bot.
+
+init_app() registers request hooks that record latency and response size
+per endpoint, and serves everything at /metrics. Queued updates are timed
+per bot action (command or keyboard button), chart renders are timed by
+the calling process with timed_chart, and OpenAI calls, data loads, cache
+lookups, the update queue, load shedding and Telegram API retries are
+recorded with the helpers below.
+
+Under gunicorn with several workers, set PROMETHEUS_MULTIPROC_DIR to an
+empty directory so /metrics aggregates the figures of all workers.
+
+The request hooks, sampled profiling (PROFILE_SAMPLE_RATE) and the
+/metrics view are shared with the other app, in analytics.flask_metrics.
+"""
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from analytics import flask_metrics
+
+# Chart rendering and OpenAI calls take seconds rather than milliseconds
+SLOW_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+REQUEST_LATENCY = Histogram(
+    'bot_request_seconds',
+    'Request latency per endpoint',
+    ['endpoint', 'method', 'status'],
+    buckets=SLOW_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    'bot_response_bytes',
+    'Response body size per endpoint',
+    ['endpoint'],
+    buckets=(64, 256, 1024, 4096, 16384, 65536),
+)
+ACTION_LATENCY = Histogram(
+    'bot_action_seconds',
+    'Time to handle an update per bot action',
+    ['action'],
+    buckets=SLOW_BUCKETS,
+)
+UPDATES = Counter(
+    'bot_updates',
+    'Webhook updates by queue result (queued, duplicate or rejected)',
+    ['result'],
+)
+RENDERER_EVENTS = Counter(
+    'bot_renderer_events',
+    'Plotly renderer restarts and matplotlib fallbacks',
+    ['event'],
+)
+SINGLE_FLIGHT = Counter(
+    'bot_single_flight',
+    'Coalesced computations by role: leader computed, shared reused',
+    ['result'],
+)
+RATE_LIMITED = Counter(
+    'bot_rate_limited',
+    'Updates refused by the per-chat rate limit (throttle: replied, drop: ignored)',
+    ['result'],
+)
+TELEGRAM_RETRIES = Counter(
+    'bot_telegram_retries',
+    'Retried Telegram API calls by reason (rate_limited, server_error, connection)',
+    ['reason'],
+)
+QUEUE_DEPTH = Gauge(
+    'bot_update_queue_depth',
+    'Updates queued or being handled',
+    multiprocess_mode='livesum',
+)
+CHART_RENDER = Histogram(
+    'bot_chart_render_seconds',
+    'Time to render a chart, including a trip to the chart pool, per chart',
+    ['chart'],
+    buckets=SLOW_BUCKETS,
+)
+OPENAI_FIRST_TOKEN = Histogram(
+    'bot_openai_first_token_seconds',
+    'Time from an OpenAI request to the first streamed text, by model',
+    ['model'],
+    buckets=SLOW_BUCKETS,
+)
+OPENAI_STREAM = Histogram(
+    'bot_openai_stream_seconds',
+    'Time spent waiting on a streamed OpenAI completion, by model and outcome (ok or error)',
+    ['model', 'outcome'],
+    buckets=SLOW_BUCKETS,
+)
+DATASET_LOAD = Histogram(
+    'bot_dataset_load_seconds',
+    'Time to load the process data',
+)
+DATASET_ROWS = Gauge(
+    'bot_dataset_rows',
+    'Rows in the loaded process data',
+    multiprocess_mode='livemax',
+)
+CACHE_REQUESTS = Counter(
+    'bot_cache_requests',
+    'Cache lookups by cache and result',
+    ['cache', 'result'],
+)
+
+@contextmanager
+def timed_chart(name):
+    """Time the render of a chart, in the process serving the bot.
+
+    Charts drawn in chart pool workers are timed here too: a figure
+    recorded in a worker would never reach this process's /metrics.
+    """
+    with CHART_RENDER.labels(name).time():
+        yield
+
+
+class StreamTimer:
+    """Clock for one streamed OpenAI completion.
+
+    It runs while the generator waits on OpenAI and stops while the caller
+    handles a piece of text (e.g. edits a Telegram message): call pause()
+    just before yielding a piece and resume() once control comes back.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.seconds = 0.0
+        self._first_token = True
+        self._since = time.perf_counter()
+
+    def pause(self):
+        self.seconds += time.perf_counter() - self._since
+        self._since = None
+        if self._first_token:
+            self._first_token = False
+            OPENAI_FIRST_TOKEN.labels(self.model).observe(self.seconds)
+
+    def resume(self):
+        self._since = time.perf_counter()
+
+    def stop(self, outcome):
+        if self._since is not None:
+            self.seconds += time.perf_counter() - self._since
+            self._since = None
+        OPENAI_STREAM.labels(self.model, outcome).observe(self.seconds)
+
+
+@contextmanager
+def openai_stream(model):
+    """Time a streamed OpenAI completion, labelled by whether it raised"""
+    timer = StreamTimer(model)
+    outcome = 'error'
+    try:
+        yield timer
+        outcome = 'ok'
+    finally:
+        timer.stop(outcome)
+
+
+def observe_dataset(seconds, rows):
+    DATASET_LOAD.observe(seconds)
+    DATASET_ROWS.set(rows)
+
+
+def observe_cache(cache, result):
+    """Count a cache lookup; result is e.g. 'hit', 'miss' or, for charts, 'file_id'"""
+    CACHE_REQUESTS.labels(cache, result).inc()
+
+
+@contextmanager
+def timed_action(action):
+    """Time the handling of one update for a bot action"""
+    with ACTION_LATENCY.labels(action).time():
+        yield
+
+
+def observe_renderer(event):
+    RENDERER_EVENTS.labels(event).inc()
+
+
+def observe_flight(result):
+    SINGLE_FLIGHT.labels(result).inc()
+
+
+def observe_rate_limit(result):
+    RATE_LIMITED.labels(result).inc()
+
+
+def observe_telegram_retry(reason):
+    TELEGRAM_RETRIES.labels(reason).inc()
+
+
+def observe_update(result, pending):
+    """Count a webhook update by queue result and record the queue depth"""
+    UPDATES.labels(result).inc()
+    QUEUE_DEPTH.set(pending)
+
+
+def init_app(app):
+    """Install the request hooks and the /metrics endpoint on a Flask app"""
+    flask_metrics.init_app(app, REQUEST_LATENCY, RESPONSE_SIZE)
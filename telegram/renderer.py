@@ -0,0 +1,97 @@
+"""Chart image rendering shared by the update workers.
+
+Plotly figures are exported through kaleido, which runs a headless browser
+in a subprocess. Starting it takes seconds, so PlotlyRenderer starts and
+warms it once, in the background after app startup, and keeps it for later
+requests. plotly itself is only imported then, not with the app. Exports go
+through one lock, since the kaleido process handles one image at a time.
+If an export fails the subprocess is restarted and the export retried once.
+After a second failure RendererError is raised and the renderer is skipped
+for FAILURE_COOLDOWN seconds, so callers fall back to their matplotlib
+rendering immediately instead of waiting on a broken renderer.
+
+pyplot keeps global figure state and is not thread-safe, so charts drawn
+with it are serialized through pyplot_chart.
+"""
+import logging
+import threading
+import time
+from functools import wraps
+
+import metrics
+from startup import lazy_import
+
+logger = logging.getLogger(__name__)
+
+# Seconds to skip plotly export after it failed twice in a row
+FAILURE_COOLDOWN = 60
+
+PYPLOT_LOCK = threading.RLock()
+
+
+class RendererError(Exception):
+    """Raised when the plotly image export is unavailable"""
+
+
+def pyplot_chart(create_chart):
+    """Run a chart function that draws with pyplot under PYPLOT_LOCK"""
+    @wraps(create_chart)
+    def wrapper(*args, **kwargs):
+        with PYPLOT_LOCK:
+            return create_chart(*args, **kwargs)
+    return wrapper
+
+
+class PlotlyRenderer:
+    """Long-lived, thread-safe PNG export of plotly figures"""
+
+    def __init__(self, width=None, height=None):
+        self.width = width
+        self.height = height
+        self._lock = threading.Lock()
+        self._disabled_until = 0.0
+
+    @property
+    def available(self):
+        """False while the renderer is skipped after repeated failures"""
+        return time.monotonic() >= self._disabled_until
+
+    def start(self):
+        """Start and warm the export process in the background"""
+        threading.Thread(target=self._warm, name='plotly-renderer-warmup', daemon=True).start()
+
+    def _warm(self):
+        started = time.perf_counter()
+        try:
+            self.render({'data': [{'type': 'scatter', 'x': [0], 'y': [0]}]})
+            logger.info(f"Plotly renderer warmed up in {time.perf_counter() - started:.1f}s")
+        except RendererError as e:
+            logger.warning(f"Plotly renderer unavailable, charts will use matplotlib: {e}")
+
+    def render(self, fig):
+        """Return the figure as PNG bytes; raises RendererError"""
+        if not self.available:
+            raise RendererError('renderer disabled after repeated failures')
+        pio = lazy_import('plotly.io')
+        with self._lock:
+            error = None
+            for attempt in range(2):
+                try:
+                    return pio.to_image(fig, format='png', width=self.width, height=self.height)
+                except Exception as e:
+                    error = e
+                    logger.warning(f"Plotly export failed (attempt {attempt + 1}), restarting renderer: {e}")
+                    self._restart(pio)
+            self._disabled_until = time.monotonic() + FAILURE_COOLDOWN
+            raise RendererError(str(error))
+
+    def _restart(self, pio):
+        metrics.observe_renderer('restart')
+        # kaleido starts a fresh subprocess on the next export
+        scope = getattr(getattr(pio, 'kaleido', None), 'scope', None)
+        shutdown = getattr(scope, '_shutdown_kaleido', None)
+        if shutdown is not None:
+            try:
+                shutdown()
+            except Exception as e:
+                logger.warning(f"Could not stop the kaleido process: {e}")
@@ -0,0 +1,86 @@
+"""Startup timing report.
+
+app.py imports this module first, so STARTED is close to the start of the
+app import. The report at /startup has three parts:
+
+- phases: steps of the app import recorded with mark(), each timed from
+  the previous mark, and one-off steps such as the Telegram API setup
+  recorded with timed().
+- imports: modules deferred to the first handler that needs them, loaded
+  through lazy_import(), with the time their first import took.
+- ready: seconds from STARTED until the app module finished importing.
+
+For a per-module breakdown of everything imported eagerly, run
+    python -X importtime -c "import app" 2> importtime.log
+"""
+import importlib
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+STARTED = time.perf_counter()
+
+_lock = threading.Lock()
+_phases = {}
+_imports = {}
+_last_mark = STARTED
+_ready = None
+
+
+def mark(phase):
+    """Record the time since the previous mark as a startup phase"""
+    global _last_mark
+    now = time.perf_counter()
+    with _lock:
+        _phases[phase] = now - _last_mark
+        _last_mark = now
+
+
+def ready():
+    """Record that the app finished importing and log the report"""
+    global _ready
+    _ready = time.perf_counter() - STARTED
+    phases = ', '.join(f'{phase} {seconds:.2f}s' for phase, seconds in _phases.items())
+    logger.info(f"App ready in {_ready:.2f}s ({phases})")
+
+
+@contextmanager
+def timed(phase):
+    """Record the duration of a one-off step as a startup phase"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            _phases[phase] = time.perf_counter() - started
+
+
+def lazy_import(name):
+    """Import a module when first needed and record how long that took.
+
+    Later calls cost a sys.modules lookup. import_module waits for a module
+    another thread is still importing, so concurrent first calls are safe.
+    """
+    fresh = name not in sys.modules
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    if fresh:
+        seconds = time.perf_counter() - started
+        with _lock:
+            _imports.setdefault(name, seconds)
+        logger.info(f"Imported {name} in {seconds:.2f}s")
+    return module
+
+
+def report():
+    """Startup timings in seconds"""
+    with _lock:
+        return {
+            'ready': _ready,
+            'phases': {phase: round(seconds, 4) for phase, seconds in _phases.items()},
+            'imports': {name: round(seconds, 4) for name, seconds in _imports.items()},
+        }
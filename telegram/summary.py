@@ -0,0 +1,121 @@
+"""Data summary shared by /summary, 'Əsas Məlumatlar' and 'OpenAI Təhlili'.
+
+summarize() reads the totals and the per-type efficiency from the
+dataset's shared aggregates (see analytics) and the top and bottom
+processes from TopK selections, which partition instead of sorting and can
+be filled chunk by chunk when the data is streamed. The result is a
+DataSummary, cached per dataset version by data_summary(), and the
+Azerbaijani text is rendered from it.
+"""
+from analytics import TopK
+
+EFFICIENCY = 'Emalın Səmərəliliyi (%)'
+
+# Processes listed in each of the top and bottom efficiency lists
+TOP_COUNT = 3
+
+# Columns of the listed processes
+PROCESS_COLUMNS = ['Proses ID', 'Proses Tipi', EFFICIENCY]
+
+
+class DataSummary:
+    """Summary statistics of one dataset version"""
+
+    def __init__(self, totals, top_processes, bottom_processes, efficiency_by_type):
+        # Scalar figures: total_processes, process_types, avg_efficiency,
+        # total_energy, total_cost, avg_co2, max_volume, safety_incidents
+        self.totals = totals
+        # Lists of (process id, process type, efficiency), best/worst first
+        self.top_processes = top_processes
+        self.bottom_processes = bottom_processes
+        # Mean efficiency per process type as a Series
+        self.efficiency_by_type = efficiency_by_type
+
+    @property
+    def best_process_type(self):
+        """(process type, mean efficiency) with the highest mean efficiency"""
+        best = self.efficiency_by_type.idxmax()
+        return best, self.efficiency_by_type[best]
+
+
+def rankings():
+    """Empty TopK selections of the best ('top') and worst ('bottom') processes"""
+    return {
+        'top': TopK(TOP_COUNT, EFFICIENCY, PROCESS_COLUMNS),
+        'bottom': TopK(TOP_COUNT, EFFICIENCY, PROCESS_COLUMNS, largest=False),
+    }
+
+
+def _process_rows(rows):
+    return list(zip(rows['Proses ID'].tolist(), rows['Proses Tipi'].tolist(), rows[EFFICIENCY].tolist()))
+
+
+def _whole(value):
+    """A sum or maximum as the summary prints it: an int when it is a whole number.
+
+    The measures are whole numbers in the source data, but the aggregates
+    (and the bot's columns) hold floats.
+    """
+    return int(value) if float(value).is_integer() else float(value)
+
+
+def summarize(aggregates, ranked):
+    """Compute the DataSummary from RunningAggregates and filled rankings()"""
+    totals = {
+        'total_processes': aggregates.rows,
+        'process_types': len(aggregates.counts('Proses Tipi')),
+        'avg_efficiency': aggregates.total('efficiency', 'mean'),
+        'total_energy': _whole(aggregates.total('energy')),
+        'total_cost': _whole(aggregates.total('cost')),
+        'avg_co2': aggregates.total('co2', 'mean'),
+        'max_volume': _whole(aggregates.total('volume', 'max')),
+        'safety_incidents': _whole(aggregates.total('incidents'))
+    }
+    return DataSummary(
+        totals,
+        _process_rows(ranked['top'].rows),
+        _process_rows(ranked['bottom'].rows),
+        aggregates.by('Proses Tipi', 'efficiency'),
+    )
+
+
+def _rank(data):
+    ranked = rankings()
+    for ranking in ranked.values():
+        ranking.add(data)
+    return ranked
+
+
+def data_summary(dataset):
+    """The DataSummary of a dataset version, computed once per version"""
+    aggregates = dataset.aggregates
+    if dataset.frame is None:
+        # Stream mode: the rankings were filled while streaming
+        return dataset.derived('summary', lambda _: summarize(aggregates, dataset.rankings))
+    return dataset.derived('summary', lambda data: summarize(aggregates, _rank(data)))
+
+
+def render_summary(summary):
+    """The Azerbaijani summary text sent to users and to OpenAI"""
+    totals = summary.totals
+    lines = [
+        "",
+        "Ümumi Məlumat Təhlili:",
+        f"- Ümumi proses sayı: {totals['total_processes']}",
+        f"- Fərqli proses tipləri: {totals['process_types']}",
+        f"- Ortalama emal səmərəliliyi: {totals['avg_efficiency']:.2f}%",
+        f"- Ümumi enerji istifadəsi: {totals['total_energy']:,} kWh",
+        f"- Ümumi əməliyyat xərcləri: {totals['total_cost']:,} AZN",
+        f"- Ortalama CO2 emissiyası: {totals['avg_co2']:,.2f} g",
+        f"- Maksimum emal həcmi: {totals['max_volume']:,} ton",
+        f"- Qeydə alınmış təhlükəsizlik hadisələri: {totals['safety_incidents']}",
+        "",
+        "Ən Yüksək Səmərəliliyə Malik Proseslər:",
+    ]
+    lines += [f"- Proses ID: {process_id}, Tipi: {process_type}, Səmərəlilik: {efficiency:g}%" for process_id, process_type, efficiency in summary.top_processes]
+    lines += ["", "Ən Aşağı Səmərəliliyə Malik Proseslər:"]
+    lines += [f"- Proses ID: {process_id}, Tipi: {process_type}, Səmərəlilik: {efficiency:g}%" for process_id, process_type, efficiency in summary.bottom_processes]
+
+    best_type, best_efficiency = summary.best_process_type
+    lines += ["", f"Ən Səmərəli Proses Tipi: {best_type} (Ortalama {best_efficiency}%)"]
+    return "\n".join(lines)
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DASHBOARD_DIR = os.path.join(REPO_DIR, 'dashboard')
+DATA_PATH = os.path.join(DASHBOARD_DIR, 'data', 'data.csv')
+
+# The analytics package, and the dashboard's modules as its app imports them
+sys.path.append(REPO_DIR)
+sys.path.append(DASHBOARD_DIR)
+
+from analytics import MEASURES, PER_TON_COLUMNS, add_per_ton  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def frame():
+    """5,000 process rows drawn from data.csv, with fractional measures and a few blanks"""
+    rng = np.random.default_rng(7)
+    source = pd.read_csv(DATA_PATH).drop(columns=list(PER_TON_COLUMNS))
+    frame = source.take(rng.integers(0, len(source), 5000)).reset_index(drop=True)
+    for column in MEASURES.values():
+        if column in frame.columns:
+            frame[column] = frame[column] * rng.normal(1.0, 0.05, len(frame))
+    frame.loc[rng.choice(len(frame), 50, replace=False), MEASURES['energy']] = np.nan
+    # The per-ton columns follow the jittered measures
+    return add_per_ton(frame)
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import CUBE_DIMENSION, MEASURES, Cube, RunningAggregates
+from analytics.aggregates import TOTAL
+
+
+@pytest.fixture(scope='module')
+def cube(frame):
+    return Cube.from_aggregates(RunningAggregates.from_frame(frame, [CUBE_DIMENSION]))
+
+
+@pytest.mark.parametrize('by', [
+    ['Proses Tipi'],
+    ['İstifadə Edilən Katalizatorlar'],
+    ['Proses Tipi', 'Proses Addımı'],
+    ['Təchizatçı Adı', 'İstifadə Edilən Avadanlıq', 'Proses Tipi'],
+])
+@pytest.mark.parametrize('stat', ['mean', 'std', 'sum', 'max'])
+def test_rollup_matches_groupby(frame, cube, by, stat):
+    measures = ['efficiency', 'energy', 'incidents']
+    columns = [MEASURES[measure] for measure in measures]
+
+    table = cube.table(by, measures, stat)
+    expected = getattr(frame.groupby(by)[columns], stat)()
+
+    assert list(table.index) == list(expected.index)
+    np.testing.assert_allclose(table[columns].to_numpy(), expected.to_numpy(), rtol=1e-9)
+
+
+def test_slice_matches_filtered_groupby(frame, cube):
+    types = ['Neft Emalı', 'Qaz Emalı']
+    rows = frame[frame['Proses Tipi'].isin(types)]
+
+    table = cube.table(['Təchizatçı Adı'], ['efficiency'], where={'Proses Tipi': types})
+    expected = rows.groupby('Təchizatçı Adı')[MEASURES['efficiency']].mean()
+
+    pd.testing.assert_series_equal(
+        table[MEASURES['efficiency']], expected, check_names=False, check_index_type=False, rtol=1e-9,
+    )
+
+
+def test_rollup_without_by_is_the_total(frame, cube):
+    total = cube.rollup()
+
+    assert list(total.index) == [TOTAL]
+    assert total['rows'].iloc[0] == len(frame) == cube.rows
+    assert total['energy_count'].iloc[0] == frame[MEASURES['energy']].count()
+
+
+def test_empty_slice_has_a_zero_total(cube):
+    total = cube.rollup(where={'Proses Tipi': ['unknown']})
+
+    assert total['rows'].iloc[0] == 0
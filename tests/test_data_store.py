@@ -0,0 +1,99 @@
+import contextlib
+import shutil
+
+import pandas as pd
+import pytest
+
+import data_store
+from conftest import DATA_PATH
+from data_store import DataStore, IngestError
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / 'data.csv'
+    shutil.copy(DATA_PATH, path)
+    return str(path)
+
+
+def new_rows(path, first_id, count=1):
+    rows = pd.read_csv(path, nrows=count).drop(columns=['Energy_per_ton', 'CO2_per_ton', 'Cost_per_ton'])
+    rows['Proses ID'] = range(first_id, first_id + count)
+    return rows
+
+
+def csv_rows(path):
+    return len(pd.read_csv(path))
+
+
+def test_ingest_appends_to_file_and_dataset(csv_path):
+    store = DataStore(csv_path, check_interval=0)
+    before = len(store.get())
+
+    dataset = store.ingest(new_rows(csv_path, 100001, 3))
+
+    assert len(dataset) == before + 3 == csv_rows(csv_path)
+    assert dataset.aggregates.rows == len(dataset)
+    assert list(dataset.frame['Proses ID'].iloc[-3:]) == [100001, 100002, 100003]
+
+
+def test_ingest_picks_up_rows_another_store_appended(csv_path):
+    first = DataStore(csv_path, check_interval=0)
+    second = DataStore(csv_path, check_interval=0)
+    first.get()
+    second.get()
+
+    second.ingest(new_rows(csv_path, 100001))
+    dataset = first.ingest(new_rows(csv_path, 100002))
+
+    assert len(dataset) == csv_rows(csv_path)
+    assert len(second.get()) == csv_rows(csv_path)
+
+
+def test_ingest_racing_another_store_loses_no_rows(csv_path, monkeypatch):
+    first = DataStore(csv_path, check_interval=0)
+    second = DataStore(csv_path, check_interval=0)
+    first.get()
+    second.get()
+
+    # The second store appends after the first checked the file for changes
+    # but before it takes the file lock
+    file_lock = data_store.file_lock
+
+    @contextlib.contextmanager
+    def racing_lock(path):
+        monkeypatch.setattr(data_store, 'file_lock', file_lock)
+        second.ingest(new_rows(csv_path, 100001))
+        with file_lock(path):
+            yield
+
+    monkeypatch.setattr(data_store, 'file_lock', racing_lock)
+    dataset = first.ingest(new_rows(csv_path, 100002))
+
+    assert csv_rows(csv_path) == len(dataset)
+    assert sorted(dataset.frame['Proses ID'].iloc[-2:]) == [100001, 100002]
+    assert dataset.aggregates.rows == len(dataset)
+    assert len(second.get()) == len(dataset)
+
+
+def test_ingest_rejects_rows_without_writing(csv_path):
+    store = DataStore(csv_path, check_interval=0)
+    before = csv_rows(csv_path)
+    rows = new_rows(csv_path, 100001)
+    rows['Proses Tipi'] = [['not', 'text']]
+
+    with pytest.raises(IngestError):
+        store.ingest(rows)
+    with pytest.raises(IngestError):
+        store.ingest(rows.drop(columns=['Proses Tipi']))
+
+    assert csv_rows(csv_path) == before == len(store.get())
+
+
+def test_ingest_of_no_rows_leaves_the_dataset_as_is(csv_path):
+    store = DataStore(csv_path, check_interval=0)
+    before = store.get()
+
+    assert store.ingest(pd.DataFrame.from_records([])) is before
+    assert store.ingest(new_rows(csv_path, 100001, 0)) is before
+    assert csv_rows(csv_path) == len(before)
@@ -0,0 +1,20 @@
+from response_cache import CachedResponse, ResponseCache
+
+
+def test_reload_drops_entries_of_the_old_version():
+    cache = ResponseCache()
+    cache.put('v1', 'key', CachedResponse(b'old', 'application/json'))
+    cache.get('v1', 'key')
+
+    assert cache.get('v2', 'key') is None
+
+
+def test_late_lookup_for_an_old_version_keeps_newer_entries():
+    cache = ResponseCache()
+    cache.get('v1', 'key')
+    cache.get('v2', 'key')
+    cache.put('v2', 'key', CachedResponse(b'new', 'application/json'))
+
+    assert cache.get('v1', 'key') is None
+    cache.put('v1', 'key', CachedResponse(b'old', 'application/json'))
+    assert cache.get('v2', 'key').body == b'new'
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from sampling import stratified_sample
+
+
+@pytest.mark.parametrize('budget', [0, 1, 2, 3, 7, 100, 999])
+def test_sample_stays_within_budget(budget):
+    rng = np.random.default_rng(budget)
+    # Three large groups, a few tiny ones and rows without a group
+    codes = np.concatenate([np.repeat([0, 1, 2], [600, 300, 90]), [3, 4, 4, 5], [-1] * 6])
+    rng.shuffle(codes)
+
+    sample = stratified_sample(codes, budget)
+
+    assert len(sample) == min(budget, len(codes))
+    assert len(np.unique(sample)) == len(sample)
+    assert np.all(np.diff(sample) > 0)
+
+
+def test_small_groups_are_kept_when_the_budget_allows():
+    codes = np.repeat([0, 1, 2], [1000, 10, 1])
+
+    sample = stratified_sample(codes, 50)
+
+    assert set(codes[sample]) == {0, 1, 2}
+
+
+def test_budget_below_the_group_count_keeps_the_largest_groups():
+    codes = np.repeat([0, 1, 2], [100, 300, 200])
+
+    sample = stratified_sample(codes, 1)
+
+    assert list(codes[sample]) == [1]
+
+
+def test_sample_is_stable_for_a_seed():
+    codes = np.random.default_rng(0).integers(0, 5, 10000)
+
+    assert np.array_equal(stratified_sample(codes, 500), stratified_sample(codes, 500))
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import DIMENSIONS, MEASURES, PER_TON_COLUMNS, RunningAggregates, add_per_ton, aggregates
+from analytics.streaming import read_chunks, scan
+
+
+def assert_same_figures(left, right, exact):
+    """The totals and every group table of two RunningAggregates agree"""
+    compare = pd.testing.assert_frame_equal if exact else (
+        lambda a, b: pd.testing.assert_frame_equal(a, b, check_exact=False, rtol=1e-9)
+    )
+    compare(left.totals, right.totals)
+    assert list(left.groups) == list(right.groups)
+    for dimension in left.groups:
+        compare(left.groups[dimension].sort_index(), right.groups[dimension].sort_index())
+
+
+def test_streamed_csv_matches_in_memory(frame, tmp_path):
+    path = tmp_path / 'data.csv'
+    frame.drop(columns=list(PER_TON_COLUMNS)).to_csv(path, index=False)
+    in_memory = RunningAggregates.from_frame(add_per_ton(pd.read_csv(path)))
+
+    # Chunks are regrouped into blocks, so the figures are the same bit for bit
+    streamed = scan(read_chunks(str(path), chunk_rows=333))
+    assert_same_figures(streamed, in_memory, exact=True)
+
+
+@pytest.fixture(scope='module')
+def merged(frame):
+    """Aggregates of frame merged from blocks of 1,000 rows.
+
+    The rows are sorted by process type first, so most groups are missing
+    from some of the blocks.
+    """
+    rows = frame.sort_values('Proses Tipi', kind='stable')
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(aggregates, 'BLOCK_ROWS', 1000)
+        return RunningAggregates.from_chunks([rows.iloc[:1500], rows.iloc[1500:]])
+
+
+def test_merged_blocks_match_one_pass(frame, merged):
+    assert_same_figures(merged, RunningAggregates.from_frame(frame), exact=False)
+
+
+@pytest.mark.parametrize('stat', ['mean', 'var', 'std', 'min', 'max', 'sum'])
+def test_merged_statistics_match_pandas(frame, merged, stat):
+    for dimension in DIMENSIONS:
+        for measure in ('efficiency', 'energy', 'duration'):
+            expected = getattr(frame.groupby(dimension)[MEASURES[measure]], stat)()
+            actual = merged.by(dimension, measure, stat)
+            assert list(actual.index) == list(expected.index)
+            np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol=1e-9)
+    np.testing.assert_allclose(merged.total('energy', stat), getattr(frame[MEASURES['energy']], stat)(), rtol=1e-9)
+
+
+def test_add_matches_from_frame(frame):
+    grown = RunningAggregates.from_frame(frame.iloc[:4000]).add(frame.iloc[4000:])
+
+    assert grown.rows == len(frame)
+    assert_same_figures(grown, RunningAggregates.from_frame(frame), exact=False)
@@ -0,0 +1,36 @@
+import shutil
+
+import pandas as pd
+from werkzeug.datastructures import MultiDict
+
+from conftest import DATA_PATH
+from data_store import DataStore
+from panels import PanelContext, timeline_panel
+
+
+def page_through(dataset, **params):
+    """Process ids of every timeline page, newest page first"""
+    pages = []
+    cursor = None
+    while True:
+        query = dict(params, cursor=cursor) if cursor else params
+        page = timeline_panel(PanelContext(dataset, MultiDict(query)))
+        pages.append(list(page['items']['process_id']))
+        cursor = page['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_pages_cover_rows_with_the_same_date_and_id(tmp_path):
+    path = tmp_path / 'data.csv'
+    shutil.copy(DATA_PATH, path)
+    store = DataStore(str(path), check_interval=0)
+    newest = store.get().frame.sort_values(['Prosesin Başlama Tarixi', 'Proses ID'])['Proses ID'].iloc[-1]
+    # Ingest does not enforce unique process ids: the newest process, 4 times
+    rows = pd.read_csv(path).drop(columns=['Energy_per_ton', 'CO2_per_ton', 'Cost_per_ton'])
+    dataset = store.ingest(pd.concat([rows[rows['Proses ID'] == newest]] * 3))
+
+    pages = page_through(dataset, limit='2')
+
+    assert sum(len(page) for page in pages) == len(dataset)
+    assert pages[0] == pages[1] == [newest] * 2